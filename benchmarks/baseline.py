@@ -0,0 +1,89 @@
+import json
+import os
+
+# Results of benchmarks are lists of dicts. Some keys identify the case (eg
+# the shape and size of a grammar), the others are measurements. A baseline
+# file stores them as json so that later runs can be compared against it.
+
+baselineVersion = 1
+
+def save(path, benchmark, results):
+    with open(path, "w") as file:
+        json.dump({"version": baselineVersion, "benchmark": benchmark, "results": results},
+                  file, indent = 1, sort_keys = True)
+        file.write("\n")
+
+def load(path, benchmark):
+    with open(path) as file:
+        data = json.load(file)
+
+    if data.get("version") != baselineVersion or data.get("benchmark") != benchmark:
+        raise TypeError(path + " is no baseline of " + benchmark)
+
+    return data["results"]
+
+# A measurement that got worse by more than 'tolerance' (relative) and
+# 'minimum' (absolute, to ignore noise of tiny values).
+class Regression:
+    def __init__(self, case, key, old, new):
+        self.case = case
+        self.key = key
+        self.old = old
+        self.new = new
+
+    def __str__(self):
+        if self.old is None or self.new is None:
+            return self.case + ": " + self.key + " " + str(self.old) + " -> " + str(self.new)
+
+        ratio = self.new / self.old if self.old else float("inf")
+        return self.case + ": " + self.key + " " + str(self.old) + " -> " + str(self.new) + \
+            " (x" + ("%.2f" % ratio) + ")"
+
+# Compares 'results' with 'baseline'. Cases are matched by the values of
+# 'caseKeys'. Returns the Regressions of the keys in 'limits', which maps
+# a measurement to its (tolerance, minimum). Cases that failed now but not
+# in the baseline are regressions as well.
+def compare(baseline, results, caseKeys, limits):
+    old = dict((caseName(result, caseKeys), result) for result in baseline)
+    regressions = []
+
+    for result in results:
+        case = caseName(result, caseKeys)
+        before = old.get(case)
+
+        if before is None:
+            continue
+
+        if result.get("error") and not before.get("error"):
+            regressions.append(Regression(case, "error", None, result["error"]))
+            continue
+
+        for key, (tolerance, minimum) in limits.items():
+            if before.get(key) is None or result.get(key) is None:
+                continue
+
+            if result[key] > before[key] * (1 + tolerance) and result[key] - before[key] > minimum:
+                regressions.append(Regression(case, key, before[key], result[key]))
+
+    return regressions
+
+def caseName(result, caseKeys):
+    return " ".join(key + "=" + str(result.get(key)) for key in caseKeys)
+
+# Writes 'results' as aligned columns.
+def table(results, keys):
+    rows = [keys] + [[formatValue(result.get(key)) for key in keys] for result in results]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(keys))]
+    return "\n".join(" ".join(value.rjust(width) for value, width in zip(row, widths)).rstrip()
+                     for row in rows)
+
+def formatValue(value):
+    if value is None:
+        return "-"
+    elif isinstance(value, float):
+        return "%.4f" % value
+    else:
+        return str(value)
+
+def defaultPath(benchmark):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), benchmark + ".json")
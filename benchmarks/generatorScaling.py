@@ -0,0 +1,225 @@
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+import benchmarks.baseline as baseline
+
+from parserGenerator.generator import CodeGenerator, ListSink
+from parserGenerator.grammar import Grammar
+from parserGenerator.pythonBackend import PythonCodeGenerator
+from parserGenerator.units import *
+
+# Measures how the code generator scales with the size of a grammar. Each
+# shape creates a synthetic grammar with 'size' rules, the generator runs
+# on it and wall time, peak memory and the size of the output are
+# recorded:
+#
+#     python -m benchmarks.generatorScaling --sizes 100,1000 --save
+#     python -m benchmarks.generatorScaling --sizes 100,1000 --compare
+#
+# Failures (eg a RecursionError) are recorded as well. --compare exits with
+# status 1 if a case got slower, needs more memory or fails now.
+
+benchmarkName = "generatorScaling"
+
+caseKeys = ["shape", "size", "backend", "options"]
+measurementKeys = ["seconds", "peakBytes", "outputBytes", "lines", "error"]
+
+# measurement -> (relative tolerance, absolute minimum)
+limits = {
+    "seconds": (0.25, 0.01),
+    "peakBytes": (0.25, 1 << 16),
+    "outputBytes": (0.05, 0),
+}
+
+################################################################################
+## Synthetic grammars ##########################################################
+################################################################################
+
+tokenCount = 8
+
+def grammarTokens():
+    lexer = Lexer("lexer")
+    HiddenToken("ws", lexer, "CharSet.chars(' ')")
+    return [Token("t" + str(i), lexer, "\"" + "abcdefgh"[i] + "\"") for i in range(tokenCount)]
+
+def newGrammar(name, start):
+    grammar = Grammar("benchmark", name, [])
+    grammar.add(start)
+    return grammar
+
+# 'size' parsers that call the next one: r0 = t0 r1 | t1, ...
+def chain(size):
+    tokens = grammarTokens()
+    parsers = [Parser("r" + str(i), [], []) for i in range(size)]
+
+    for i, parser in enumerate(parsers[:-1]):
+        parser.setDefinition(tokens[i % tokenCount] + parsers[i + 1] | tokens[(i + 1) % tokenCount])
+
+    parsers[-1].setDefinition(tokens[0])
+    return newGrammar("Chain", parsers[0])
+
+# One rule with 'size' alternatives that call different parsers.
+def wideOr(size):
+    tokens = grammarTokens()
+    parsers = []
+
+    for i in range(size):
+        parser = Parser("p" + str(i), [], [])
+        parser.setDefinition(tokens[i % tokenCount] + tokens[i // tokenCount % tokenCount])
+        parsers.append(parser)
+
+    start = Parser("start", [], [])
+    start.setDefinition(Or(*parsers))
+    return newGrammar("WideOr", start)
+
+# One rule that is a sequence of 'size' tokens.
+def deepThen(size):
+    tokens = grammarTokens()
+    unit = tokens[0]
+
+    for i in range(1, size):
+        unit = unit + tokens[i % tokenCount]
+
+    start = Parser("start", [], [])
+    start.setDefinition(unit)
+    return newGrammar("DeepThen", start)
+
+# 'size' nested repetitions: (t0 (t1 (...)*)*)*
+def nestedRep(size):
+    tokens = grammarTokens()
+    unit = tokens[0]
+
+    for i in range(1, size):
+        unit = (tokens[i % tokenCount] + unit).rep()
+
+    start = Parser("start", [], [])
+    start.setDefinition(tokens[0] + unit)
+    return newGrammar("NestedRep", start)
+
+shapes = {
+    "chain": chain,
+    "wideOr": wideOr,
+    "deepThen": deepThen,
+    "nestedRep": nestedRep,
+}
+
+################################################################################
+## Measurements ################################################################
+################################################################################
+
+backends = {
+    "java": CodeGenerator,
+    "python": PythonCodeGenerator,
+}
+
+# Generates the grammar of 'shape' and returns the measurements. The time
+# is the best of 'repeat' runs without tracemalloc, which slows down
+# allocations.
+def measure(shape, size, backend, options, memory = True, repeat = 3):
+    result = {"shape": shape, "size": size, "backend": backend, "options": optionsName(options)}
+
+    try:
+        for i in range(repeat):
+            grammar = shapes[shape](size)
+            code = backends[backend](ListSink(), **options)
+            gc.collect()
+
+            start = time.perf_counter()
+            grammar.generate(code)
+            seconds = time.perf_counter() - start
+            result["seconds"] = min(seconds, result.get("seconds", seconds))
+
+        output = code.getvalue()
+        result["outputBytes"] = len(output.encode("utf-8"))
+        result["lines"] = output.count("\n")
+        del grammar, code, output
+
+        if memory:
+            result["peakBytes"] = peakMemory(shape, size, backend, options)
+    except (RecursionError, MemoryError, TypeError) as e:
+        result["error"] = type(e).__name__ + ": " + str(e)[:80]
+
+    return result
+
+def optionsName(options):
+    return ",".join(name + "=" + str(value).lower() for name, value in sorted(options.items())) or "default"
+
+def peakMemory(shape, size, backend, options):
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        grammar = shapes[shape](size)
+        grammar.generate(backends[backend](ListSink(), **options))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run(shapeNames, sizes, backend, options, memory = True, repeat = 3, log = None):
+    results = []
+
+    for shape in shapeNames:
+        for size in sizes:
+            result = measure(shape, size, backend, options, memory, repeat)
+            results.append(result)
+
+            if log is not None:
+                log.write(baseline.caseName(result, caseKeys) + " " +
+                          baseline.formatValue(result.get("seconds")) + "s\n")
+                log.flush()
+
+    return results
+
+################################################################################
+## Command line ################################################################
+################################################################################
+
+def parseOption(text):
+    name, value = text.split("=", 1)
+
+    if value.lower() not in ("true", "false"):
+        raise argparse.ArgumentTypeError("options are true or false: " + text)
+
+    return name, value.lower() == "true"
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = "Scaling of the code generator.")
+    parser.add_argument("--sizes", default = "100,1000",
+                        help = "comma separated numbers of rules, eg 100,1000,10000,100000")
+    parser.add_argument("--shapes", default = ",".join(shapes),
+                        help = "comma separated: " + ", ".join(shapes))
+    parser.add_argument("--backend", default = "java", choices = sorted(backends))
+    parser.add_argument("--option", action = "append", default = [], type = parseOption,
+                        metavar = "NAME=true|false", help = "option of the code generator")
+    parser.add_argument("--repeat", default = 3, type = int, help = "runs per case, the fastest counts")
+    parser.add_argument("--no-memory", action = "store_true", help = "skip the tracemalloc run")
+    parser.add_argument("--save", nargs = "?", const = baseline.defaultPath(benchmarkName),
+                        metavar = "FILE", help = "store the results as baseline")
+    parser.add_argument("--compare", nargs = "?", const = baseline.defaultPath(benchmarkName),
+                        metavar = "FILE", help = "compare the results with a baseline")
+    args = parser.parse_args(args)
+
+    results = run(args.shapes.split(","), [int(size) for size in args.sizes.split(",")],
+                  args.backend, dict(args.option), not args.no_memory, args.repeat, sys.stderr)
+
+    print(baseline.table(results, caseKeys + measurementKeys))
+
+    if args.save:
+        baseline.save(args.save, benchmarkName, results)
+
+    if args.compare:
+        regressions = baseline.compare(baseline.load(args.compare, benchmarkName), results, caseKeys, limits)
+
+        for regression in regressions:
+            print("regression: " + str(regression))
+
+        if regressions:
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+import argparse
+import cProfile
+import gc
+import pstats
+import sys
+import time
+import tracemalloc
+
+import benchmarks.baseline as baseline
+import integerDemo
+import parserGenerator.runtime as runtime
+
+from parserGenerator.generator import ListSink
+from parserGenerator.interpreter import Interpreter
+from parserGenerator.pythonBackend import PythonCodeGenerator, pythonName
+from parserGenerator.sentences import SentenceGenerator
+from regexParser import charset, quoted, regex, singlequoted
+
+# Measures how fast the parsers of integerDemo.py and of the regexParser
+# grammars are. The input is created from the grammars with a
+# SentenceGenerator; sentences that the parsers do not accept are dropped.
+# Each backend parses the same corpus with each configuration of options:
+#
+#     python -m benchmarks.throughput --bytes 1000000
+#     python -m benchmarks.throughput --workloads regex --config dispatch=true,dfa=true --rules
+#
+# Like benchmarks/generatorScaling.py, --save and --compare store and
+# check a json baseline. Java code cannot be run from here, the python
+# backend and the Interpreter are measured.
+
+benchmarkName = "throughput"
+
+caseKeys = ["workload", "backend", "options", "bytes"]
+measurementKeys = ["sentences", "tokens", "seconds", "tokensPerSecond", "bytesPerSecond", "peakBytes", "rejected"]
+
+# measurement -> (relative tolerance, absolute minimum)
+limits = {
+    "seconds": (0.15, 0.01),
+    "peakBytes": (0.25, 1 << 16),
+}
+
+# The grammars in the order in which they are loaded, grammars that are
+# used by others come first.
+grammarModules = [integerDemo, singlequoted, quoted, charset, regex]
+
+# Parsers of other grammars, see SentenceGenerator and Interpreter.
+externParsers = {
+    "singleQuotedGrammar.string": singlequoted.string,
+    "quotedGrammar.string": quoted.string,
+    "charSetGrammar.charSet": charset.set,
+}
+
+# Workloads: the grammar module, its start parser and a function that
+# returns the arguments of the parser.
+workloads = {
+    "arithmetic": (integerDemo, integerDemo.sum, lambda: []),
+    "regex": (regex, regex.regex, lambda: []),
+    "quoted": (quoted, quoted.string, lambda: [[]]),
+    "charset": (charset, charset.set, lambda: [runtime.CharSet.empty()]),
+}
+
+# Configurations of the python backend. The interpreter only knows 'dfa'.
+defaultConfigs = [
+    {},
+    {"dispatch": True},
+    {"dfa": True},
+    {"dispatch": True, "dfa": True, "release": True},
+    {"tailCalls": False, "sharedUnits": False, "trackStatus": False, "optimizeLocals": False},
+]
+
+################################################################################
+## Backends ####################################################################
+################################################################################
+
+# Returns a function (text) -> parsed stream for each workload.
+def pythonParsers(options):
+    classes = {}
+
+    for module in grammarModules:
+        code = PythonCodeGenerator(ListSink(), **options)
+        module.generate(code)
+        classes[module] = code.load()
+
+    parsers = {}
+
+    for name, (module, parser, arguments) in workloads.items():
+        parsers[name] = boundParser(getattr(classes[module](), pythonName(parser.name)), arguments)
+
+    return parsers
+
+def interpreterParsers(options):
+    unknown = set(options) - {"dfa"}
+
+    if unknown:
+        raise TypeError("the interpreter does not support " + ", ".join(sorted(unknown)))
+
+    interpreter = Interpreter(pythonFunctions(), options.get("dfa", False))
+
+    for name, parser in externParsers.items():
+        interpreter.functions[name] = interpreter.parser(parser)
+
+    return dict((name, boundParser(interpreter.parser(parser), arguments))
+                for name, (module, parser, arguments) in workloads.items())
+
+def boundParser(method, arguments):
+    def parse(text):
+        stream = runtime.TokStream(text)
+        result = method(*(arguments() + [stream]))
+        return stream if result is not None and result is not False else None
+
+    return parse
+
+# Python callables for the FuncUnits of all grammars, created from their
+# python bodies.
+def pythonFunctions():
+    functions = {}
+
+    for module in grammarModules:
+        for declaration in module.grammar.lower():
+            unit = declaration.unit
+
+            if declaration.inputVars is not None and "python" in getattr(unit, "bodies", {}):
+                functions[unit] = compileFunction(unit.bodies["python"], declaration.inputVars)
+
+    return functions
+
+def compileFunction(body, inputVars):
+    source = "def function(" + ", ".join(pythonName(var) for var in inputVars) + "):\n" + \
+             "".join("    " + line + "\n" for line in body.split("\n"))
+    namespace = dict(vars(runtime))
+    exec(source, namespace)
+    return namespace["function"]
+
+backends = {
+    "python": pythonParsers,
+    "interpreter": interpreterParsers,
+}
+
+################################################################################
+## Measurements ################################################################
+################################################################################
+
+# Returns the sentences of 'workload' with at least 'size' characters, the
+# number of tokens in them and the number of rejected sentences. Only
+# sentences that 'parse' consumes completely are used.
+def corpus(workload, size, parse, seed, maxDepth):
+    def accept(text):
+        try:
+            stream = parse(text)
+        except Exception:
+            # parse errors and errors of functions, eg a division by zero.
+            return False
+
+        return stream is not None and stream.pos == len(text)
+
+    generator = SentenceGenerator(externParsers, maxDepth = maxDepth, seed = seed)
+    return generator.corpus(workloads[workload][1], size, accept)
+
+def parseAll(parse, sentences):
+    for sentence in sentences:
+        parse(sentence)
+
+def measure(workload, backend, options, parse, sentences, tokens, rejected, memory = True, repeat = 3):
+    size = sum(len(sentence) for sentence in sentences)
+    result = {"workload": workload, "backend": backend, "options": optionsName(options), "bytes": size,
+              "sentences": len(sentences), "tokens": tokens, "rejected": rejected}
+
+    for i in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        parseAll(parse, sentences)
+        seconds = time.perf_counter() - start
+        result["seconds"] = min(seconds, result.get("seconds", seconds))
+
+    result["tokensPerSecond"] = int(tokens / result["seconds"])
+    result["bytesPerSecond"] = int(size / result["seconds"])
+
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+
+        try:
+            parseAll(parse, sentences)
+            result["peakBytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return result
+
+# Time per method of the generated classes (python backend only), sorted
+# by the time spent in the method itself. Returns (name, calls, own
+# seconds, cumulative seconds).
+def ruleTimes(parse, sentences):
+    profile = cProfile.Profile()
+    profile.runcall(parseAll, parse, sentences)
+    rules = []
+
+    for (fileName, line, name), (primitiveCalls, calls, ownTime, cumulativeTime, callers) in \
+            pstats.Stats(profile).stats.items():
+        if fileName.startswith("<") and fileName.endswith(">") and "." in fileName:
+            rules.append((fileName[1:-1].rsplit(".", 1)[1] + "." + name, calls, ownTime, cumulativeTime))
+
+    return sorted(rules, key = lambda rule: -rule[2])
+
+def optionsName(options):
+    return ",".join(name + "=" + str(value).lower() for name, value in sorted(options.items())) or "default"
+
+def run(workloadNames, backendNames, configs, size, seed = 1, maxDepth = 8, memory = True, repeat = 3,
+        rules = False, log = None):
+    reference = pythonParsers({})
+    corpora = dict((workload, corpus(workload, size, reference[workload], seed, maxDepth))
+                   for workload in workloadNames)
+    results = []
+    ruleTables = []
+
+    for backend in backendNames:
+        for options in configs:
+            try:
+                parsers = backends[backend](options)
+            except TypeError as e:
+                if log is not None:
+                    log.write(backend + " " + optionsName(options) + ": " + str(e) + "\n")
+                continue
+
+            for workload in workloadNames:
+                sentences, tokens, rejected = corpora[workload]
+                result = measure(workload, backend, options, parsers[workload], sentences, tokens,
+                                 rejected, memory, repeat)
+                results.append(result)
+
+                if rules and backend == "python":
+                    ruleTables.append((baseline.caseName(result, caseKeys),
+                                       ruleTimes(parsers[workload], sentences)))
+
+                if log is not None:
+                    log.write(baseline.caseName(result, caseKeys) + " " +
+                              baseline.formatValue(result["seconds"]) + "s\n")
+                    log.flush()
+
+    return results, ruleTables
+
+################################################################################
+## Command line ################################################################
+################################################################################
+
+def parseConfig(text):
+    options = {}
+
+    if text == "default":
+        return options
+
+    for item in text.split(","):
+        name, value = item.split("=", 1)
+
+        if value.lower() not in ("true", "false"):
+            raise argparse.ArgumentTypeError("options are true or false: " + item)
+
+        options[name] = value.lower() == "true"
+
+    return options
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = "Throughput of the generated parsers.")
+    parser.add_argument("--workloads", default = ",".join(workloads),
+                        help = "comma separated: " + ", ".join(workloads))
+    parser.add_argument("--backends", default = ",".join(backends),
+                        help = "comma separated: " + ", ".join(backends))
+    parser.add_argument("--config", action = "append", type = parseConfig, metavar = "NAME=true|false,...",
+                        help = "options of the code generator or 'default', may be repeated")
+    parser.add_argument("--bytes", default = 100000, type = int, help = "size of each corpus")
+    parser.add_argument("--seed", default = 1, type = int)
+    parser.add_argument("--depth", default = 8, type = int, help = "maximum depth of nested parsers")
+    parser.add_argument("--repeat", default = 3, type = int, help = "runs per case, the fastest counts")
+    parser.add_argument("--no-memory", action = "store_true", help = "skip the tracemalloc run")
+    parser.add_argument("--rules", action = "store_true", help = "profile the time per rule")
+    parser.add_argument("--save", nargs = "?", const = baseline.defaultPath(benchmarkName),
+                        metavar = "FILE", help = "store the results as baseline")
+    parser.add_argument("--compare", nargs = "?", const = baseline.defaultPath(benchmarkName),
+                        metavar = "FILE", help = "compare the results with a baseline")
+    args = parser.parse_args(args)
+
+    results, ruleTables = run(args.workloads.split(","), args.backends.split(","), args.config or defaultConfigs,
+                              args.bytes, args.seed, args.depth, not args.no_memory, args.repeat, args.rules,
+                              sys.stderr)
+
+    print(baseline.table(results, caseKeys + measurementKeys))
+
+    for case, rules in ruleTables:
+        print("\n" + case)
+        print(baseline.table([{"rule": name, "calls": calls, "ownSeconds": ownTime, "seconds": cumulativeTime}
+                              for name, calls, ownTime, cumulativeTime in rules[:15]],
+                             ["rule", "calls", "ownSeconds", "seconds"]))
+
+    if args.save:
+        baseline.save(args.save, benchmarkName, results)
+
+    if args.compare:
+        regressions = baseline.compare(baseline.load(args.compare, benchmarkName), results, caseKeys, limits)
+
+        for regression in regressions:
+            print("regression: " + str(regression))
+
+        if regressions:
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
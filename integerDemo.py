@@ -1,25 +1,19 @@
+from parserGenerator.generator import CodeGenerator
+from parserGenerator.grammar import Grammar
 from parserGenerator.units import *
 
 
 packageName = "pythonGenerator"
 className = "Grammar"
 
-# Do it.
-code = CodeGenerator()
-
-# Header
-
-code.addLine("package " + packageName + ";\n")
-code.addLine("import at.searles.parsing.lexer.Lexer;")
-code.addLine("import at.searles.parsing.lexer.TokStream;")
-code.addLine("import at.searles.parsing.lexer.Token;")
-code.addLine("import at.searles.parsing.lexer.TokenSet;")
-code.addLine("import at.searles.parsing.regex.CharSet;")
-code.addLine("import at.searles.parsing.regex.Regex;")
-
-# Start class
-
-code.beginBlock("public class " + className)
+imports = [
+    "at.searles.parsing.lexer.Lexer",
+    "at.searles.parsing.lexer.TokStream",
+    "at.searles.parsing.lexer.Token",
+    "at.searles.parsing.lexer.TokenSet",
+    "at.searles.parsing.regex.CharSet",
+    "at.searles.parsing.regex.Regex",
+]
 
 # Part 1: Functions to combine tokens
 
@@ -39,12 +33,13 @@ mul.setBody("return a * b;")
 div.setBody("return a / b;")
 neg.setBody("return -a;")
 
-toNum.declare(code, ["seq"])
-add.declare(code, ["a", "b"])
-sub.declare(code, ["a", "b"])
-mul.declare(code, ["a", "b"])
-div.declare(code, ["a", "b"])
-neg.declare(code, ["a"])
+toNum.setBody("return ord(seq[0]) - ord('0')", "python")
+add.setBody("return a + b", "python")
+sub.setBody("return a - b", "python")
+mul.setBody("return a * b", "python")
+div.setBody("q = abs(a) // abs(b)\n"
+            "return q if (a < 0) == (b < 0) else -q", "python")
+neg.setBody("return -a", "python")
 
 # Part 2: Define Tokens and lexers
 
@@ -58,9 +53,6 @@ open = Token("open", lexer, "\"(\"")
 close = Token("close", lexer, "\")\"")
 numTok = Token("num", lexer, "CharSet.interval('0', '9')")
 
-# These will be declared as members
-members = [ lexer, ws, plus, minus, times, slash, open, close, numTok ]
-
 # Part 3: Define Parsers
 
 sum = Parser("sum", [], ["Integer"])
@@ -69,9 +61,6 @@ negated = Parser("negated", [], ["Integer"])
 term = Parser("term", [], ["Integer"])
 num = TokenParser("num", numTok, toNum)
 
-# These parsers will be added as methods
-parsers = [sum, product, negated, term, num]
-
 # Grammar rules
 
 sum.setDefinition(
@@ -97,19 +86,22 @@ term.setDefinition(
     num | open + sum + close
 )
 
+# Part 4: The class. Tokens, lexers and parsers that are used by 'sum' are
+# declared as well.
 
-# Add declarations to code
-for m in members:
-    m.declare(code)
-
-for p in parsers:
-    p.declare(code, [], "stream")
-
-# Error handling
+grammar = Grammar(packageName, className, imports)
+grammar.add(sum)
+grammar.add(toNum, ["seq"])
+grammar.add(add, ["a", "b"])
+grammar.add(sub, ["a", "b"])
+grammar.add(mul, ["a", "b"])
+grammar.add(div, ["a", "b"])
+grammar.add(neg, ["a"])
 
-code.beginBlock("private void parsingError(TokStream stream, String expected)")
-code.addLine("throw new IllegalArgumentException(\"Expected \" + expected + \" at \" + stream);")
-code.endBlock()
+# Writes the grammar class to 'code'.
+def generate(code):
+    grammar.generate(code)
 
-code.endBlock()
+if __name__ == "__main__":
+    generate(CodeGenerator())
 
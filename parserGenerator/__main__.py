@@ -0,0 +1,23 @@
+import argparse
+import sys
+
+import parserGenerator.build as build
+
+# Command line of the parser generator:
+#
+#     python -m parserGenerator build [root] [--out DIR] [--backend python] ...
+
+def main(args = None):
+    parser = argparse.ArgumentParser(prog = "python -m parserGenerator")
+    commands = parser.add_subparsers(dest = "command")
+    build.addArguments(commands.add_parser("build", help = "build all grammar scripts below a directory"))
+    args = parser.parse_args(args)
+
+    if args.command == "build":
+        return build.run(args)
+
+    parser.print_help()
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+import parserGenerator.runtime as runtime
+
+from parserGenerator.units import *
+
+# Returns the units that 'unit' refers to. The definition of a parser is its
+# only child.
+def children(unit):
+    if isinstance(unit, Parser):
+        if unit.definition is None:
+            raise TypeError("parser " + unit.name + " has no definition")
+
+        return [unit.definition]
+    elif isinstance(unit, TokenParser):
+        return [unit.token, unit.func]
+    elif isinstance(unit, (Or, Then)):
+        return list(unit.elements)
+    elif isinstance(unit, Closure):
+        # the sync token of a Recover is declared with the grammar.
+        return unit.children()
+    else:
+        return []
+
+# Returns all parsers that are reachable from 'units' in the order in
+# which they are found.
+# @excluded units that are not entered, eg parsers that were handled
+#   before together with the parsers that they reach.
+def reachableParsers(units, excluded = ()):
+    parsers = []
+    visited = set()
+    stack = list(reversed(units))
+
+    while stack:
+        unit = stack.pop()
+
+        if unit in visited or unit in excluded:
+            continue
+
+        visited.add(unit)
+
+        if isinstance(unit, Parser):
+            parsers.append(unit)
+
+        stack.extend(reversed(children(unit)))
+
+    return parsers
+
+# Returns the strongly connected components of the graph of 'nodes' in
+# reverse topological order. 'successors' returns the successors of a node.
+# This is Tarjan's algorithm without recursion.
+def stronglyConnectedComponents(nodes, successors):
+    index = {}
+    lowLink = {}
+    stack = []
+    onStack = set()
+    components = []
+
+    for root in nodes:
+        if root in index:
+            continue
+
+        index[root] = lowLink[root] = len(index)
+        stack.append(root)
+        onStack.add(root)
+        work = [(root, iter(successors(root)))]
+
+        while work:
+            node, nexts = work[-1]
+
+            for next in nexts:
+                if next not in index:
+                    index[next] = lowLink[next] = len(index)
+                    stack.append(next)
+                    onStack.add(next)
+                    work.append((next, iter(successors(next))))
+                    break
+                elif next in onStack:
+                    lowLink[node] = min(lowLink[node], index[next])
+            else:
+                work.pop()
+
+                if work:
+                    parent = work[-1][0]
+                    lowLink[parent] = min(lowLink[parent], lowLink[node])
+
+                if lowLink[node] == index[node]:
+                    component = []
+
+                    while True:
+                        member = stack.pop()
+                        onStack.discard(member)
+                        component.append(member)
+
+                        if member is node:
+                            break
+
+                    components.append(component)
+
+    return components
+
+# Returns the calls of 'parser' in tail position in its definition, ie the
+# result of the call is the result of the parser, and the unit that
+# parsingError reports if the parser fails after such a call. Such calls
+# can be replaced by a jump to the start. Tails are Thens whose last
+# element is the call and Ors whose last alternative is the call. The Or
+# must be the last element of a Then, then it is reported instead of the
+# parser. Calls that report another unit than the first tail are kept.
+# Returns (tails, unit).
+def tailCalls(parser):
+    # tail -> reported unit
+    tails = {}
+    others = set()
+    # (unit, isTail, whether it is the last element of a Then that calls a
+    # parser before it)
+    stack = [(parser.definition, True, False)]
+
+    while stack:
+        unit, isTail, isAfterParser = stack.pop()
+
+        if isinstance(unit, Or):
+            # other alternatives must be tried if an earlier one fails.
+            if isTail and isAfterParser and unit.elements[-1] is parser:
+                tails.setdefault(unit, unit)
+            else:
+                others.add(unit)
+
+            stack.extend((element, isTail, False) for element in unit.elements)
+        elif isinstance(unit, Then):
+            prefix = unit.elements[:-1]
+            last = unit.elements[-1]
+            callsParser = any(element.isParserUnit for element in prefix)
+
+            # values that the other elements leave on the stack are part
+            # of the result.
+            isTail = isTail and len(sequenceTypes(prefix)[1]) <= len(last.inputTypes)
+
+            if isTail and last is parser and callsParser:
+                tails.setdefault(unit, parser)
+            else:
+                others.add(unit)
+                stack.append((last, isTail, callsParser))
+
+            stack.extend((element, False, False) for element in prefix)
+        elif isinstance(unit, Closure):
+            stack.append((unit.child, False, False))
+
+    tails = dict((tail, reported) for tail, reported in tails.items() if tail not in others)
+
+    if not tails:
+        return set(), None
+
+    reported = next(iter(tails.values()))
+    return set(tail for tail in tails if tails[tail] is reported), reported
+
+# Union of two FIRST sets. None stands for an unknown set.
+def unionFirst(first, second):
+    if first is None or second is None:
+        return None
+
+    return first | second
+
+# Static properties of units:
+#
+# * nullable: the unit may succeed without consuming input.
+# * FIRST: the tokens that a unit can start with if it consumes input. It
+#   is None if this is unknown, eg for ExternFunctions that are parsers.
+#
+# Parsers may be recursive, therefore their properties are computed by a
+# fixpoint iteration when they are first needed. Parsers must not be
+# changed afterwards.
+class Analysis:
+    def __init__(self):
+        # parser -> (nullable, first)
+        self.parsers = {}
+        # token -> CharSet or None
+        self.charSets = {}
+
+    def nullable(self, unit):
+        return self.properties(unit)[0]
+
+    def first(self, unit):
+        return self.properties(unit)[1]
+
+    def properties(self, unit):
+        parsers = self.newParsers(unit)
+
+        if parsers:
+            self.solve(parsers)
+
+        return self.evaluate(unit)
+
+    # Returns all parsers that are reachable from 'unit' and that have not
+    # been analyzed yet.
+    def newParsers(self, unit):
+        parsers = []
+        visited = set()
+        stack = [unit]
+
+        while stack:
+            unit = stack.pop()
+
+            if unit in visited or unit in self.parsers:
+                continue
+
+            visited.add(unit)
+
+            if isinstance(unit, Parser):
+                parsers.append(unit)
+
+            stack.extend(children(unit))
+
+        return parsers
+
+    # Updates the properties of 'parsers' until nothing changes. Both
+    # properties only grow, hence this terminates. Parsers that were
+    # analyzed before cannot depend on them.
+    def solve(self, parsers):
+        for parser in parsers:
+            self.parsers[parser] = (False, frozenset())
+
+        changed = True
+
+        while changed:
+            changed = False
+
+            for parser in parsers:
+                value = self.parsers[parser]
+                newValue = self.evaluate(parser.definition)
+
+                if newValue != value:
+                    self.parsers[parser] = newValue
+                    changed = True
+
+    def evaluate(self, unit):
+        if isinstance(unit, Parser):
+            return self.parsers[unit]
+        elif isinstance(unit, Token):
+            return False, frozenset([unit])
+        elif isinstance(unit, TokenParser):
+            return False, frozenset([unit.token])
+        elif isinstance(unit, NamedUnit):
+            # functions do not consume input, nothing is known about
+            # parsers of other grammars.
+            return True, None if unit.isParserUnit else frozenset()
+        elif isinstance(unit, Pass):
+            return True, frozenset()
+        elif isinstance(unit, Or):
+            nullable = False
+            first = frozenset()
+
+            for element in unit.elements:
+                elementNullable, elementFirst = self.evaluate(element)
+                nullable = nullable or elementNullable
+                first = unionFirst(first, elementFirst)
+
+            return nullable, first
+        elif isinstance(unit, Then):
+            first = frozenset()
+
+            # elements after one that is not nullable do not contribute.
+            for element in unit.elements:
+                elementNullable, elementFirst = self.evaluate(element)
+                first = unionFirst(first, elementFirst)
+
+                if not elementNullable:
+                    return False, first
+
+            return True, first
+        elif isinstance(unit, Recover):
+            return self.evaluate(unit.child)
+        elif isinstance(unit, Closure):
+            return True, self.evaluate(unit.child)[1]
+        else:
+            raise TypeError("cannot analyze " + type(unit).__name__)
+
+    # Returns the CharSet of characters that 'token' can start with or
+    # None if its definition cannot be evaluated by the runtime.
+    def firstChars(self, token):
+        if token not in self.charSets:
+            try:
+                self.charSets[token] = runtime.evalRegex(token.regex).firstChars()
+            except (NameError, AttributeError, SyntaxError, TypeError):
+                self.charSets[token] = None
+
+        return self.charSets[token]
+
+    # Finds the longest prefix of 'alternatives' in which each alternative
+    # can be selected by the next character after hidden tokens. Returns
+    # None if there are less than two or (lexer, count, table) where
+    # 'table' is a sorted list of disjoint intervals (start, end, index).
+    def dispatchTable(self, alternatives):
+        lexer = None
+        seen = runtime.CharSet.empty()
+        table = []
+        count = 0
+
+        for alternative in alternatives:
+            first = self.first(alternative)
+
+            if first is None or not first or self.nullable(alternative):
+                break
+
+            if lexer is None:
+                lexer = next(iter(first)).lexer
+
+            chars = runtime.CharSet.empty()
+
+            for token in first:
+                tokenChars = self.firstChars(token)
+
+                if token.lexer is not lexer or tokenChars is None:
+                    chars = None
+                    break
+
+                chars = chars.union(tokenChars)
+
+            if chars is None or chars.intersects(seen):
+                break
+
+            seen = seen.union(chars)
+            table.extend((start, end, count) for start, end in chars.intervals)
+            count += 1
+
+        if count < 2:
+            return None
+
+        return lexer, count, sorted(table)
@@ -0,0 +1,448 @@
+import argparse
+import ast
+import concurrent.futures
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+
+from parserGenerator.analysis import stronglyConnectedComponents
+from parserGenerator.fragments import FragmentCache
+from parserGenerator.generator import CodeGenerator, StreamSink
+from parserGenerator.pythonBackend import PythonCodeGenerator
+from parserGenerator.units import Object
+
+# Builds all grammar scripts below a directory:
+#
+#     python -m parserGenerator build --out build --backend python
+#
+# A grammar script is a module that assigns a Grammar at module level. It
+# is found without importing it. The scripts are imported to find the
+# classes of other grammars that they use via Object. Grammars are built
+# after the ones that they use, independent ones in parallel in a process
+# pool. Each class is written to '<out>/<package>/<className>.<ext>'.
+#
+# A grammar is only rebuilt if its key changed. The key is a hash of its
+# script, the local modules that it imports, the sources of
+# parserGenerator, the backend, the options and the keys of the grammars
+# that it uses. Keys are stored in '<out>/.parserGenerator-build.json'.
+
+manifestName = ".parserGenerator-build.json"
+manifestVersion = 1
+
+backends = {
+    "java": (CodeGenerator, ".java"),
+    "python": (PythonCodeGenerator, ".py"),
+}
+
+skippedDirectories = ("__pycache__", "parserGenerator")
+
+################################################################################
+## Discovery ###################################################################
+################################################################################
+
+# A grammar script. 'grammarName' is the module level name of its Grammar.
+class GrammarModule:
+    def __init__(self, moduleName, path, grammarName):
+        self.moduleName = moduleName
+        self.path = path
+        self.grammarName = grammarName
+        # set by 'inspect'
+        self.packageName = None
+        self.className = None
+        # class names of the Objects that the grammar declares
+        self.usedClasses = []
+        # GrammarModules that create these classes
+        self.dependencies = []
+        self.key = None
+        # lines of the error if the script cannot be imported
+        self.error = None
+
+    def outputPath(self, out, extension):
+        return os.path.join(out, *(self.packageName.split(".") + [self.className + extension]))
+
+# Returns the GrammarModules of the python files below 'root', sorted by
+# module name. Directories that start with '.' and 'excluded' paths are
+# skipped.
+def discover(root, excluded = ()):
+    modules = []
+    excluded = set(os.path.abspath(path) for path in excluded)
+
+    for directory, directoryNames, fileNames in os.walk(root):
+        directoryNames[:] = sorted(name for name in directoryNames
+                                   if not name.startswith(".") and name not in skippedDirectories and
+                                   os.path.abspath(os.path.join(directory, name)) not in excluded)
+
+        for fileName in sorted(fileNames):
+            if not fileName.endswith(".py") or fileName == "__init__.py":
+                continue
+
+            path = os.path.join(directory, fileName)
+            grammarName = findGrammarName(readSource(path))
+
+            if grammarName is not None:
+                modules.append(GrammarModule(moduleName(root, path), path, grammarName))
+
+    return sorted(modules, key = lambda module: module.moduleName)
+
+def readSource(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+# Returns the name of the first module level assignment 'name = Grammar(...)'
+# in 'source' or None.
+def findGrammarName(source):
+    if b"Grammar(" not in source:
+        return None
+
+    for statement in ast.parse(source).body:
+        if isinstance(statement, ast.Assign) and isinstance(statement.value, ast.Call) and \
+                isinstance(statement.value.func, ast.Name) and statement.value.func.id == "Grammar" and \
+                len(statement.targets) == 1 and isinstance(statement.targets[0], ast.Name):
+            return statement.targets[0].id
+
+    return None
+
+def moduleName(root, path):
+    relativePath = os.path.splitext(os.path.relpath(path, root))[0]
+    return ".".join(relativePath.split(os.sep))
+
+# Returns the paths of the modules below 'root' that the python file at
+# 'path' imports, including their imports.
+def localImports(root, path):
+    found = []
+    stack = [path]
+
+    while stack:
+        for statement in ast.walk(ast.parse(readSource(stack.pop()))):
+            if isinstance(statement, ast.Import):
+                names = [alias.name for alias in statement.names]
+            elif isinstance(statement, ast.ImportFrom) and statement.module and not statement.level:
+                names = [statement.module] + [statement.module + "." + alias.name for alias in statement.names]
+            else:
+                continue
+
+            for name in names:
+                if name.split(".")[0] in skippedDirectories:
+                    continue
+
+                candidate = os.path.join(root, *name.split(".")) + ".py"
+
+                if os.path.isfile(candidate) and candidate != path and candidate not in found:
+                    found.append(candidate)
+                    stack.append(candidate)
+
+    return sorted(found)
+
+################################################################################
+## Dependencies and keys #######################################################
+################################################################################
+
+# Imports the scripts and sets their class names and dependencies. Returns
+# the ones that can be imported.
+def inspect(root, modules):
+    if root not in sys.path:
+        sys.path.insert(0, root)
+
+    byClassName = {}
+    imported = []
+
+    for module in modules:
+        try:
+            grammar = getattr(importlib.import_module(module.moduleName), module.grammarName)
+        except Exception as e:
+            module.error = errorLines(e)
+            continue
+
+        imported.append(module)
+        module.packageName = grammar.packageName
+        module.className = grammar.className
+        module.usedClasses = [declaration.unit.className for declaration in grammar.lower()
+                              if isinstance(declaration.unit, Object)]
+
+        if module.className in byClassName:
+            raise TypeError("class " + module.className + " is created by " +
+                            byClassName[module.className].moduleName + " and " + module.moduleName)
+
+        byClassName[module.className] = module
+
+    for module in imported:
+        module.dependencies = [byClassName[className] for className in module.usedClasses
+                               if className in byClassName]
+
+    return imported
+
+# Returns lists of GrammarModules that use each other, grammars that they
+# use come first.
+def buildOrder(modules):
+    return stronglyConnectedComponents(modules, lambda module: module.dependencies)
+
+# Sets the keys of the modules. Grammars that use each other share a key.
+def computeKeys(root, modules, backend, options):
+    base = hashlib.sha256()
+    base.update((backend + " " + json.dumps(sorted(options.items()))).encode("utf-8"))
+    base.update(sourcesHash(os.path.dirname(os.path.abspath(__file__))).encode("ascii"))
+
+    for component in buildOrder(modules):
+        digest = base.copy()
+
+        for module in sorted(component, key = lambda module: module.moduleName):
+            for path in [module.path] + localImports(root, module.path):
+                digest.update(readSource(path))
+
+            for dependency in module.dependencies:
+                if dependency not in component:
+                    digest.update(dependency.key.encode("ascii"))
+
+        key = digest.hexdigest()
+
+        for module in component:
+            module.key = key
+
+# Hash of the python files in 'directory', ie the version of the generator.
+def sourcesHash(directory):
+    digest = hashlib.sha256()
+
+    for fileName in sorted(os.listdir(directory)):
+        if fileName.endswith(".py"):
+            digest.update(fileName.encode("utf-8"))
+            digest.update(readSource(os.path.join(directory, fileName)))
+
+    return digest.hexdigest()
+
+def loadManifest(out):
+    try:
+        with open(os.path.join(out, manifestName)) as file:
+            data = json.load(file)
+    except (IOError, ValueError):
+        return {}
+
+    return data.get("grammars", {}) if data.get("version") == manifestVersion else {}
+
+def saveManifest(out, grammars):
+    path = os.path.join(out, manifestName)
+
+    with open(path + ".tmp", "w") as file:
+        json.dump({"version": manifestVersion, "grammars": grammars}, file, indent = 1, sort_keys = True)
+        file.write("\n")
+
+    os.replace(path + ".tmp", path)
+
+################################################################################
+## Building ####################################################################
+################################################################################
+
+# Generates the class of one grammar script. Runs in a worker process,
+# hence it only receives names. Returns the seconds and the warnings of
+# the hazards pass.
+# @cache directory of a FragmentCache or None.
+def buildModule(root, moduleName, grammarName, backend, options, outputPath, cache = None):
+    if root not in sys.path:
+        sys.path.insert(0, root)
+
+    start = time.perf_counter()
+    grammar = getattr(importlib.import_module(moduleName), grammarName)
+
+    if cache is not None:
+        grammar.fragmentCache = FragmentCache(cache)
+
+    generatorClass = backends[backend][0]
+    directory = os.path.dirname(outputPath)
+
+    if directory:
+        os.makedirs(directory, exist_ok = True)
+
+    # the file is replaced at once so that a failed build leaves no
+    # partial class behind.
+    with open(outputPath + ".tmp", "w") as file:
+        grammar.generate(generatorClass(StreamSink(file), **options))
+
+    os.replace(outputPath + ".tmp", outputPath)
+    return time.perf_counter() - start, [str(hazard) for hazard in grammar.hazards]
+
+# Result of building one grammar script. 'status' is "built", "upToDate",
+# "failed" or "skipped" (a grammar that it uses failed).
+class BuildResult:
+    def __init__(self, module, status, seconds = 0.0, messages = None):
+        self.module = module
+        self.status = status
+        self.seconds = seconds
+        self.messages = messages if messages is not None else []
+
+    def __str__(self):
+        line = self.status + " " + self.module.moduleName
+
+        if self.module.className is not None:
+            line += " -> " + self.module.className
+
+        if self.status == "built":
+            line += " (" + ("%.3f" % self.seconds) + " s)"
+
+        return "\n".join([line] + ["    " + message for message in self.messages])
+
+# Builds the grammar scripts below 'root' into 'out' and returns the
+# BuildResults sorted by module name.
+# @jobs number of worker processes. With 1, everything runs in this
+#   process.
+# @force rebuild all grammars.
+# @log receives each BuildResult when it is finished.
+# @cache directory of a FragmentCache that the grammars share, see
+#   fragments.py.
+def build(root, out, backend = "java", options = {}, jobs = None, force = False, log = None, cache = None):
+    root = os.path.abspath(root)
+    out = os.path.abspath(out)
+    extension = backends[backend][1]
+
+    modules = discover(root, [out])
+    imported = inspect(root, modules)
+    computeKeys(root, imported, backend, options)
+
+    manifest = {} if force else loadManifest(out)
+    outputs = dict((module, module.outputPath(out, extension)) for module in imported)
+    results = {}
+    newManifest = {}
+
+    def finish(result):
+        results[result.module] = result
+
+        if result.status in ("built", "upToDate"):
+            newManifest[result.module.moduleName] = {"key": result.module.key,
+                                                     "output": os.path.relpath(outputs[result.module], out)}
+
+        if log is not None:
+            log(result)
+
+    failedImports = [module.moduleName for module in modules if module.error is not None]
+
+    for module in modules:
+        if module.error is not None:
+            finish(BuildResult(module, "failed", 0.0, module.error))
+        elif failedImports:
+            # the class may be created by a script that failed.
+            unknown = [className for className in module.usedClasses
+                       if className not in [dependency.className for dependency in module.dependencies]]
+
+            if unknown:
+                finish(BuildResult(module, "skipped", 0.0, ["uses " + unknown[0] + ", " +
+                                                            ", ".join(failedImports) + " cannot be imported"]))
+
+    # grammars without changes are done before anything is built.
+    for module in imported:
+        entry = manifest.get(module.moduleName)
+
+        if module not in results and entry is not None and entry.get("key") == module.key and \
+                os.path.isfile(outputs[module]):
+            finish(BuildResult(module, "upToDate"))
+
+    # in build order, so that without workers one pass builds everything.
+    components = dict((module, component) for component in buildOrder(imported) for module in component)
+    pending = [module for module in components if module not in results]
+    executor = concurrent.futures.ProcessPoolExecutor(jobs) if jobs != 1 and len(pending) > 1 else None
+    running = {}
+
+    try:
+        while pending or running:
+            for module in list(pending):
+                failed = [dependency for dependency in module.dependencies
+                          if dependency in results and results[dependency].status in ("failed", "skipped")]
+
+                if failed:
+                    pending.remove(module)
+                    finish(BuildResult(module, "skipped", 0.0, ["uses " + failed[0].moduleName]))
+                elif all(dependency in results or dependency in components[module]
+                         for dependency in module.dependencies):
+                    # grammars that use each other are built together.
+                    pending.remove(module)
+                    arguments = (root, module.moduleName, module.grammarName, backend, options, outputs[module],
+                                 cache and os.path.abspath(cache))
+
+                    if executor is None:
+                        finish(runBuild(module, buildModule, arguments))
+                    else:
+                        running[executor.submit(buildModule, *arguments)] = module
+
+            if not running:
+                assert not pending
+                continue
+
+            done, notDone = concurrent.futures.wait(running, return_when = concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                module = running.pop(future)
+                finish(runBuild(module, future.result))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    os.makedirs(out, exist_ok = True)
+    saveManifest(out, newManifest)
+    return [results[module] for module in modules]
+
+# Calls 'function' and returns a BuildResult, errors of the grammar become
+# a failed result.
+def runBuild(module, function, arguments = ()):
+    try:
+        seconds, messages = function(*arguments)
+        return BuildResult(module, "built", seconds, messages)
+    except Exception as e:
+        return BuildResult(module, "failed", 0.0, errorLines(e))
+
+def errorLines(e):
+    return (type(e).__name__ + ": " + str(e)).split("\n")
+
+################################################################################
+## Command line ################################################################
+################################################################################
+
+def parseOption(text):
+    if "=" not in text:
+        raise argparse.ArgumentTypeError("options are NAME=true or NAME=false: " + text)
+
+    name, value = text.split("=", 1)
+
+    if value.lower() not in ("true", "false"):
+        raise argparse.ArgumentTypeError("options are true or false: " + text)
+
+    return name, value.lower() == "true"
+
+def addArguments(parser):
+    parser.add_argument("root", nargs = "?", default = ".", help = "directory with the grammar scripts")
+    parser.add_argument("--out", default = "build", help = "directory for the generated classes")
+    parser.add_argument("--backend", default = "java", choices = sorted(backends))
+    parser.add_argument("--option", action = "append", default = [], type = parseOption,
+                        metavar = "NAME=true|false", help = "option of the code generator")
+    parser.add_argument("--jobs", type = int, default = None,
+                        help = "number of worker processes, 1 builds in this process")
+    parser.add_argument("--force", action = "store_true", help = "rebuild grammars without changes")
+    parser.add_argument("--cache", metavar = "DIR",
+                        help = "reuse the code of unchanged rules from this directory")
+    parser.add_argument("--quiet", action = "store_true", help = "only print failed grammars")
+
+# Runs the build for parsed arguments and returns the exit status, 1 if a
+# grammar failed.
+def run(args):
+    def log(result):
+        if not args.quiet or result.status in ("failed", "skipped"):
+            print(str(result))
+            sys.stdout.flush()
+
+    results = build(args.root, args.out, args.backend, dict(args.option), args.jobs, args.force, log,
+                    args.cache)
+    counts = dict((status, 0) for status in ("built", "upToDate", "failed", "skipped"))
+
+    for result in results:
+        counts[result.status] += 1
+
+    print(", ".join(str(count) + " " + status for status, count in counts.items()))
+    return 1 if counts["failed"] or counts["skipped"] else 0
+
+def main(args = None):
+    parser = argparse.ArgumentParser(prog = "python -m parserGenerator build",
+                                     description = "Builds all grammar scripts below a directory.")
+    addArguments(parser)
+    return run(parser.parse_args(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
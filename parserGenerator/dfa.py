@@ -0,0 +1,239 @@
+import bisect
+
+from parserGenerator.runtime import *
+
+# Compiles the regexes of all tokens of a lexer into one minimized DFA. A
+# state of the DFA knows all tokens that match up to it, so a single pass
+# over the input finds the longest match of every token (see runtime.Dfa).
+
+################################################################################
+## NFA #########################################################################
+################################################################################
+
+class Nfa:
+    def __init__(self):
+        # per state: list of (CharSet, target)
+        self.edges = []
+        # per state: list of targets
+        self.epsilons = []
+        # final state -> token index
+        self.accepts = {}
+
+    def newState(self):
+        self.edges.append([])
+        self.epsilons.append([])
+        return len(self.edges) - 1
+
+    # Adds the states for 'regex' between 'start' and a new state which is
+    # returned.
+    def add(self, regex, start):
+        if isinstance(regex, CharSet):
+            end = self.newState()
+
+            if regex.bounds:
+                self.edges[start].append((regex, end))
+
+            return end
+        elif isinstance(regex, RegexText):
+            for ch in regex.string:
+                end = self.newState()
+                self.edges[start].append((CharSet.chars(ch), end))
+                start = end
+
+            return start
+        elif isinstance(regex, RegexThen):
+            return self.add(regex.second, self.add(regex.first, start))
+        elif isinstance(regex, RegexOr):
+            end = self.newState()
+            self.epsilons[self.add(regex.first, start)].append(end)
+            self.epsilons[self.add(regex.second, start)].append(end)
+            return end
+        elif isinstance(regex, RegexRange):
+            for i in range(regex.min):
+                start = self.add(regex.child, start)
+
+            if regex.max is None:
+                # loop that can be left before each iteration.
+                loop = self.newState()
+                self.epsilons[start].append(loop)
+                self.epsilons[self.add(regex.child, loop)].append(loop)
+                return loop
+
+            end = self.newState()
+
+            for i in range(regex.max - regex.min):
+                self.epsilons[start].append(end)
+                start = self.add(regex.child, start)
+
+            self.epsilons[start].append(end)
+            return end
+        elif isinstance(regex, RegexNonGreedy):
+            return self.add(regex.child, start)
+        else:
+            raise TypeError("cannot compile " + type(regex).__name__)
+
+    def closure(self, states):
+        closure = set(states)
+        stack = list(states)
+
+        while stack:
+            for target in self.epsilons[stack.pop()]:
+                if target not in closure:
+                    closure.add(target)
+                    stack.append(target)
+
+        return frozenset(closure)
+
+# True if 'regex' contains a non-greedy part. Such tokens use their shortest
+# match, which is what the re-module finds for tokens like '"/*" .*! "*/"'.
+def isNonGreedy(regex):
+    if isinstance(regex, RegexNonGreedy):
+        return True
+    elif isinstance(regex, (RegexThen, RegexOr)):
+        return isNonGreedy(regex.first) or isNonGreedy(regex.second)
+    elif isinstance(regex, RegexRange):
+        return isNonGreedy(regex.child)
+    else:
+        return False
+
+################################################################################
+## DFA #########################################################################
+################################################################################
+
+# Returns a minimized Dfa for 'regexes'. Tokens are identified by their
+# index in 'regexes', which is also their priority (lower index first).
+def compileDfa(regexes):
+    nfa = Nfa()
+    start = nfa.newState()
+
+    for index, regex in enumerate(regexes):
+        nfa.accepts[nfa.add(toRegex(regex), start)] = index
+
+    # The alphabet consists of atoms, ie intervals that no CharSet splits.
+    bounds = {0}
+
+    for edges in nfa.edges:
+        for charSet, target in edges:
+            bounds.update(charSet.bounds)
+
+    bounds.discard(MAX_CHAR + 1)
+    bounds = sorted(bounds)
+
+    # per state: list of (atoms, target)
+    atomEdges = []
+
+    for edges in nfa.edges:
+        atomEdges.append([(range(bisect.bisect_left(bounds, charSet.bounds[i]),
+                                 bisect.bisect_left(bounds, charSet.bounds[i + 1])), target)
+                          for charSet, target in edges for i in range(0, len(charSet.bounds), 2)])
+
+    transitions, accepts = subsetConstruction(nfa, atomEdges)
+    transitions, accepts = minimize(transitions, accepts)
+
+    return tables(bounds, transitions, accepts, [index for index, regex in enumerate(regexes)
+                                                 if isNonGreedy(toRegex(regex))])
+
+# Returns the DFA as (transitions, accepts) where 'transitions' is a list of
+# dicts atom -> state and 'accepts' a list of sorted token tuples.
+def subsetConstruction(nfa, atomEdges):
+    startState = nfa.closure([0])
+    states = {startState: 0}
+    queue = [startState]
+    transitions = []
+    accepts = []
+
+    while len(transitions) < len(queue):
+        nfaStates = queue[len(transitions)]
+        moves = {}
+
+        for nfaState in nfaStates:
+            for atoms, target in atomEdges[nfaState]:
+                for atom in atoms:
+                    moves.setdefault(atom, set()).add(target)
+
+        row = {}
+
+        for atom, targets in moves.items():
+            target = nfa.closure(targets)
+
+            if target not in states:
+                states[target] = len(queue)
+                queue.append(target)
+
+            row[atom] = states[target]
+
+        transitions.append(row)
+        accepts.append(tuple(sorted(nfa.accepts[state] for state in nfaStates if state in nfa.accepts)))
+
+    return transitions, accepts
+
+# Merges equivalent states by partition refinement. State 0 remains the
+# start state.
+def minimize(transitions, accepts):
+    blocks = [accepts[state] for state in range(len(transitions))]
+
+    while True:
+        keys = {}
+        newBlocks = []
+
+        for state, row in enumerate(transitions):
+            key = (blocks[state], tuple(sorted((atom, blocks[target]) for atom, target in row.items())))
+            newBlocks.append(keys.setdefault(key, len(keys)))
+
+        if len(keys) == len(set(blocks)):
+            blocks = newBlocks
+            break
+
+        blocks = newBlocks
+
+    # number blocks in the order of their first state, so block 0 is the start.
+    numbers = {}
+
+    for block in blocks:
+        numbers.setdefault(block, len(numbers))
+
+    newTransitions = [None] * len(numbers)
+    newAccepts = [None] * len(numbers)
+
+    for state, row in enumerate(transitions):
+        block = numbers[blocks[state]]
+
+        if newTransitions[block] is None:
+            newTransitions[block] = dict((atom, numbers[blocks[target]]) for atom, target in row.items())
+            newAccepts[block] = accepts[state]
+
+    return newTransitions, newAccepts
+
+# Creates the Dfa with compact tables: atoms with equal columns share a
+# character class and adjacent atoms of the same class are merged.
+def tables(atomBounds, transitions, accepts, shortest):
+    columns = {}
+    atomClasses = []
+
+    for atom in range(len(atomBounds)):
+        column = tuple(row.get(atom, -1) for row in transitions)
+
+        if all(target == -1 for target in column):
+            atomClasses.append(-1)
+        else:
+            atomClasses.append(columns.setdefault(column, len(columns)))
+
+    bounds = []
+    classes = []
+
+    for bound, charClass in zip(atomBounds, atomClasses):
+        if not classes or classes[-1] != charClass:
+            bounds.append(bound)
+            classes.append(charClass)
+
+    classColumns = sorted(columns.items(), key = lambda item: item[1])
+    flatTransitions = [column[state] for state in range(len(transitions)) for column, charClass in classColumns]
+
+    acceptOffsets = [0]
+    acceptTokens = []
+
+    for tokens in accepts:
+        acceptTokens.extend(tokens)
+        acceptOffsets.append(len(acceptTokens))
+
+    return Dfa(bounds, classes, flatTransitions, acceptOffsets, acceptTokens, shortest)
@@ -0,0 +1,348 @@
+import hashlib
+import json
+import os
+
+from parserGenerator.units import *
+
+# Caches the code of declarations on disk so that a grammar in which only
+# some rules changed is generated faster. Parsers, token parsers and
+# functions are cached:
+#
+#     grammar.fragmentCache = FragmentCache(".fragments")
+#     grammar.generate(code)
+#
+# The key of a fragment is a hash of the structure of the declared unit
+# (its units down to the parsers that it calls), the parameter names, the
+# code generator and its options and of the state of the generator that the
+# code depends on: which units are shared and the names of their helpers,
+# the dispatch tables of its Ors and the tables that are numbered across
+# the class (expectations, error sites, profile counters). A hit writes the stored code
+# and repeats what the declaration changed in the generator, eg the helpers
+# that it declared.
+#
+# Fragments are files '<directory>/<key[:2]>/<key>.json'. The directory is
+# kept below 'maxBytes' by removing the least recently used fragments. A
+# hit updates the modification time of the file.
+
+fragmentVersion = 3
+
+# Passes the code on and keeps a copy.
+class RecordingSink:
+    def __init__(self, sink):
+        self.sink = sink
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+        self.sink.write(text)
+
+    def flush(self):
+        self.sink.flush()
+
+class FragmentCache:
+    # @maxBytes size of all fragments in the directory.
+    def __init__(self, directory, maxBytes = 64 << 20):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # path -> (modification time, size) of the fragments on disk
+        self.entries = None
+        # sum of their sizes
+        self.size = 0
+
+    # Declares 'declaration' (a grammar.Declaration) with 'code', either
+    # from the cache or by generating it.
+    def declare(self, code, declaration):
+        unit = declaration.unit
+
+        # the tables are shared by all parsers of the class.
+        if not isinstance(unit, (Parser, TokenParser, FuncUnit)) or code.options["tables"]:
+            declaration.declare(code)
+            return
+
+        if isinstance(unit, Parser):
+            # rewrites left recursion and counts shared units, the key
+            # depends on both. Parser.declare does it again, which has no
+            # effect.
+            code.prepare(unit)
+
+        units = []
+        key = fragmentKey(code, unit, declaration.inputVars, declaration.streamVar, units)
+
+        if key is None:
+            declaration.declare(code)
+            return
+
+        fragment = self.load(key)
+
+        if fragment is not None:
+            self.hits += 1
+            replay(code, fragment, units)
+        else:
+            self.misses += 1
+            self.store(key, record(code, declaration, units))
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def load(self, key):
+        path = self.path(key)
+
+        try:
+            with open(path) as file:
+                fragment = json.load(file)
+
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if fragment.get("version") != fragmentVersion:
+            return None
+
+        if self.entries is not None and path in self.entries:
+            self.entries[path] = (os.path.getmtime(path), self.entries[path][1])
+
+        return fragment
+
+    def store(self, key, fragment):
+        path = self.path(key)
+        fragment["version"] = fragmentVersion
+        text = json.dumps(fragment, sort_keys = True)
+
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+
+        with open(path + ".tmp", "w") as file:
+            file.write(text)
+
+        os.replace(path + ".tmp", path)
+
+        entries = self.scan()
+
+        if path in entries:
+            self.size -= entries[path][1]
+
+        entries[path] = (os.path.getmtime(path), len(text))
+        self.size += len(text)
+        self.evict()
+
+    # Returns the fragments on disk. The directory is only read once,
+    # afterwards the entries are updated by this cache.
+    def scan(self):
+        if self.entries is None:
+            self.entries = {}
+
+            for directory, directoryNames, fileNames in os.walk(self.directory):
+                for fileName in fileNames:
+                    if fileName.endswith(".json"):
+                        path = os.path.join(directory, fileName)
+                        stat = os.stat(path)
+                        self.entries[path] = (stat.st_mtime, stat.st_size)
+                        self.size += stat.st_size
+
+        return self.entries
+
+    # Removes the least recently used fragments until the size is below
+    # maxBytes.
+    def evict(self):
+        if self.size <= self.maxBytes:
+            return
+
+        entries = self.entries
+
+        for path in sorted(entries, key = lambda path: entries[path][0]):
+            if self.size <= self.maxBytes:
+                break
+
+            self.size -= entries.pop(path)[1]
+            self.evictions += 1
+
+            try:
+                os.remove(path)
+            except OSError:
+                # removed by another build that shares the directory.
+                pass
+
+    def report(self):
+        return str(self.hits) + " hits, " + str(self.misses) + " misses, " + str(self.evictions) + " evictions"
+
+################################################################################
+## Keys ########################################################################
+################################################################################
+
+# Returns the key of the declaration of 'unit' or None if it contains units
+# that cannot be described. 'units' receives the units of the declaration
+# in the order in which they are described, fragments refer to units by
+# their index in it.
+def fragmentKey(code, unit, inputVars, streamVar, units):
+    parts = [type(code).__module__ + "." + type(code).__name__, sorted(code.options.items()),
+             writerState(code), len(code.helpers), describeDeclaration(code, unit, inputVars, streamVar)]
+
+    if code.options["release"]:
+        parts.append(sorted(code.expectations.items()))
+
+    if code.options["profile"]:
+        parts.append(code.profileNames)
+
+    if code.options["dispatch"]:
+        parts.append(sorted(code.dispatchTables.items()))
+
+    if code.options["errorSites"]:
+        parts += [len(code.errorSites), len(code.recoveryPoints)]
+
+    indices = {}
+
+    for child in unitsOf(unit):
+        description = describe(code, child, indices)
+
+        if description is None:
+            return None
+
+        indices[child] = len(units)
+        units.append(child)
+        parts.append(description)
+
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+# The units that the code of 'unit' depends on, children before their
+# parents. Called parsers and functions are not entered.
+def unitsOf(unit):
+    if isinstance(unit, Parser):
+        roots = [unit.definition]
+    elif isinstance(unit, TokenParser):
+        roots = [unit.token, unit.func]
+    else:
+        roots = []
+
+    units = []
+    visited = set()
+    stack = [(root, False) for root in reversed(roots)]
+
+    while stack:
+        child, isExpanded = stack.pop()
+
+        if isExpanded:
+            units.append(child)
+        elif child not in visited:
+            visited.add(child)
+            stack.append((child, True))
+            stack.extend((grandChild, False) for grandChild in reversed(child.children()))
+
+    return units
+
+def describeDeclaration(code, unit, inputVars, streamVar):
+    description = [type(unit).__name__, unit.name, unit.inputTypes, unit.returnTypes, unit.isParserUnit,
+                   inputVars, streamVar]
+
+    if isinstance(unit, Parser):
+        description += [unit.memoize, unit.memoLimit]
+    elif isinstance(unit, FuncUnit):
+        description.append(unit.bodies.get(code.language))
+
+    return description
+
+# Describes what the code of a call of 'unit' depends on. Children are
+# referred to by their index in 'indices'.
+def describe(code, unit, indices):
+    types = (unit.inputTypes, unit.returnTypes, unit.isParserUnit)
+
+    if isinstance(unit, (Or, Then, Closure)):
+        helper = code.helpers.get(unit)
+        description = (type(unit).__name__, types, [indices[child] for child in unit.children()],
+                       code.unitUses.get(unit, 0) > 1, helper.name if helper is not None else None)
+
+        if isinstance(unit, Or) and code.options["dispatch"]:
+            dispatch = code.analysis().dispatchTable(unit.alternatives())
+
+            if dispatch is not None:
+                lexer, count, table = dispatch
+                description += (lexer.name, count, table)
+        elif isinstance(unit, Recover):
+            point = code.recoveryPoints.get(unit)
+            description += (point.name if point is not None else None,)
+
+        return description
+    elif isinstance(unit, Pass):
+        return "Pass", types
+    elif isinstance(unit, Expr):
+        return "Expr", types, unit.name, sorted(unit.callCodes.items())
+    elif isinstance(unit, ExternFunction):
+        return "ExternFunction", types, unit.qualifier, unit.functionName
+    elif isinstance(unit, (Token, TokenParser, FuncUnit, Parser)):
+        return type(unit).__name__, types, unit.name
+    else:
+        return None
+
+# Variables of the generator that determine how the next lines are written.
+def writerState(code):
+    return [getattr(code, name) for name in code.writerStateNames]
+
+################################################################################
+## Recording and replaying #####################################################
+################################################################################
+
+# Declares 'declaration' and returns the fragment: its code and what it
+# changed in the generator.
+def record(code, declaration, units):
+    sink = code.sink
+    recordingSink = code.sink = RecordingSink(sink)
+    helperCount = len(code.helpers)
+    expectationCount = len(code.expectations)
+    profileCount = len(code.profileNames)
+    dispatchCount = len(code.dispatchTables)
+    memoCount = len(code.memoTables)
+    errorSiteCount = len(code.errorSites)
+    recoveryCount = len(code.recoveryPoints)
+    hadSuccessField = code.hasSuccessField
+    code.hasSuccessField = False
+
+    try:
+        declaration.declare(code)
+    finally:
+        code.sink = sink
+        usesSuccessField = code.hasSuccessField
+        code.hasSuccessField = hadSuccessField or usesSuccessField
+
+    indices = dict((unit, i) for i, unit in enumerate(units))
+
+    return {
+        "text": "".join(recordingSink.chunks),
+        "helpers": [(indices[unit], helper.name) for unit, helper in list(code.helpers.items())[helperCount:]],
+        "expectations": list(code.expectations)[expectationCount:],
+        "profileNames": code.profileNames[profileCount:],
+        "dispatchTables": [(table, name) for table, name in list(code.dispatchTables.items())[dispatchCount:]],
+        "memoTables": code.memoTables[memoCount:],
+        "errorSites": code.errorSites[errorSiteCount:],
+        "recoveryPoints": [(indices[unit], point.name)
+                           for unit, point in list(code.recoveryPoints.items())[recoveryCount:]],
+        "usesSuccessField": usesSuccessField,
+        "writerState": writerState(code),
+    }
+
+# Writes the code of 'fragment' and changes the generator like the
+# declaration did.
+def replay(code, fragment, units):
+    code.sink.write(fragment["text"])
+
+    for index, name in fragment["helpers"]:
+        code.helpers[units[index]] = Helper(name, units[index])
+
+    for label in fragment["expectations"]:
+        code.expectations.setdefault(label, len(code.expectations))
+
+    code.profileNames.extend(fragment["profileNames"])
+
+    for table, name in fragment["dispatchTables"]:
+        code.dispatchTables[tuple(tuple(interval) for interval in table)] = name
+
+    code.memoTables.extend((table, limit) for table, limit in fragment["memoTables"])
+    code.errorSites.extend((label, tokens) for label, tokens in fragment["errorSites"])
+
+    for index, name in fragment["recoveryPoints"]:
+        code.recoveryPoints[units[index]] = RecoveryPoint(name, units[index])
+
+    code.hasSuccessField = code.hasSuccessField or fragment["usesSuccessField"]
+
+    for name, value in zip(code.writerStateNames, fragment["writerState"]):
+        setattr(code, name, value)
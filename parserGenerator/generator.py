@@ -1,3 +1,15 @@
+import sys
+
+import parserGenerator.ir as ir
+
+from parserGenerator.analysis import Analysis, reachableParsers, tailCalls
+from parserGenerator.dfa import compileDfa
+from parserGenerator.passes import PassManager
+from parserGenerator.runtime import TOKEN, TOKEN_PARSER, ACTION, PARSER, SEQUENCE, CHOICE, REP, OPT, evalRegex
+from parserGenerator.tables import TableBuilder
+from parserGenerator.transform import LeftFactoring, LeftRecursionElimination
+from parserGenerator.units import Closure, Helper, Or, RecoveryPoint, Then, statusVarName, successFieldName
+
 def failCheck(type, var):
     if type == None:
         return "!" + var
@@ -10,53 +22,1444 @@ def successCheck(type, var):
     else:
         return var + " != null"
 
-class CodeGenerator:
+################################################################################
+## Sinks #######################################################################
+################################################################################
+
+# A sink receives the generated text in chunks via 'write' and must
+# pass everything on once 'flush' is called.
+
+class ListSink:
+    # Keeps all chunks in memory. They are joined once in 'getvalue'.
     def __init__(self):
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        text = "".join(self.chunks)
+        self.chunks = [text]
+        return text
+
+class StreamSink:
+    # Buffers chunks and writes them in bulk to a text stream (a file,
+    # sys.stdout, io.StringIO...). The stream is not closed.
+    # @bufferSize number of characters that are buffered before writing.
+    def __init__(self, stream, bufferSize = 1 << 16):
+        self.stream = stream
+        self.bufferSize = bufferSize
+        self.chunks = []
+        self.size = 0
+
+    def write(self, text):
+        self.chunks.append(text)
+        self.size += len(text)
+
+        if self.size >= self.bufferSize:
+            self.flush()
+
+    def flush(self):
+        if self.chunks:
+            self.stream.write("".join(self.chunks))
+            self.chunks = []
+            self.size = 0
+
+        self.stream.flush()
+
+class CallbackSink:
+    # Calls 'callback' for every chunk.
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, text):
+        self.callback(text)
+
+    def flush(self):
+        pass
+
+# Returns a sink for 'target', which is either None (sys.stdout), a sink,
+# a text stream or a callable that receives the chunks.
+def createSink(target):
+    if target is None:
+        return StreamSink(sys.stdout)
+    elif isinstance(target, (ListSink, StreamSink, CallbackSink)):
+        return target
+    elif hasattr(target, "write"):
+        return StreamSink(target)
+    elif callable(target):
+        return CallbackSink(target)
+    else:
+        raise TypeError("sink must be a stream, a callable or None")
+
+################################################################################
+## Code generator ##############################################################
+################################################################################
+
+class CodeGenerator:
+    # Name of the target language. Units use it to pick language specific
+    # code like bodies of FuncUnits.
+    language = "java"
+
+    trueLiteral = "true"
+    falseLiteral = "false"
+    nullLiteral = "null"
+
+    # Variables that determine how the next line is written, see
+    # fragments.py.
+    writerStateNames = ("indent", "varCount", "blockJustEnded", "blockJustStarted")
+
+    # Types that the option 'primitives' replaces by the primitive type.
+    primitiveTypes = {"Integer": "int", "Character": "char", "Boolean": "boolean"}
+
+    # Options that can be passed to the constructor and their defaults:
+    # @dispatch Alternatives that start with different characters are
+    #   selected by the next character instead of trying them one by one.
+    # @dfa All tokens of a lexer are matched at once by a DFA.
+    # @tailCalls Parsers that call themselves at the end of a sequence or
+    #   in the last alternative at the end of a sequence jump back to their
+    #   start instead.
+    # @leftRecursion Left recursive parsers are rewritten into loops before
+    #   they are declared.
+    # @leftFactoring Common prefixes of adjacent alternatives are factored
+    #   out before parsers are declared, see transform.LeftFactoring.
+    # @release No comments are generated and parsingError receives an index
+    #   into a table of expectations instead of a string literal.
+    # @sharedUnits Combinators that are used more than once are declared
+    #   in a private helper method that is called instead.
+    # @trackStatus Tests and assignments of the status whose outcome is
+    #   known are removed, see ir.simplifyStatus.
+    # @optimizeLocals Local variables of methods are merged and copies
+    #   between them are removed, see ir.optimize.
+    # @primitives Values of the types in 'primitiveTypes' are not boxed.
+    #   Parsers that return them report failure in a field instead of
+    #   returning null, see 'isPrimitive'.
+    # @profile Parsers and alternatives of Ors count how often they are
+    #   called, succeed and fail. The class gets the methods
+    #   'profileSnapshot' and 'resetProfile'.
+    # @profileTime Parsers also add up the time they take (requires
+    #   'profile').
+    # @errorSites parsingError receives the index of its call site. The
+    #   class has tables with the expectation and the expected tokens of
+    #   each site and it raises the same ParseError for every error, which
+    #   only records the site and the position. Required by Recover.
+    # @tables Parsers are compiled into int tables that a driver with an
+    #   explicit stack runs, see tables.py. Each parser keeps a method that
+    #   runs the tables from its node. Cannot be combined with 'primitives'
+    #   and 'profile'.
+    defaultOptions = {
+        "dispatch": False,
+        "dfa": False,
+        "tailCalls": True,
+        "leftRecursion": True,
+        "leftFactoring": False,
+        "release": False,
+        "sharedUnits": True,
+        "trackStatus": True,
+        "optimizeLocals": True,
+        "primitives": False,
+        "profile": False,
+        "profileTime": False,
+        "errorSites": False,
+        "tables": False,
+    }
+
+    # @sink Destination of the generated code, see 'createSink'. By default
+    #   the code is printed to sys.stdout.
+    def __init__(self, sink = None, **options):
+        for name in options:
+            if name not in self.defaultOptions:
+                raise TypeError("unknown option: " + name)
+
+        self.sink = createSink(sink)
+        self.options = dict(self.defaultOptions, **options)
+
+        if self.options["profileTime"] and not self.options["profile"]:
+            raise TypeError("option profileTime requires profile")
+
+        for name in ("primitives", "profile"):
+            if self.options["tables"] and self.options[name]:
+                raise TypeError("option tables cannot be combined with " + name)
+
+        self.grammarAnalysis = None
+        self.packageName = None
+        self.className = None
+        # (name, limit) of the memo tables
+        self.memoTables = []
+        # intervals -> name of the dispatch table
+        self.dispatchTables = {}
+        # lexer -> tokens in the order in which they were declared
+        self.lexerTokens = {}
+        # (parameters, Thens) of tail calls in the parser that is declared.
+        self.tailCallContext = None
+        self.leftRecursion = LeftRecursionElimination()
+        self.leftFactoring = LeftFactoring()
+        # label -> index in the table of expectations (release mode)
+        self.expectations = {}
+        # (label, names of the expected tokens) of each call of
+        # parsingError (option 'errorSites')
+        self.errorSites = []
+        # Recover -> RecoveryPoint
+        self.recoveryPoints = {}
+        # TableBuilder of the option 'tables'
+        self.tables = None
+        # unit -> number of units and parsers that contain it
+        self.unitUses = {}
+        # parsers and units whose children were counted
+        self.countedUnits = set()
+        # unit -> Helper
+        self.helpers = {}
+        # Helpers that are declared after the current method
+        self.pendingHelpers = []
+        # ir.Method of the method that is declared
+        self.method = None
+        # true if a parser reports failure in the success field
+        self.hasSuccessField = False
+        # names of the profile counters (option 'profile')
+        self.profileNames = []
+        # name of the method that is declared
+        self.methodName = None
+        # passes that run on every recorded method before it is written
+        self.methodPasses = PassManager()
+
+        if self.options["trackStatus"]:
+            self.methodPasses.add("trackStatus", self.simplifyStatus)
+
+        if self.options["optimizeLocals"]:
+            self.methodPasses.add("optimizeLocals", lambda method: ir.optimize(method, self))
+
         self.varCount = 0
         self.indent = 0
+        self.indents = [""]
         self.blockJustEnded = False
         self.blockJustStarted = True
 
+    # Inside of methods, statements are recorded and written when the
+    # method is complete (see methodBlock).
+    def record(self, node):
+        if self.method is not None:
+            self.method.add(node)
+            return True
+
+        return False
+
     def addLine(self, line, isBlockStart = False, isBlockEnd = False):
+        if not self.record(ir.Line(line)):
+            self.writeLine(line, isBlockStart, isBlockEnd)
+
+    def writeLine(self, line, isBlockStart = False, isBlockEnd = False):
         if isBlockStart and not self.blockJustStarted:
-            print("")
+            self.sink.write("\n")
         elif self.blockJustEnded and not isBlockEnd:
-            print("")
-        
-        print("    " * self.indent + line)
+            self.sink.write("\n")
+
+        while len(self.indents) <= self.indent:
+            self.indents.append("    " * len(self.indents))
+
+        self.sink.write(self.indents[self.indent] + line + "\n")
         self.blockJustEnded = False
         self.blockJustStarted = False
-    
+
     def beginBlock(self, header):
-        self.addLine(header + " {", True, False)
+        self.writeLine(header + " {", True, False)
         self.indent += 1
         self.blockJustStarted = True
 
     def elseBlock(self):
+        if self.method is not None:
+            self.method.elseBlock()
+        else:
+            self.writeElse()
+
+    def writeElse(self):
+        self.continueBlock("else")
+
+    # Closes the current block and opens a block that belongs to the same
+    # statement, like 'else' or 'catch'.
+    def continueBlock(self, header):
         self.indent -= 1
-        self.addLine("} else {", False, True)
+        self.writeLine("} " + header + " {", False, True)
         self.indent += 1
         self.blockJustStarted = True
-        
+
     def endBlock(self):
+        if self.method is None:
+            self.writeEndBlock()
+        elif self.method.endBlock():
+            self.endMethod()
+
+    def writeEndBlock(self):
         self.indent -= 1
-        
+
         if self.indent == 1:
             self.varCount = 0
-        
-        self.addLine("}", False, True)
+
+        self.writeLine("}", False, True)
         self.blockJustEnded = True
-        
-    def createVar(self, type, name):
+
+        if self.indent == 0:
+            # outermost block is complete.
+            self.flush()
+
+    # @init initial value, by default 'defaultValue(type)'.
+    def createVar(self, type, name, init = None):
         if name == None:
             name = "var" + str(self.varCount)
             self.varCount += 1
-    
-        if type == None:
-            type = "boolean"
-            init = "false"
+
+            if self.method is not None:
+                self.method.temps[name] = type or "boolean"
+
+        type = type or "boolean"
+        self.declareLocal(type, name, init or self.defaultValue(type))
+        return name
+
+    # Value of variables of 'type' that were not assigned.
+    def defaultValue(self, type):
+        type = self.typeName(type)
+
+        if type == "boolean":
+            return self.falseLiteral
+        elif type in ("int", "long", "short", "byte", "char", "float", "double"):
+            return "0"
+        else:
+            return self.nullLiteral
+
+    # True if values of 'type' are not boxed. Parsers that return them
+    # cannot return null if they fail. Instead, they set the field
+    # 'successFieldName' before they return.
+    def isPrimitive(self, type):
+        return self.options["primitives"] and type in self.primitiveTypes
+
+    # Name of 'type' in the generated code.
+    def typeName(self, type):
+        return self.primitiveTypes.get(type, type) if self.options["primitives"] else type
+
+    # Reference to the success field, which is declared in endClass.
+    def useSuccessField(self):
+        self.hasSuccessField = True
+        return self.fieldRef(successFieldName)
+
+    # Called before 'parser' is declared. Left recursive parsers that are
+    # reachable from it are rewritten, see 'leftRecursion.rewrites', and
+    # with the option 'leftFactoring' they are factored afterwards.
+    def prepare(self, parser):
+        if self.options["leftRecursion"]:
+            self.leftRecursion.run([parser])
+
+        if self.options["leftFactoring"]:
+            self.leftFactoring.run([parser])
+
+        if self.options["sharedUnits"]:
+            self.countUses(parser)
+
+    # Counts the units that contain a combinator for the parsers that are
+    # reachable from 'parser'. Parsers are only counted once, so units are
+    # shared by all parsers that were prepared so far.
+    def countUses(self, parser):
+        stack = []
+
+        for reachable in reachableParsers([parser], self.countedUnits):
+            self.countedUnits.add(reachable)
+            stack.append(reachable.definition)
+
+        while stack:
+            unit = stack.pop()
+            self.unitUses[unit] = self.unitUses.get(unit, 0) + 1
+
+            if unit not in self.countedUnits:
+                self.countedUnits.add(unit)
+                stack.extend(unit.children())
+
+    # Returns the Helper that is called instead of generating the code of
+    # 'unit' or None. Combinators that are used more than once get a
+    # helper unless they contain a tail call of the current parser. Methods
+    # have at most one return value.
+    def helper(self, unit):
+        if self.tailCallContext is not None and unit in self.tailCallContext[2]:
+            return None
+
+        helper = self.helpers.get(unit)
+
+        if helper is None and self.unitUses.get(unit, 0) > 1 and \
+                isinstance(unit, (Or, Then, Closure)) and len(unit.returnTypes) <= 1:
+            helper = Helper("shared" + str(len(self.helpers)), unit)
+            self.helpers[unit] = helper
+            self.pendingHelpers.append(helper)
+
+        return helper
+
+    # Declares the helpers that were used since the last call. Helpers may
+    # use further helpers.
+    def declareHelpers(self):
+        while self.pendingHelpers:
+            self.pendingHelpers.pop(0).declare(self)
+
+    # Comments around the code of a unit.
+    def beginUnit(self, unit):
+        if not self.options["release"]:
+            self.comment(str(unit))
+
+    def endUnit(self, unit):
+        if not self.options["release"]:
+            self.comment("end " + str(unit))
+
+    # Calls parsingError because 'unit' failed. It does not return.
+    def parsingError(self, streamVar, unit):
+        expr = self.methodRef("parsingError") + "(" + streamVar + ", " + self.expected(unit) + ")"
+
+        if not self.record(ir.Statement(expr, True)):
+            self.writeStatement(expr)
+
+    # Returns the argument of parsingError if 'unit' fails.
+    def expected(self, unit):
+        if self.options["errorSites"]:
+            return str(self.errorSite(unit))
+
+        if not self.options["release"]:
+            return self.stringLiteral(str(unit))
+
+        return str(self.expectations.setdefault(str(unit), len(self.expectations)))
+
+    # Adds an error site for 'unit' and returns its index. The expected
+    # tokens are FIRST of 'unit' if it is known.
+    def errorSite(self, unit):
+        first = self.analysis().first(unit)
+        tokens = sorted(token.name for token in first) if first is not None else []
+        self.errorSites.append((str(unit), tokens))
+        return len(self.errorSites) - 1
+
+    # Returns the RecoveryPoint of 'unit' (a Recover). It is declared with
+    # the helpers.
+    def recoveryPoint(self, unit):
+        if not self.options["errorSites"]:
+            raise TypeError("recovery points require the option errorSites")
+
+        point = self.recoveryPoints.get(unit)
+
+        if point is None:
+            point = RecoveryPoint("recover" + str(len(self.recoveryPoints)), unit)
+            self.recoveryPoints[unit] = point
+            self.pendingHelpers.append(point)
+
+        return point
+
+    # Declares the method of 'unit' (a Parser or TokenParser) for the
+    # option 'tables'. It runs the tables from the node of the unit.
+    def declareTableEntry(self, unit, inputVars, streamVar):
+        if self.tables is None:
+            self.tables = TableBuilder(self)
+
+        node = self.tables.build(unit)
+        call = self.methodRef("runTables") + "(" + str(node) + ", " + streamVar + ", " + self.objectArray(inputVars) + ")"
+
+        unit.beginDeclaration(self, inputVars, streamVar)
+        self.declareLocal("Object[]", "values", call)
+
+        if unit.returnTypes:
+            self.ifBlock(self.isNull("values"))
+            self.returnValue(self.nullLiteral)
+            self.endBlock()
+            self.returnValue(self.arrayElement("values", 0, unit.returnTypes[0]))
+        else:
+            self.returnValue(self.notNull("values"))
+
+        self.endBlock()
+
+    # Returns the value of 'condition' if the status is 'value' or None if
+    # it also depends on something else. Conditions are created by the units.
+    def statusCondition(self, condition, value):
+        notStatus = self.notExpr(statusVarName)
+
+        if condition == statusVarName:
+            return value
+        elif condition == notStatus:
+            return not value
+        elif condition.startswith(self.andExpr(notStatus, "")):
+            return False if value else None
         else:
-            init = "null"
-    
-        self.addLine(type + " " + name + " = " + init + ";")
+            return None
+
+    # Pass for the option 'trackStatus'.
+    def simplifyStatus(self, method):
+        ir.simplifyStatus(method, statusVarName, {self.trueLiteral: True, self.falseLiteral: False},
+                          self.statusCondition)
+
+    # Profiling (option 'profile'). Each counter has three entries in
+    # 'profileCounts': calls, successes and failures, and one entry in
+    # 'profileNanos'.
+
+    # Returns the index of a new counter or None if profiling is off.
+    def profileCounter(self, name):
+        if not self.options["profile"]:
+            return None
+
+        # counters in different methods may have the same label.
+        unique = name
+        suffix = 1
+
+        while unique in self.profileNames:
+            suffix += 1
+            unique = name + " #" + str(suffix)
+
+        self.profileNames.append(unique)
+        return len(self.profileNames) - 1
+
+    def countCall(self, counter):
+        self.addTo(self.profileCountRef(counter, 0), "1")
+
+    # Counts a success if 'condition' holds, otherwise a failure.
+    def countOutcome(self, counter, condition):
+        self.ifBlock(condition)
+        self.addTo(self.profileCountRef(counter, 1), "1")
+        self.elseBlock()
+        self.addTo(self.profileCountRef(counter, 2), "1")
+        self.endBlock()
+
+    def profileCountRef(self, counter, kind):
+        return self.fieldRef("profileCounts") + "[" + str(3 * counter + kind) + "]"
+
+    # Time is only measured for parsers (option 'profileTime').
+    def beginProfileTime(self):
+        if self.options["profileTime"]:
+            self.declareLocal("long", "profileStart", self.clockExpr())
+
+    def endProfileTime(self, counter):
+        if self.options["profileTime"]:
+            self.addTo(self.fieldRef("profileNanos") + "[" + str(counter) + "]",
+                       self.clockExpr() + " - profileStart")
+
+    # Current time in nanoseconds.
+    def clockExpr(self):
+        return "System.nanoTime()"
+
+    # Returns the Thens and Ors in 'parser' that are emitted as jumps and
+    # the unit that is reported if the parser fails after a jump, see
+    # analysis.tailCalls.
+    def tailCalls(self, parser):
+        return tailCalls(parser) if self.options["tailCalls"] else (set(), None)
+
+    # Returns the Analysis of the units that are generated. It is created
+    # on first use, hence units must not be modified afterwards.
+    def analysis(self):
+        if self.grammarAnalysis is None:
+            self.grammarAnalysis = Analysis()
+
+        return self.grammarAnalysis
+
+    ############################################################################
+    ## Language specific parts. Units only use these methods to emit code.   ##
+    ############################################################################
+
+    # Expressions
+
+    def notExpr(self, expr):
+        return "!" + expr
+
+    def andExpr(self, left, right):
+        return left + " && " + right
+
+    def isNull(self, var):
+        return var + " == null"
+
+    def notNull(self, var):
+        return var + " != null"
+
+    def stringLiteral(self, text):
+        return "\"" + text.replace("\\", "\\\\").replace("\"", "\\\"") + "\""
+
+    def newObject(self, className, args = []):
+        return "new " + className + "(" + ", ".join(args) + ")"
+
+    def streamPosition(self, streamVar):
+        return streamVar + ".position()"
+
+    # Element 'index' of an Object[] cast to 'type'.
+    def arrayElement(self, var, index, type):
+        return "(" + self.typeName(type) + ") " + var + "[" + str(index) + "]"
+
+    def intArray(self, values):
+        return "new int[]{" + ", ".join(str(value) for value in values) + "}"
+
+    def stringArray(self, literals):
+        return "new String[]{" + ", ".join(literals) + "}"
+
+    def objectArray(self, values):
+        return "new Object[]{" + ", ".join(values) + "}"
+
+    # @rows lists of string literals
+    def stringTable(self, rows):
+        return "new String[][]{" + ", ".join("{" + ", ".join(row) + "}" for row in rows) + "}"
+
+    # Token definitions are written as expressions of the target language.
+    def regexExpr(self, regex):
+        return regex
+
+    # Name under which a member field is declared.
+    def fieldName(self, name):
+        return name
+
+    # Reference to a member field inside a method.
+    def fieldRef(self, name):
+        return name
+
+    # Reference to a method inside a method.
+    def methodRef(self, name):
+        return name
+
+    # Method names of parsers and of functions.
+    def parserName(self, name):
+        return name
+
+    def functionName(self, name):
         return name
+
+    # Statements. Each one is recorded in methods, the write-methods
+    # create the code.
+
+    def statement(self, expr):
+        if not self.record(ir.Statement(expr)):
+            self.writeStatement(expr)
+
+    def writeStatement(self, expr):
+        self.writeLine(expr + ";")
+
+    # Adds 'value' to a numeric field or array element.
+    def addTo(self, lv, value):
+        self.statement(lv + " += " + value)
+
+    def assign(self, lv, rv):
+        if not self.record(ir.Assign(lv, rv)):
+            self.writeAssign(lv, rv)
+
+    def writeAssign(self, lv, rv):
+        self.writeLine(lv + " = " + rv + ";")
+
+    def declareLocal(self, type, name, init):
+        if not self.record(ir.Local(type, name, init)):
+            self.writeLocal(type, name, init)
+
+    # @init None if the variable has no initial value.
+    def writeLocal(self, type, name, init):
+        type = self.typeName(type)
+
+        if init is None:
+            self.writeLine(type + " " + name + ";")
+        else:
+            self.writeLine(type + " " + name + " = " + init + ";")
+
+    def declareField(self, modifiers, type, name, init):
+        self.addLine(modifiers + " " + type + " " + self.fieldName(name) + " = " + init + ";")
+
+    # Returns the name of a CharDispatch for 'table' (see
+    # Analysis.dispatchTable). Equal tables are shared, they are declared in
+    # endClass.
+    def dispatchTable(self, table):
+        key = tuple(table)
+
+        if key not in self.dispatchTables:
+            self.dispatchTables[key] = "dispatch" + str(len(self.dispatchTables))
+
+        return self.dispatchTables[key]
+
+    # Tokens are registered in the order in which they are added to their
+    # lexer. If the option 'dfa' is set, a DFA for them is created in endClass.
+    def registerToken(self, token):
+        self.lexerTokens.setdefault(token.lexer, []).append(token)
+
+    # Memo tables are cleared by 'clearMemo' which is declared in endClass.
+    def declareMemoTable(self, name, limit):
+        self.memoTables.append((name, limit))
+        self.declareField("private final", "MemoTable", name, self.newObject("MemoTable", [str(limit)]))
+
+    # Looking up 'start' in a memo table returns an entry (the index of a
+    # slot, -1 if there is none) from which the end position and the result
+    # are read.
+    def memoEntryType(self):
+        return "int"
+
+    def memoLookup(self, table, streamVar, start):
+        return self.fieldRef(table) + ".find(" + streamVar + ", " + start + ")"
+
+    def memoFound(self, table, entry):
+        return entry + " >= 0"
+
+    def memoEnd(self, table, entry):
+        return self.fieldRef(table) + ".end(" + entry + ")"
+
+    # @type None for the uncast result.
+    def memoResult(self, table, entry, type):
+        result = self.fieldRef(table) + ".result(" + entry + ")"
+        return result if type is None else "(" + self.typeName(type) + ") " + result
+
+    def setStreamPosition(self, streamVar, position):
+        self.statement(streamVar + ".setPosition(" + position + ")")
+
+    # Makes 'className' from the same package available.
+    def importClass(self, className):
+        pass
+
+    def comment(self, text):
+        if not self.record(ir.Comment(text)):
+            self.writeComment(text)
+
+    def writeComment(self, text):
+        self.writeLine("/* " + text + " */")
+
+    def returnValue(self, value):
+        if not self.record(ir.Return(value)):
+            self.writeReturn(value)
+
+    def writeReturn(self, value):
+        self.writeLine("return " + value + ";")
+
+    def breakLoop(self):
+        if not self.record(ir.Break()):
+            self.writeBreak()
+
+    def writeBreak(self):
+        self.writeLine("break;")
+
+    def continueLoop(self):
+        if not self.record(ir.Continue()):
+            self.writeContinue()
+
+    def writeContinue(self):
+        self.writeLine("continue;")
+
+    # Blocks. They only occur in methods.
+
+    def ifBlock(self, condition):
+        self.method.beginBlock(ir.If(condition))
+
+    def writeIf(self, condition):
+        self.beginBlock("if(" + condition + ")")
+
+    def loopBlock(self):
+        self.method.beginBlock(ir.Loop())
+
+    def writeLoop(self):
+        self.beginBlock("for(;;)")
+
+    # A switch over the int in 'var'. Each case is closed by endCase, the
+    # default case is mandatory.
+    def switchBlock(self, var):
+        self.method.beginBlock(ir.Switch(var))
+
+    def writeSwitch(self, var):
+        self.beginBlock("switch(" + var + ")")
+
+    def caseBlock(self, value):
+        self.method.caseBlock(value)
+
+    def writeCase(self, value):
+        self.beginBlock("case " + str(value) + ":")
+
+    def defaultBlock(self):
+        self.method.defaultBlock()
+
+    def writeDefault(self):
+        self.beginBlock("default:")
+
+    def endCase(self):
+        self.method.endCase()
+
+    # @isReachable false if the case ends with a jump, then 'break' would
+    #   be unreachable.
+    def writeEndCase(self, isReachable = True):
+        if isReachable:
+            self.writeBreak()
+
+        self.writeEndBlock()
+
+    def endSwitch(self):
+        self.method.endSwitch()
+
+    def writeEndSwitch(self):
+        self.writeEndBlock()
+
+    # Opens a method. Its body is recorded until the method is closed by
+    # endBlock.
+    # @returnType None for void methods
+    def methodBlock(self, returnType, name, argTypes, argVars, modifiers = "public"):
+        self.writeMethodBlock(returnType, name, argTypes, argVars, modifiers)
+        self.method = ir.Method(argTypes, argVars)
+        self.methodName = name
+
+    def writeMethodBlock(self, returnType, name, argTypes, argVars, modifiers):
+        typedArgs = [self.typeName(type) + " " + var for type, var in zip(argTypes, argVars)]
+        returnType = self.typeName(returnType) if returnType else "void"
+        self.beginBlock(modifiers + " " + returnType + " " + name + "(" + ", ".join(typedArgs) + ")")
+
+    def endMethod(self):
+        method = self.method
+        self.method = None
+
+        self.methodPasses.run(method)
+        ir.write(method.body, self)
+        self.writeEndBlock()
+
+    # Class structure
+
+    # @imports list of fully qualified names of classes to import.
+    def beginClass(self, packageName, className, imports):
+        self.packageName = packageName
+        self.className = className
+
+        self.addLine("package " + packageName + ";\n")
+
+        for qualifiedName in imports:
+            self.addLine("import " + qualifiedName + ";")
+
+        self.beginBlock("public class " + className)
+
+    # Declares 'parsingError' that is called if a parser fails after it
+    # already consumed input.
+    def declareErrorHandler(self):
+        if self.options["errorSites"]:
+            self.beginBlock("private void parsingError(TokStream stream, int site)")
+            self.addLine("throw parseError.record(site, stream);")
+            self.endBlock()
+            self.declareErrorSiteSupport()
+            return
+
+        if self.options["release"]:
+            self.beginBlock("private void parsingError(TokStream stream, int code)")
+            self.addLine("throw new IllegalArgumentException(\"Expected \" + expectations[code] + \" at \" + stream);")
+        else:
+            self.beginBlock("private void parsingError(TokStream stream, String expected)")
+            self.addLine("throw new IllegalArgumentException(\"Expected \" + expected + \" at \" + stream);")
+
+        self.endBlock()
+
+    # Tables of the error sites and the ParseError that is thrown for all
+    # of them (option 'errorSites'). Its message is created by getMessage.
+    def declareErrorSiteSupport(self):
+        self.declareField("private static final", "String[]", "errorLabels",
+                          self.stringArray([self.stringLiteral(label) for label, tokens in self.errorSites]))
+        self.declareField("private static final", "String[][]", "errorTokens",
+                          self.stringTable([[self.stringLiteral(name) for name in tokens]
+                                            for label, tokens in self.errorSites]))
+        self.declareField("private final", "ParseError", "parseError", self.newObject("ParseError"))
+
+        # the last error and the errors that recovery points collected.
+        self.beginBlock("public ParseError parseError()")
+        self.addLine("return parseError;")
+        self.endBlock()
+
+        self.beginBlock("public static final class ParseError extends RuntimeException")
+        self.addLine("private int site = -1;")
+        self.addLine("private int position = 0;")
+        self.addLine("private TokStream stream = null;")
+        # site and position of the collected errors
+        self.addLine("private int[] sites = new int[8];")
+        self.addLine("private int[] positions = new int[8];")
+        self.addLine("private int count = 0;")
+        # offsets of the newlines of 'indexedText', see lineColumn
+        self.addLine("private CharSequence indexedText = null;")
+        self.addLine("private int[] newlines = null;")
+        self.addLine("private int newlineCount = 0;")
+
+        # no stack trace, the error is thrown for every failure.
+        self.beginBlock("ParseError()")
+        self.addLine("super(null, null, false, false);")
+        self.endBlock()
+
+        self.beginBlock("ParseError record(int site, TokStream stream)")
+        self.beginBlock("if(this.stream != stream)")
+        self.addLine("count = 0;")
+        self.endBlock()
+        self.addLine("this.site = site;")
+        self.addLine("this.position = stream.position();")
+        self.addLine("this.stream = stream;")
+        self.addLine("return this;")
+        self.endBlock()
+
+        self.beginBlock("void collect()")
+        self.beginBlock("if(count == sites.length)")
+        self.addLine("sites = java.util.Arrays.copyOf(sites, 2 * count);")
+        self.addLine("positions = java.util.Arrays.copyOf(positions, 2 * count);")
+        self.endBlock()
+        self.addLine("sites[count] = site;")
+        self.addLine("positions[count] = position;")
+        self.addLine("count++;")
+        self.endBlock()
+
+        self.beginBlock("public void clear()")
+        self.addLine("site = -1;")
+        self.addLine("stream = null;")
+        self.addLine("count = 0;")
+        self.endBlock()
+
+        self.beginBlock("public int site()")
+        self.addLine("return site;")
+        self.endBlock()
+
+        self.beginBlock("public int position()")
+        self.addLine("return position;")
+        self.endBlock()
+
+        self.beginBlock("public String expected()")
+        self.addLine("return errorLabels[site];")
+        self.endBlock()
+
+        self.beginBlock("public String[] expectedTokens()")
+        self.addLine("return errorTokens[site];")
+        self.endBlock()
+
+        self.beginBlock("public int errorCount()")
+        self.addLine("return count;")
+        self.endBlock()
+
+        self.beginBlock("public int errorSite(int i)")
+        self.addLine("return sites[i];")
+        self.endBlock()
+
+        self.beginBlock("public int errorPosition(int i)")
+        self.addLine("return positions[i];")
+        self.endBlock()
+
+        self.beginBlock("public static String message(int site)")
+        self.addLine("String message = \"Expected \" + errorLabels[site];")
+        self.beginBlock("if(errorTokens[site].length > 0)")
+        self.addLine("message += \" (one of \" + String.join(\", \", errorTokens[site]) + \")\";")
+        self.endBlock()
+        self.addLine("return message;")
+        self.endBlock()
+
+        # Message of the collected error 'i' with line and column in 'text'.
+        self.beginBlock("public String message(int i, CharSequence text)")
+        self.addLine("int[] lineColumn = lineColumn(text, positions[i]);")
+        self.addLine("return message(sites[i]) + \" at \" + lineColumn[0] + \":\" + lineColumn[1];")
+        self.endBlock()
+
+        # {line, column} of 'position' in 'text', both start at 1. The
+        # newlines are found when it is called the first time for 'text'.
+        self.beginBlock("public int[] lineColumn(CharSequence text, int position)")
+        self.beginBlock("if(indexedText != text)")
+        self.addLine("newlines = new int[16];")
+        self.addLine("newlineCount = 0;")
+        self.beginBlock("for(int i = 0; i < text.length(); ++i)")
+        self.beginBlock("if(text.charAt(i) == '\\n')")
+        self.beginBlock("if(newlineCount == newlines.length)")
+        self.addLine("newlines = java.util.Arrays.copyOf(newlines, 2 * newlineCount);")
+        self.endBlock()
+        self.addLine("newlines[newlineCount++] = i;")
+        self.endBlock()
+        self.endBlock()
+        self.addLine("indexedText = text;")
+        self.endBlock()
+        self.addLine("int line = java.util.Arrays.binarySearch(newlines, 0, newlineCount, position);")
+        self.addLine("line = line >= 0 ? line : -line - 1;")
+        self.addLine("int column = line > 0 ? position - newlines[line - 1] : position + 1;")
+        self.addLine("return new int[]{line + 1, column};")
+        self.endBlock()
+
+        # Line and column require the text, see message(i, text).
+        self.beginBlock("@Override public String getMessage()")
+        self.beginBlock("if(site < 0)")
+        self.addLine("return null;")
+        self.endBlock()
+        self.addLine("return message(site) + \" at position \" + position;")
+        self.endBlock()
+
+        self.endBlock()
+
+    # Body of the method of a Recover, see RecoveryPoint. If the child
+    # throws a ParseError, the error is collected and the input is skipped
+    # up to and including the sync token. If that does not move the
+    # stream, the error is thrown again, a Recover in a loop would not end.
+    def declareRecovery(self, unit, call, inputVars, streamVar):
+        sync = self.fieldRef(unit.sync.name) + ".recognizeToken(" + streamVar + ")"
+        peek = self.fieldRef(unit.sync.lexer.name) + ".peekChar(" + streamVar + ")"
+
+        self.writeLine("int start = " + self.streamPosition(streamVar) + ";")
+        self.beginBlock("try")
+        self.writeReturn(call)
+        self.continueBlock("catch(ParseError e)")
+        self.beginBlock("if(e != parseError)")
+        self.addLine("throw e;")
+        self.endBlock()
+        self.beginBlock("while(!" + sync + " && " + peek + " != -1)")
+        self.writeStatement(streamVar + ".setPosition(" + self.streamPosition(streamVar) + " + 1)")
+        self.endBlock()
+        self.beginBlock("if(" + self.streamPosition(streamVar) + " == start)")
+        self.addLine("throw e;")
+        self.endBlock()
+        self.addLine("parseError.collect();")
+        self.writeRecovered(unit, inputVars)
+        self.endBlock()
+
+    # Returns the input values of a Recover after an error.
+    def writeRecovered(self, unit, inputVars):
+        if not inputVars:
+            self.writeReturn(self.trueLiteral)
+            return
+
+        if self.isPrimitive(unit.returnTypes[0]):
+            self.writeAssign(self.useSuccessField(), self.trueLiteral)
+
+        self.writeReturn(inputVars[0])
+
+    # Table for the codes that are passed to parsingError in release mode.
+    def declareExpectations(self):
+        labels = sorted(self.expectations, key = self.expectations.get)
+        self.declareField("private static final", "String[]", "expectations",
+                          self.stringArray([self.stringLiteral(label) for label in labels]))
+
+    # Executes 'statements' when the class is instantiated.
+    def declareInitializer(self, statements):
+        self.writeLine("{", True, False)
+        self.indent += 1
+        self.blockJustStarted = True
+
+        for statement in statements:
+            self.statement(statement)
+
+        self.endBlock()
+
+    def endClass(self):
+        if self.options["release"] and not self.options["errorSites"]:
+            self.declareExpectations()
+
+        if self.hasSuccessField:
+            # public, parsers of other grammars read it (see ExternFunction).
+            self.declareField("public", "boolean", successFieldName, self.falseLiteral)
+
+        if self.options["dfa"]:
+            self.declareDfas()
+
+        if self.dispatchTables:
+            self.declareDispatchTables()
+
+        if self.memoTables:
+            self.declareMemoSupport()
+
+        if self.tables is not None:
+            self.declareTables()
+
+        if self.options["profile"]:
+            self.declareProfileSupport()
+
+        self.declareConstructor()
+        self.endBlock()
+
+    # Fields are initialized where they are declared.
+    def declareConstructor(self):
+        pass
+
+    def declareDfas(self):
+        statements = []
+
+        for lexer, tokens in self.lexerTokens.items():
+            try:
+                regexes = [evalRegex(token.regex) for token in tokens]
+            except (NameError, AttributeError, SyntaxError, TypeError):
+                raise TypeError("cannot create a DFA for the tokens of " + lexer.name)
+
+            tables = [self.intArray(table) for table in compileDfa(regexes).tables()]
+            statements.append(self.fieldName(lexer.name) + ".setDfa(" + self.newObject("Dfa", tables) + ")")
+
+        if statements:
+            self.declareInitializer(statements)
+
+    def declareDispatchTables(self):
+        for table, name in self.dispatchTables.items():
+            values = [value for interval in table for value in interval]
+            self.declareField("private static final", "CharDispatch", name,
+                              self.newObject("CharDispatch", [self.intArray(values)]))
+
+        self.declareDispatchSupport()
+
+    def declareDispatchSupport(self):
+        # Flat array of intervals: start, end, index of the alternative.
+        self.beginBlock("private static final class CharDispatch")
+        self.addLine("private final int[] table;")
+        self.addLine("private final int[] ascii = new int[128];")
+
+        self.beginBlock("CharDispatch(int[] table)")
+        self.addLine("this.table = table;")
+        self.addLine("java.util.Arrays.fill(ascii, -1);")
+        self.beginBlock("for(int i = 0; i < table.length; i += 3)")
+        self.beginBlock("for(int ch = table[i]; ch <= table[i + 1] && ch < 128; ++ch)")
+        self.addLine("ascii[ch] = table[i + 2];")
+        self.endBlock()
+        self.endBlock()
+        self.endBlock()
+
+        self.beginBlock("int lookup(int ch)")
+        self.beginBlock("if(ch >= 0 && ch < 128)")
+        self.addLine("return ascii[ch];")
+        self.endBlock()
+        self.addLine("int low = 0;")
+        self.addLine("int high = table.length / 3 - 1;")
+        self.beginBlock("while(low <= high)")
+        self.addLine("int mid = (low + high) >>> 1;")
+        self.beginBlock("if(ch < table[3 * mid])")
+        self.addLine("high = mid - 1;")
+        self.elseBlock()
+        self.beginBlock("if(ch > table[3 * mid + 1])")
+        self.addLine("low = mid + 1;")
+        self.elseBlock()
+        self.addLine("return table[3 * mid + 2];")
+        self.endBlock()
+        self.endBlock()
+        self.endBlock()
+        self.addLine("return -1;")
+        self.endBlock()
+
+        self.endBlock()
+
+    def declareProfileSupport(self):
+        count = len(self.profileNames)
+        self.declareField("private static final", "String[]", "profileNames",
+                          self.stringArray([self.stringLiteral(name) for name in self.profileNames]))
+        self.declareField("private final", "long[]", "profileCounts", "new long[" + str(3 * count) + "]")
+        self.declareField("private final", "long[]", "profileNanos", "new long[" + str(count) + "]")
+
+        # name -> {calls, successes, failures, nanoseconds} in the order of the counters
+        self.beginBlock("public java.util.Map<String, long[]> profileSnapshot()")
+        self.addLine("java.util.Map<String, long[]> snapshot = new java.util.LinkedHashMap<>();")
+        self.beginBlock("for(int i = 0; i < profileNames.length; ++i)")
+        self.addLine("snapshot.put(profileNames[i], new long[]{profileCounts[3 * i], profileCounts[3 * i + 1], "
+                     "profileCounts[3 * i + 2], profileNanos[i]});")
+        self.endBlock()
+        self.addLine("return snapshot;")
+        self.endBlock()
+
+        self.beginBlock("public void resetProfile()")
+        self.addLine("java.util.Arrays.fill(profileCounts, 0);")
+        self.addLine("java.util.Arrays.fill(profileNanos, 0);")
+        self.endBlock()
+
+    # Fields of the TableBuilder, see tables.py.
+    def declareTableFields(self):
+        tables = self.tables
+        self.declareField("private static final", "int[]", "tableNodes", self.intArray(tables.nodes))
+        self.declareField("private static final", "int[]", "tableChildren", self.intArray(tables.children))
+        self.declareField("private static final", "int[]", "tableSites", self.intArray(tables.sites))
+        self.declareField("private static final", "int[]", "tableEntries", self.intArray(tables.entries))
+        self.declareField("private static final", "int[]", "tableArities", self.intArray(tables.arities()))
+
+        # parsingError receives an int or a string, see 'expected'.
+        if self.options["errorSites"] or self.options["release"]:
+            self.declareField("private static final", "int[]", "tableErrors", self.intArray(tables.errors))
+        else:
+            self.declareField("private static final", "String[]", "tableErrors", self.stringArray(tables.errors))
+
+    def declareTables(self):
+        self.declareTableFields()
+        self.declareField("private final", "Token[]", "tableTokens",
+                          "new Token[]{" + ", ".join(token.name for token in self.tables.tokens) + "}")
+
+        # Actions are called by their index.
+        self.beginBlock("private Object tableAction(int action, Object[] values, int top, TokStream stream)")
+        self.beginBlock("switch(action)")
+
+        for i, unit in enumerate(self.tables.actions):
+            count = len(unit.inputTypes)
+            args = ["(" + self.arrayElement("values", "top - " + str(count - j), type) + ")"
+                    for j, type in enumerate(unit.inputTypes)]
+            call = unit.call(self, args, "stream")
+
+            self.beginBlock("case " + str(i) + ":")
+
+            if unit.returnTypes or unit.isParserUnit:
+                self.addLine("return " + call + ";")
+            else:
+                self.addLine(call + ";")
+                self.addLine("return null;")
+
+            self.endBlock()
+
+        self.endBlock()
+        self.addLine("throw new IllegalArgumentException(\"no action \" + action);")
+        self.endBlock()
+
+        # Replaces the arguments of 'action' below 'top' by its return
+        # value and returns the new top or -1 if a parser failed.
+        self.beginBlock("private int tableCall(int action, Object[] values, int top, TokStream stream)")
+        self.addLine("Object result = tableAction(action, values, top, stream);")
+        self.addLine("int returnCount = tableArities[3 * action + 1];")
+        self.beginBlock("if(tableArities[3 * action + 2] != 0 && (returnCount != 0 ? result == null : !((Boolean) result)))")
+        self.addLine("return -1;")
+        self.endBlock()
+        self.addLine("top -= tableArities[3 * action];")
+        self.beginBlock("if(returnCount != 0)")
+        self.addLine("values[top++] = result;")
+        self.endBlock()
+        self.addLine("return top;")
+        self.endBlock()
+
+        self.beginBlock("private boolean tableTokenIsNext(int token, TokStream stream)")
+        self.addLine("int position = stream.position();")
+        self.beginBlock("if(tableTokens[token].recognizeToken(stream))")
+        self.addLine("stream.setPosition(position);")
+        self.addLine("return true;")
+        self.endBlock()
+        self.addLine("return false;")
+        self.endBlock()
+
+        self.declareTableDriver()
+
+    # The driver of the tables, like runtime.ParseTables.run. 'frames'
+    # contains the node and the state of each unit that did not return,
+    # 'ok' is the result of the unit that returned last.
+    def declareTableDriver(self):
+        self.beginBlock("private Object[] runTables(int start, TokStream stream, Object[] args)")
+        self.addLine("Object[] values = java.util.Arrays.copyOf(args, args.length + 16);")
+        self.addLine("int top = args.length;")
+        self.addLine("int[] frames = new int[64];")
+        self.addLine("int sp = 2;")
+        self.addLine("frames[0] = start;")
+        self.addLine("boolean ok = true;")
+
+        self.beginBlock("while(sp > 0)")
+        self.addLine("int node = frames[sp - 2];")
+        self.addLine("int state = frames[sp - 1];")
+        self.addLine("int a = tableNodes[4 * node + 1];")
+        self.addLine("int b = tableNodes[4 * node + 2];")
+
+        # a unit pushes at most one frame and one value.
+        self.beginBlock("if(sp + 2 > frames.length)")
+        self.addLine("frames = java.util.Arrays.copyOf(frames, 2 * frames.length);")
+        self.endBlock()
+        self.beginBlock("if(top == values.length)")
+        self.addLine("values = java.util.Arrays.copyOf(values, 2 * values.length);")
+        self.endBlock()
+
+        self.beginBlock("switch(tableNodes[4 * node])")
+
+        self.beginBlock("case " + str(SEQUENCE) + ":")
+        self.beginBlock("if(state > 0 && !ok)")
+        self.beginBlock("if(state == 1)")
+        self.addLine("sp -= 2;")
+        self.addLine("break;")
+        self.endBlock()
+        self.addLine("parsingError(stream, tableErrors[tableSites[a + state - 1]]);")
+        self.endBlock()
+        self.beginBlock("if(state == b)")
+        self.addLine("sp -= 2;")
+        self.elseBlock()
+        self.addLine("frames[sp - 1] = state + 1;")
+        self.addLine("frames[sp++] = tableChildren[a + state];")
+        self.addLine("frames[sp++] = 0;")
+        self.endBlock()
+        self.addLine("break;")
+        self.endBlock()
+
+        self.beginBlock("case " + str(CHOICE) + ":")
+        self.beginBlock("if(state > 0 && ok)")
+        # the alternative that was tried succeeded.
+        self.addLine("sp -= 2;")
+        self.addLine("break;")
+        self.endBlock()
+        self.addLine("int i = a + state;")
+        self.beginBlock("while(i < a + b && tableEntries[2 * i] >= 0 && !tableTokenIsNext(tableEntries[2 * i], stream))")
+        self.addLine("++i;")
+        self.endBlock()
+        self.beginBlock("if(i == a + b)")
+        self.beginBlock("if(tableNodes[4 * node + 3] >= 0)")
+        self.addLine("frames[sp - 2] = tableNodes[4 * node + 3];")
+        self.elseBlock()
+        self.addLine("ok = false;")
+        self.addLine("sp -= 2;")
+        self.endBlock()
+        self.elseBlock()
+        self.beginBlock("if(tableEntries[2 * i] < 0)")
+        # tried, the choice continues with the next entry if it fails.
+        self.addLine("frames[sp - 1] = i - a + 1;")
+        self.addLine("frames[sp++] = tableEntries[2 * i + 1];")
+        self.elseBlock()
+        self.addLine("frames[sp - 2] = tableEntries[2 * i + 1];")
+        self.endBlock()
+        self.endBlock()
+        self.addLine("break;")
+        self.endBlock()
+
+        self.beginBlock("case " + str(REP) + ":")
+        self.beginBlock("if(state > 0 && !ok)")
+        self.addLine("ok = true;")
+        self.addLine("sp -= 2;")
+        self.elseBlock()
+        self.addLine("frames[sp - 1] = 1;")
+        self.addLine("frames[sp++] = a;")
+        self.addLine("frames[sp++] = 0;")
+        self.endBlock()
+        self.addLine("break;")
+        self.endBlock()
+
+        self.beginBlock("case " + str(OPT) + ":")
+        self.beginBlock("if(state > 0)")
+        self.addLine("ok = true;")
+        self.addLine("sp -= 2;")
+        self.elseBlock()
+        self.addLine("frames[sp - 1] = 1;")
+        self.addLine("frames[sp++] = a;")
+        self.addLine("frames[sp++] = 0;")
+        self.endBlock()
+        self.addLine("break;")
+        self.endBlock()
+
+        self.beginBlock("case " + str(PARSER) + ":")
+        self.addLine("frames[sp - 2] = a;")
+        self.addLine("break;")
+        self.endBlock()
+
+        self.beginBlock("case " + str(TOKEN) + ":")
+        self.addLine("ok = tableTokens[a].recognizeToken(stream);")
+        self.addLine("sp -= 2;")
+        self.addLine("break;")
+        self.endBlock()
+
+        self.beginBlock("case " + str(TOKEN_PARSER) + ":")
+        self.addLine("CharSequence text = tableTokens[a].parseToken(stream);")
+        self.addLine("ok = text != null;")
+        self.beginBlock("if(ok)")
+        self.addLine("values[top++] = text;")
+        self.addLine("top = tableCall(b, values, top, stream);")
+        self.endBlock()
+        self.addLine("sp -= 2;")
+        self.addLine("break;")
+        self.endBlock()
+
+        self.beginBlock("case " + str(ACTION) + ":")
+        self.addLine("int newTop = tableCall(a, values, top, stream);")
+        self.addLine("ok = newTop >= 0;")
+        self.beginBlock("if(ok)")
+        self.addLine("top = newTop;")
+        self.endBlock()
+        self.addLine("sp -= 2;")
+        self.addLine("break;")
+        self.endBlock()
+
+        # PASS
+        self.beginBlock("default:")
+        self.addLine("ok = true;")
+        self.addLine("sp -= 2;")
+        self.addLine("break;")
+        self.endBlock()
+
+        self.endBlock()
+        self.endBlock()
+
+        self.addLine("return ok ? java.util.Arrays.copyOf(values, top) : null;")
+        self.endBlock()
+
+    def declareMemoSupport(self):
+        self.beginBlock("public void clearMemo()")
+
+        for table, limit in self.memoTables:
+            self.statement(self.fieldRef(table) + ".clear()")
+
+        self.endBlock()
+
+        # Table of a memoized parser: start position -> result and end
+        # position. Open addressing with linear probing in arrays, keys are
+        # start + 1 so that 0 marks a free slot.
+        self.beginBlock("private static final class MemoTable")
+        self.addLine("private int[] keys = new int[16];")
+        self.addLine("private int[] ends = new int[16];")
+        self.addLine("private Object[] results = new Object[16];")
+        self.addLine("private int size = 0;")
+        self.addLine("private final int limit;")
+        self.addLine("private TokStream stream = null;")
+
+        self.beginBlock("MemoTable(int limit)")
+        self.addLine("this.limit = limit;")
+        self.endBlock()
+
+        # returns the slot of 'start' or -1.
+        self.beginBlock("int find(TokStream stream, int start)")
+        self.beginBlock("if(this.stream != stream)")
+        self.addLine("reset();")
+        self.addLine("this.stream = stream;")
+        self.endBlock()
+        self.addLine("int mask = keys.length - 1;")
+        self.beginBlock("for(int i = hash(start) & mask; keys[i] != 0; i = (i + 1) & mask)")
+        self.beginBlock("if(keys[i] == start + 1)")
+        self.addLine("return i;")
+        self.endBlock()
+        self.endBlock()
+        self.addLine("return -1;")
+        self.endBlock()
+
+        self.beginBlock("int end(int slot)")
+        self.addLine("return ends[slot];")
+        self.endBlock()
+
+        self.beginBlock("Object result(int slot)")
+        self.addLine("return results[slot];")
+        self.endBlock()
+
+        self.beginBlock("void put(int start, Object result, int end)")
+        self.beginBlock("if(limit > 0 && size >= limit)")
+        self.addLine("reset();")
+        self.endBlock()
+        self.beginBlock("if(2 * (size + 1) > keys.length)")
+        self.addLine("grow();")
+        self.endBlock()
+        self.addLine("int mask = keys.length - 1;")
+        self.addLine("int i = hash(start) & mask;")
+        self.beginBlock("while(keys[i] != 0 && keys[i] != start + 1)")
+        self.addLine("i = (i + 1) & mask;")
+        self.endBlock()
+        self.beginBlock("if(keys[i] == 0)")
+        self.addLine("size++;")
+        self.endBlock()
+        self.addLine("keys[i] = start + 1;")
+        self.addLine("ends[i] = end;")
+        self.addLine("results[i] = result;")
+        self.endBlock()
+
+        self.beginBlock("private void grow()")
+        self.addLine("int[] oldKeys = keys;")
+        self.addLine("int[] oldEnds = ends;")
+        self.addLine("Object[] oldResults = results;")
+        self.addLine("keys = new int[2 * oldKeys.length];")
+        self.addLine("ends = new int[keys.length];")
+        self.addLine("results = new Object[keys.length];")
+        self.addLine("int mask = keys.length - 1;")
+        self.beginBlock("for(int j = 0; j < oldKeys.length; j++)")
+        self.beginBlock("if(oldKeys[j] != 0)")
+        self.addLine("int i = hash(oldKeys[j] - 1) & mask;")
+        self.beginBlock("while(keys[i] != 0)")
+        self.addLine("i = (i + 1) & mask;")
+        self.endBlock()
+        self.addLine("keys[i] = oldKeys[j];")
+        self.addLine("ends[i] = oldEnds[j];")
+        self.addLine("results[i] = oldResults[j];")
+        self.endBlock()
+        self.endBlock()
+        self.endBlock()
+
+        self.beginBlock("private static int hash(int start)")
+        self.addLine("int h = start * 0x9E3779B9;")
+        self.addLine("return h ^ (h >>> 16);")
+        self.endBlock()
+
+        self.beginBlock("private void reset()")
+        self.beginBlock("if(size > 0)")
+        self.addLine("java.util.Arrays.fill(keys, 0);")
+        self.addLine("java.util.Arrays.fill(results, null);")
+        self.addLine("size = 0;")
+        self.endBlock()
+        self.endBlock()
+
+        self.beginBlock("void clear()")
+        self.addLine("reset();")
+        self.addLine("stream = null;")
+        self.endBlock()
+
+        self.endBlock()
+
+    # Passes all buffered code to the underlying stream.
+    def flush(self):
+        self.sink.flush()
+
+    # Returns the code generated so far. Only supported by a ListSink.
+    def getvalue(self):
+        return self.sink.getvalue()
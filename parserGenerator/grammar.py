@@ -0,0 +1,256 @@
+from parserGenerator.analysis import Analysis, children, reachableParsers, stronglyConnectedComponents
+from parserGenerator.hazards import findHazards, report
+from parserGenerator.passes import PassManager
+from parserGenerator.transform import eliminateLeftRecursion, leftFactor
+from parserGenerator.units import *
+
+# A grammar collects the members of a generated class. Only the units that
+# the class must provide are added, everything that they use (lexers,
+# tokens, functions, parsers and objects of other grammars) is found and
+# declared in a valid order. Before the class is written, the passes in
+# 'passes' run on the whole grammar:
+#
+#     grammar = Grammar(packageName, className, imports)
+#     grammar.add(sum)
+#     grammar.add(add, ["a", "b"])
+#     grammar.generate(CodeGenerator())
+#     print(grammar.passes.report())
+
+################################################################################
+## Declarations ################################################################
+################################################################################
+
+# A member of the generated class. Grammar.lower returns them in the order
+# in which they are declared.
+class Declaration:
+    # @inputVars names of the parameters of functions and parsers.
+    # @streamVar name of the TokStream parameter of parsers.
+    def __init__(self, unit, inputVars = None, streamVar = None):
+        self.unit = unit
+        self.inputVars = inputVars
+        self.streamVar = streamVar
+
+    def declare(self, code):
+        unit = self.unit
+
+        if isinstance(unit, (Object, Lexer, HiddenToken, Token)):
+            unit.declare(code)
+        elif isinstance(unit, FuncUnit):
+            unit.declare(code, self.inputVars)
+        elif isinstance(unit, (TokenParser, Parser)):
+            unit.declare(code, self.inputVars, self.streamVar)
+        else:
+            raise TypeError("cannot declare " + type(unit).__name__)
+
+    def __str__(self):
+        return type(self.unit).__name__ + " " + self.unit.name
+
+################################################################################
+## Passes ######################################################################
+################################################################################
+
+# Checks the grammar for hazards like loops that never end, see
+# hazards.py. It runs first because it reports left recursion that the
+# leftRecursion pass cannot rewrite. Errors stop the build, warnings are
+# kept in 'grammar.hazards'.
+def hazardsPass(grammar):
+    grammar.hazards = findHazards(grammar.rootUnits())
+    errors = [hazard for hazard in grammar.hazards if hazard.isError()]
+
+    if errors:
+        raise TypeError("hazards in " + grammar.className + ":\n" + report(errors))
+
+    return grammar.hazards
+
+# Rewrites left recursive parsers into loops, see transform.py. Like
+# CodeGenerator.prepare, it does nothing if the option 'leftRecursion' of
+# the code generator is off.
+def leftRecursionPass(grammar):
+    if not grammar.options.get("leftRecursion", True):
+        return []
+
+    return eliminateLeftRecursion(grammar.parsers())
+
+# Factors common prefixes of alternatives, see transform.LeftFactoring.
+# Only runs if the code generator has the option 'leftFactoring'.
+def leftFactoringPass(grammar):
+    if not grammar.options.get("leftFactoring", False):
+        return []
+
+    return leftFactor(grammar.parsers())
+
+# Computes nullable and FIRST of all parsers. The Analysis is shared with
+# the code generator, hence parsers must not be rewritten afterwards.
+def analysisPass(grammar):
+    analysis = Analysis()
+
+    for parser in grammar.parsers():
+        analysis.properties(parser)
+
+    grammar.analysis = analysis
+    return analysis
+
+# Finds the parsers that call themselves directly or indirectly. Returns
+# the groups of parsers that call each other.
+def recursionPass(grammar):
+    parsers = grammar.parsers()
+    components = stronglyConnectedComponents(parsers, calledParsers)
+    grammar.recursiveParsers = set()
+
+    for component in components:
+        if len(component) > 1 or component[0] in calledParsers(component[0]):
+            grammar.recursiveParsers.update(component)
+
+    return [component for component in components if component[0] in grammar.recursiveParsers]
+
+# Returns the parsers that the definition of 'parser' calls.
+def calledParsers(parser):
+    parsers = []
+    visited = set()
+    stack = list(children(parser))
+
+    while stack:
+        unit = stack.pop()
+
+        if unit in visited:
+            continue
+
+        visited.add(unit)
+
+        if isinstance(unit, Parser):
+            parsers.append(unit)
+        else:
+            stack.extend(children(unit))
+
+    return parsers
+
+################################################################################
+## Grammar #####################################################################
+################################################################################
+
+class Grammar:
+    def __init__(self, packageName, className, imports = []):
+        self.packageName = packageName
+        self.className = className
+        self.imports = list(imports)
+        # units that were added in the order in which they were added
+        self.roots = []
+        # unit -> names of its parameters
+        self.inputVars = {}
+        self.passes = PassManager()
+        self.passes.add("hazards", hazardsPass)
+        self.passes.add("leftRecursion", leftRecursionPass)
+        self.passes.add("leftFactoring", leftFactoringPass)
+        self.passes.add("analysis", analysisPass)
+        self.passes.add("recursion", recursionPass)
+        # set by the passes
+        self.analysis = None
+        self.recursiveParsers = set()
+        self.hazards = []
+        # a fragments.FragmentCache for the declarations or None
+        self.fragmentCache = None
+        # options of the code generator, set by 'generate' for the passes
+        self.options = {}
+
+    # Adds a member of the class. Units that it refers to are added by
+    # 'lower'.
+    # @inputVars names of the parameters. Required for FuncUnits with input
+    #   types because their bodies refer to them. Parsers use 'arg0', ...
+    #   by default.
+    def add(self, unit, inputVars = None):
+        if not isinstance(unit, (Object, Lexer, HiddenToken, Token, FuncUnit, TokenParser, Parser)):
+            raise TypeError("cannot declare " + type(unit).__name__)
+
+        if inputVars is not None:
+            if len(inputVars) != len(unit.inputTypes):
+                raise TypeError("wrong number of parameter names for " + unit.name)
+
+            self.inputVars[unit] = list(inputVars)
+
+        if unit not in self.roots:
+            self.roots.append(unit)
+
+        return self
+
+    # Parsers that are reachable from the added units.
+    def parsers(self):
+        return reachableParsers(self.rootUnits())
+
+    def rootUnits(self):
+        return [unit for unit in self.roots if isinstance(unit, Unit)]
+
+    # Returns the Declarations of all members: objects, lexers followed by
+    # their tokens, functions and finally the methods of parsers in the
+    # order in which they are found. Fields are initialized in this order.
+    def lower(self):
+        objects = []
+        lexers = []
+        functions = []
+        methods = []
+        visited = set()
+        stack = list(reversed(self.roots))
+
+        while stack:
+            unit = stack.pop()
+
+            if unit in visited:
+                continue
+
+            visited.add(unit)
+
+            if isinstance(unit, Object):
+                objects.append(unit)
+            elif isinstance(unit, Lexer):
+                lexers.append(unit)
+            elif isinstance(unit, (HiddenToken, Token)):
+                stack.append(unit.lexer)
+            elif isinstance(unit, ExternFunction):
+                if unit.object is not None:
+                    stack.append(unit.object)
+            elif isinstance(unit, FuncUnit):
+                functions.append(unit)
+            elif isinstance(unit, (TokenParser, Parser)):
+                methods.append(unit)
+
+            if isinstance(unit, Unit):
+                stack.extend(reversed(children(unit)))
+
+        declarations = [Declaration(unit) for unit in objects]
+
+        for lexer in lexers:
+            declarations.append(Declaration(lexer))
+            declarations.extend(Declaration(token) for token in lexer.tokens)
+
+        for function in functions:
+            if function not in self.inputVars and function.inputTypes:
+                raise TypeError("no parameter names for function " + function.name)
+
+            declarations.append(Declaration(function, self.inputVars.get(function, [])))
+
+        for method in methods:
+            inputVars = self.inputVars.get(method, ["arg" + str(i) for i in range(len(method.inputTypes))])
+            declarations.append(Declaration(method, inputVars, "stream"))
+
+        return declarations
+
+    # Runs the passes and writes the class to 'code'.
+    def generate(self, code):
+        self.options = code.options
+        self.passes.run(self)
+        declarations = self.passes.timed("lower", self.lower)
+        self.passes.timed("emit", self.emit, code, declarations)
+
+    def emit(self, code, declarations):
+        if self.analysis is not None:
+            code.grammarAnalysis = self.analysis
+
+        code.beginClass(self.packageName, self.className, self.imports)
+
+        for declaration in declarations:
+            if self.fragmentCache is not None:
+                self.fragmentCache.declare(code, declaration)
+            else:
+                declaration.declare(code)
+
+        code.declareErrorHandler()
+        code.endClass()
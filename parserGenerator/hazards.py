@@ -0,0 +1,288 @@
+from parserGenerator.analysis import Analysis, children, reachableParsers, stronglyConnectedComponents
+from parserGenerator.transform import LeftRecursionElimination
+from parserGenerator.units import *
+
+# Finds units that make generated parsers hang or that can never be used.
+# It only looks at the units, so it is cheap enough to run before every
+# build (see grammar.hazardsPass):
+#
+# * nullableRep (error): a Rep whose child can succeed without consuming
+#   input loops forever.
+# * leftRecursion: parsers that call each other without consuming input.
+#   If each call is the first element of an alternative, the leftRecursion
+#   pass turns them into loops (warning), otherwise they never return
+#   (error).
+# * unproductive (error): a parser that cannot succeed because each of its
+#   alternatives calls it again.
+# * unreachableAlternative (warning): alternatives after one that cannot
+#   fail.
+# * shadowedAlternative (warning): an alternative that starts like an
+#   earlier one or whose first tokens all belong to earlier ones. Parsers
+#   do not backtrack, the earlier alternative is chosen on these tokens.
+# * firstOverlap (warning): like shadowedAlternative, but only some of the
+#   first tokens belong to earlier alternatives.
+
+# @path names of the parsers from a root to the parser that contains the
+#   hazard.
+class Hazard:
+    def __init__(self, kind, severity, path, message):
+        self.kind = kind
+        self.severity = severity
+        self.path = path
+        self.message = message
+
+    def isError(self):
+        return self.severity == "error"
+
+    def __str__(self):
+        return self.severity + " " + self.kind + ": " + " > ".join(self.path) + ": " + self.message
+
+class HazardAnalysis:
+    # @analysis Analysis for FIRST sets, eg the one of a Grammar.
+    def __init__(self, analysis = None):
+        self.analysis = analysis if analysis is not None else Analysis()
+        self.hazards = []
+        # unit -> True if it may succeed without consuming input. Unlike
+        # Analysis.nullable, parsers of other grammars are assumed to
+        # consume input.
+        self.nullable = {}
+        # unit -> True if it may fail without a parsing error.
+        self.canFail = {}
+        # unit -> True if it may succeed at all.
+        self.productive = {}
+        # parser -> the parser that calls it on the shortest path from a root
+        self.callers = {}
+        # left recursive parsers. FIRST of their alternatives overlap before
+        # the leftRecursion pass rewrites them, hence they are not checked.
+        self.leftRecursive = set()
+
+    # Checks all parsers that are reachable from 'units' and returns the
+    # Hazards in the order of the parsers.
+    def run(self, units):
+        parsers = reachableParsers(units)
+        definitionUnits = dict((parser, unitsOf(parser)) for parser in parsers)
+
+        self.findCallers(units, parsers, definitionUnits)
+        self.solve([unit for parser in parsers for unit in definitionUnits[parser]] + parsers)
+        self.checkLeftRecursion(parsers)
+
+        checked = set()
+
+        for parser in parsers:
+            if not self.productive[parser]:
+                self.add("unproductive", "error", parser, "never succeeds, each alternative calls it again")
+
+            for unit in definitionUnits[parser]:
+                if unit in checked:
+                    continue
+
+                checked.add(unit)
+
+                if isinstance(unit, Rep) and self.nullable[unit.child]:
+                    self.add("nullableRep", "error", parser, "'" + shortLabel(unit) + "' loops forever, '" +
+                             shortLabel(unit.child) + "' can succeed without consuming input")
+                elif isinstance(unit, Or) and parser not in self.leftRecursive:
+                    self.checkAlternatives(parser, unit)
+
+        return self.hazards
+
+    def add(self, kind, severity, parser, message):
+        self.hazards.append(Hazard(kind, severity, self.path(parser), message))
+
+    # Names of the parsers from a root to 'parser'.
+    def path(self, parser):
+        path = []
+
+        while parser is not None:
+            path.append(parser.name)
+            parser = self.callers.get(parser)
+
+        return list(reversed(path))
+
+    # Breadth first search from the parsers in 'units'.
+    # @definitionUnits parser -> unitsOf(parser)
+    def findCallers(self, units, parsers, definitionUnits):
+        queue = [unit for unit in units if isinstance(unit, Parser)]
+        found = set(queue)
+
+        for parser in queue:
+            for called in definitionUnits[parser]:
+                if isinstance(called, Parser) and called not in found:
+                    found.add(called)
+                    self.callers[called] = parser
+                    queue.append(called)
+
+        # parsers that are only reachable from other units.
+        for parser in parsers:
+            self.callers.setdefault(parser, None)
+
+    # Computes the properties of 'units' until nothing changes. nullable and
+    # productive only grow, canFail only shrinks, hence this terminates. A
+    # left recursive call fails if the other alternatives fail, therefore
+    # canFail starts with True. Children should come first.
+    def solve(self, units):
+        for unit in units:
+            self.nullable[unit] = self.productive[unit] = False
+            self.canFail[unit] = True
+
+        changed = True
+
+        while changed:
+            changed = False
+
+            for unit in units:
+                value = (self.nullable[unit], self.canFail[unit], self.productive[unit])
+                newValue = self.evaluate(unit)
+
+                if newValue != value:
+                    self.nullable[unit], self.canFail[unit], self.productive[unit] = newValue
+                    changed = True
+
+    # Returns (nullable, canFail, productive) from the properties of the
+    # children.
+    def evaluate(self, unit):
+        if isinstance(unit, Parser):
+            definition = unit.definition
+            return self.nullable[definition], self.canFail[definition], self.productive[definition]
+        elif isinstance(unit, NamedUnit):
+            # tokens and parsers of other grammars consume input if they
+            # succeed, functions cannot fail.
+            return not unit.isParserUnit, unit.isParserUnit, True
+        elif isinstance(unit, Pass):
+            return True, False, True
+        elif isinstance(unit, Or):
+            return any(self.nullable[element] for element in unit.elements), \
+                all(self.canFail[element] for element in unit.elements), \
+                any(self.productive[element] for element in unit.elements)
+        elif isinstance(unit, Then):
+            # only the first element fails without a parsing error.
+            return all(self.nullable[element] for element in unit.elements), \
+                self.canFail[unit.elements[0]], \
+                all(self.productive[element] for element in unit.elements)
+        elif isinstance(unit, Recover):
+            # fails like its child, errors are caught.
+            return self.nullable[unit.child], self.canFail[unit.child], self.productive[unit.child]
+        elif isinstance(unit, Closure):
+            return True, False, self.productive[unit.child]
+        else:
+            raise TypeError("cannot analyze " + type(unit).__name__)
+
+    def checkAlternatives(self, parser, unit):
+        # first element -> index of the alternative
+        heads = {}
+        # union of FIRST of the previous alternatives, None if unknown
+        previousFirst = frozenset()
+
+        for i, alternative in enumerate(unit.elements):
+            head = alternative.elements[0] if isinstance(alternative, Then) else alternative
+            first = self.analysis.first(alternative)
+
+            if head in heads:
+                self.add("shadowedAlternative", "warning", parser, "'" + shortLabel(alternative) +
+                         "' is never chosen, it starts like alternative " + str(heads[head] + 1) +
+                         " of '" + shortLabel(unit) + "'")
+            elif first and previousFirst and not self.nullable[alternative]:
+                overlap = first & previousFirst
+
+                if overlap == first:
+                    self.add("shadowedAlternative", "warning", parser, "'" + shortLabel(alternative) +
+                             "' is never chosen, earlier alternatives of '" + shortLabel(unit) +
+                             "' start with the same tokens")
+                elif overlap:
+                    self.add("firstOverlap", "warning", parser, "'" + shortLabel(alternative) +
+                             "' is not chosen on " + ", ".join(sorted(token.name for token in overlap)) +
+                             ", earlier alternatives of '" + shortLabel(unit) + "' start with them")
+
+            heads.setdefault(head, i)
+            previousFirst = previousFirst | first if previousFirst is not None and first is not None else None
+
+            if not self.canFail[alternative] and i < len(unit.elements) - 1:
+                self.add("unreachableAlternative", "warning", parser, str(len(unit.elements) - i - 1) +
+                         " alternative(s) after '" + shortLabel(alternative) + "' in '" + shortLabel(unit) +
+                         "' are never tried, it cannot fail")
+                break
+
+    # Parsers that call each other before they consume input.
+    def checkLeftRecursion(self, parsers):
+        elimination = LeftRecursionElimination()
+        calls = dict((parser, self.leftCalls(parser)) for parser in parsers)
+        rewritten = set()
+
+        for component in stronglyConnectedComponents(parsers, elimination.leftCalls):
+            if len(component) > 1 or component[0] in elimination.leftCalls(component[0]):
+                rewritten.add(frozenset(component))
+
+        order = dict((parser, i) for i, parser in enumerate(parsers))
+
+        for component in stronglyConnectedComponents(parsers, lambda parser: calls[parser]):
+            if len(component) == 1 and component[0] not in calls[component[0]]:
+                continue
+
+            component = sorted(component, key = lambda parser: order[parser])
+            self.leftRecursive.update(component)
+            names = ", ".join(parser.name for parser in component)
+
+            if frozenset(component) in rewritten:
+                self.add("leftRecursion", "warning", component[0],
+                         "left recursive (" + names + "), the leftRecursion pass turns it into a loop")
+            else:
+                self.add("leftRecursion", "error", component[0],
+                         "left recursive (" + names + ") through units that can be empty, it never returns")
+
+    # Returns the parsers that 'parser' may call before it consumes input.
+    def leftCalls(self, parser):
+        calls = []
+        visited = set()
+        stack = [parser.definition]
+
+        while stack:
+            unit = stack.pop()
+
+            if unit in visited:
+                continue
+
+            visited.add(unit)
+
+            if isinstance(unit, Parser):
+                calls.append(unit)
+            elif isinstance(unit, Or):
+                stack.extend(unit.elements)
+            elif isinstance(unit, Then):
+                for element in unit.elements:
+                    stack.append(element)
+
+                    if not self.nullable[element]:
+                        break
+            elif isinstance(unit, Closure):
+                stack.append(unit.child)
+
+        return calls
+
+# Returns the units of the definition of 'parser', children before their
+# parents. Parsers that it calls are included but not entered.
+def unitsOf(parser):
+    units = []
+    visited = set()
+    stack = [(parser.definition, False)]
+
+    while stack:
+        unit, isExpanded = stack.pop()
+
+        if isExpanded:
+            units.append(unit)
+        elif unit not in visited:
+            visited.add(unit)
+            stack.append((unit, True))
+
+            if not isinstance(unit, Parser):
+                stack.extend((child, False) for child in reversed(children(unit)))
+
+    return units
+
+# Returns the Hazards of the parsers that are reachable from 'units'.
+def findHazards(units, analysis = None):
+    return HazardAnalysis(analysis).run(units)
+
+# Returns the Hazards as lines, errors first.
+def report(hazards):
+    return "\n".join(str(hazard) for hazard in sorted(hazards, key = lambda hazard: not hazard.isError()))
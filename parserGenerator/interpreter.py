@@ -0,0 +1,303 @@
+import parserGenerator.runtime as runtime
+
+from parserGenerator.dfa import compileDfa
+from parserGenerator.transform import LeftRecursionElimination
+from parserGenerator.units import *
+
+# Runs units directly without generating code. Every unit is compiled once
+# into a closure 'run(stream, args)' that receives a tuple with the values
+# of its input types and returns a tuple with the values of its return
+# types or None if it failed. Like in the generated code, a unit takes its
+# arguments from the end of the values that are currently available (see
+# Unit.createCall).
+class Interpreter:
+    # @functions maps FuncUnits, Exprs and ExternFunctions (or their names)
+    #   to python callables. Parsers of other grammars must behave like the
+    #   generated methods, ie receive the stream as last argument and return
+    #   None (or False) if they fail. Exprs without a callable use their
+    #   python call code, eg "list" or "CharSet.empty".
+    # @dfa if True, all tokens of a lexer are matched by one DFA.
+    def __init__(self, functions = None, dfa = False):
+        self.functions = dict(functions) if functions else {}
+        self.dfa = dfa
+        self.leftRecursion = LeftRecursionElimination()
+        self.lexers = {}
+        self.tokens = {}
+        self.closures = {}
+        # messages of the errors that Recovers caught
+        self.errors = []
+        # the ParseError that was raised last, Recovers only catch errors
+        # of this interpreter (see parsingError).
+        self.parseError = None
+
+    # Returns a function that behaves like the method that is generated for
+    # 'unit' (a Parser or TokenParser): it receives the input values and the
+    # TokStream and returns the value, True or None/False on failure.
+    def parser(self, unit):
+        run = self.compile(unit)
+        hasReturn = bool(unit.returnTypes)
+
+        def call(*args):
+            result = run(args[-1], args[:-1])
+
+            if hasReturn:
+                return result[0] if result is not None else None
+
+            return result is not None
+
+        return call
+
+    # Parses 'text' with 'unit' and returns the result of the parser.
+    def parse(self, unit, text, *args):
+        return self.parser(unit)(*(args + (runtime.TokStream(text),)))
+
+    def compile(self, unit):
+        run = self.closures.get(unit)
+
+        if run is None:
+            if isinstance(unit, Parser):
+                # left recursive parsers are rewritten into loops.
+                self.leftRecursion.run([unit])
+
+                # parsers may be recursive, hence their closure is
+                # registered before the definition is compiled.
+                body = []
+                run = lambda stream, args: body[0](stream, args)
+                self.closures[unit] = run
+                body.append(self.compileUnit(unit))
+            else:
+                run = self.compileUnit(unit)
+                self.closures[unit] = run
+
+        return run
+
+    def compileUnit(self, unit):
+        if isinstance(unit, Token):
+            return self.compileToken(unit)
+        elif isinstance(unit, TokenParser):
+            return self.compileTokenParser(unit)
+        elif isinstance(unit, Parser):
+            return self.compileParser(unit)
+        elif isinstance(unit, NamedUnit):
+            return self.compileFunction(unit)
+        elif isinstance(unit, Pass):
+            return lambda stream, args: args
+        elif isinstance(unit, Or):
+            return self.compileOr(unit)
+        elif isinstance(unit, Then):
+            return self.compileThen(unit)
+        elif isinstance(unit, Rep):
+            return self.compileRep(unit)
+        elif isinstance(unit, Opt):
+            return self.compileOpt(unit)
+        elif isinstance(unit, Recover):
+            return self.compileRecover(unit)
+        else:
+            raise TypeError("cannot interpret " + type(unit).__name__)
+
+    # Returns the runtime token of a Token or HiddenToken. All tokens of its
+    # lexer are created as well so that hidden tokens are skipped.
+    def token(self, unit):
+        if unit not in self.tokens:
+            lexer = runtime.Lexer()
+            self.lexers[unit.lexer] = lexer
+
+            for member in unit.lexer.tokens:
+                regex = runtime.evalRegex(member.regex)
+                isHidden = not isinstance(member, Token)
+                self.tokens[member] = lexer.add(regex, isHidden)
+
+            if self.dfa:
+                lexer.setDfa(compileDfa([token.regex for token in lexer.tokens]))
+
+        return self.tokens[unit]
+
+    def function(self, unit):
+        if unit in self.functions:
+            return self.functions[unit]
+        if unit.name in self.functions:
+            return self.functions[unit.name]
+        if isinstance(unit, Expr):
+            return eval(unit.callCodes.get("python", unit.name), vars(runtime))
+
+        raise TypeError("no python function for " + unit.name)
+
+    def compileToken(self, unit):
+        token = self.token(unit)
+
+        def run(stream, args):
+            return () if token.recognizeToken(stream) else None
+
+        return run
+
+    def compileTokenParser(self, unit):
+        token = self.token(unit.token)
+        func = self.compile(unit.func)
+
+        def run(stream, args):
+            seq = token.parseToken(stream)
+
+            if seq is None:
+                return None
+
+            return func(stream, args + (seq,))
+
+        return run
+
+    # Functions that are parser units (ExternFunctions) fail if they
+    # return None or False, like in NamedUnit.assignReturnVars.
+    def compileFunction(self, unit):
+        function = self.function(unit)
+
+        if unit.isParserUnit:
+            if unit.returnTypes:
+                def run(stream, args):
+                    value = function(*(args + (stream,)))
+                    return (value,) if value is not None else None
+            else:
+                def run(stream, args):
+                    return () if function(*(args + (stream,))) else None
+        else:
+            if unit.returnTypes:
+                def run(stream, args):
+                    return (function(*args),)
+            else:
+                def run(stream, args):
+                    function(*args)
+                    return ()
+
+        return run
+
+    def compileParser(self, unit):
+        if unit.definition is None:
+            raise TypeError("parser " + unit.name + " has no definition")
+
+        definition = self.compile(unit.definition)
+
+        if not unit.returnTypes:
+            run = definition
+        else:
+            # like in generated code, a parser that returns null failed.
+            def run(stream, args):
+                result = definition(stream, args)
+                return result if result is not None and result[0] is not None else None
+
+        if unit.memoize:
+            run = self.memoized(run, runtime.MemoTable(unit.memoLimit))
+
+        return run
+
+    def memoized(self, parse, table):
+        def run(stream, args):
+            start = stream.pos
+            entry = table.get(stream, start)
+
+            if entry is not None:
+                stream.pos = entry[1]
+                return entry[0]
+
+            result = parse(stream, args)
+            table.put(start, result, stream.pos)
+            return result
+
+        return run
+
+    def compileOr(self, unit):
+        alternatives = [self.compile(element) for element in unit.elements]
+
+        def run(stream, args):
+            for alternative in alternatives:
+                result = alternative(stream, args)
+
+                if result is not None:
+                    return result
+
+            return None
+
+        return run
+
+    # Like in the generated code, only the first element may fail without a
+    # parsing error.
+    def compileThen(self, unit):
+        first = self.compile(unit.elements[0])
+        firstInputCount = len(unit.elements[0].inputTypes)
+        others = [(self.compile(element), len(element.inputTypes), element.isParserUnit, str(element))
+                  for element in unit.elements[1:]]
+
+        def run(stream, args):
+            split = len(args) - firstInputCount
+            result = first(stream, args[split:])
+
+            if result is None:
+                return None
+
+            values = args[:split] + result
+
+            for element, inputCount, isParserUnit, expected in others:
+                split = len(values) - inputCount
+                result = element(stream, values[split:])
+
+                if result is None:
+                    if isParserUnit:
+                        self.parsingError(stream, expected)
+                    return None
+
+                values = values[:split] + result
+
+            return values
+
+        return run
+
+    def compileRep(self, unit):
+        child = self.compile(unit.child)
+
+        def run(stream, args):
+            while True:
+                result = child(stream, args)
+
+                if result is None:
+                    return args
+
+                args = result
+
+        return run
+
+    def compileOpt(self, unit):
+        child = self.compile(unit.child)
+
+        def run(stream, args):
+            result = child(stream, args)
+            return result if result is not None else args
+
+        return run
+
+    def compileRecover(self, unit):
+        child = self.compile(unit.child)
+        sync = self.token(unit.sync)
+        lexer = self.lexers[unit.sync.lexer]
+
+        def run(stream, args):
+            start = stream.pos
+
+            try:
+                return child(stream, args)
+            except runtime.ParseError as e:
+                # errors of other grammars pass through, like in the
+                # generated code.
+                if e is not self.parseError:
+                    raise
+
+                while not sync.recognizeToken(stream) and lexer.peekChar(stream) != -1:
+                    stream.pos += 1
+
+                if stream.pos == start:
+                    raise
+
+                self.errors.append(str(e))
+                return args
+
+        return run
+
+    def parsingError(self, stream, expected):
+        self.parseError = runtime.ParseError("Expected " + expected + " at " + str(stream))
+        raise self.parseError
@@ -0,0 +1,799 @@
+import re
+
+# Intermediate representation of the body of a generated method. While a
+# method is declared, the statements that units emit are recorded as nodes
+# (see CodeGenerator.methodBlock). When the method is complete, 'optimize'
+# renames and removes local variables and 'write' passes the nodes to the
+# code generator.
+#
+# Expressions are kept as strings of the target language. Variables in
+# them are found by their names, string literals are skipped.
+
+identifierPattern = re.compile(r"[A-Za-z_][A-Za-z_0-9]*")
+stringPattern = re.compile(r"\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'")
+
+# Returns the identifiers in 'expr'.
+def names(expr):
+    return set(identifierPattern.findall(stringPattern.sub("", expr)))
+
+# Replaces identifiers in 'expr' according to the dict 'renames'.
+def renamed(expr, renames):
+    parts = []
+    pos = 0
+
+    for match in stringPattern.finditer(expr):
+        parts.append(identifierPattern.sub(lambda name: renames.get(name.group(), name.group()),
+                                           expr[pos:match.start()]))
+        parts.append(match.group())
+        pos = match.end()
+
+    parts.append(identifierPattern.sub(lambda name: renames.get(name.group(), name.group()), expr[pos:]))
+    return "".join(parts)
+
+################################################################################
+## Nodes #######################################################################
+################################################################################
+
+# A line that is not analyzed, eg from the body of a FuncUnit.
+class Line:
+    def __init__(self, text):
+        self.text = text
+
+class Comment:
+    def __init__(self, text):
+        self.text = text
+
+# @init None if the variable is declared without a value.
+class Local:
+    def __init__(self, type, name, init):
+        self.type = type
+        self.name = name
+        self.init = init
+
+class Assign:
+    def __init__(self, lv, rv):
+        self.lv = lv
+        self.rv = rv
+
+# @isThrow True for calls of parsingError, which never return.
+class Statement:
+    def __init__(self, expr, isThrow = False):
+        self.expr = expr
+        self.isThrow = isThrow
+
+class Return:
+    def __init__(self, value):
+        self.value = value
+
+class Break:
+    pass
+
+class Continue:
+    pass
+
+class If:
+    def __init__(self, condition):
+        self.condition = condition
+        self.body = []
+        self.orElse = None
+
+class Loop:
+    def __init__(self):
+        self.body = []
+
+# @cases list of (value, body)
+class Switch:
+    def __init__(self, var):
+        self.var = var
+        self.cases = []
+        self.default = None
+
+# Returns the expressions that 'node' reads (without nested nodes).
+def expressions(node):
+    if isinstance(node, Local):
+        return [node.init] if node.init is not None else []
+    elif isinstance(node, Assign):
+        # eg 'stream.pos = ...' reads 'stream'.
+        return [node.rv] if identifierPattern.fullmatch(node.lv) else [node.lv, node.rv]
+    elif isinstance(node, Statement):
+        return [node.expr]
+    elif isinstance(node, Return):
+        return [node.value]
+    elif isinstance(node, If):
+        return [node.condition]
+    elif isinstance(node, Switch):
+        return [node.var]
+    else:
+        return []
+
+# Returns the variable that 'node' assigns or None.
+def definition(node):
+    if isinstance(node, Local):
+        return node.name
+    elif isinstance(node, Assign) and identifierPattern.fullmatch(node.lv):
+        return node.lv
+    else:
+        return None
+
+def uses(node):
+    result = set()
+
+    for expr in expressions(node):
+        result.update(names(expr))
+
+    return result
+
+# Lists of nodes that are nested in 'node'.
+def bodies(node):
+    if isinstance(node, If):
+        return [node.body] if node.orElse is None else [node.body, node.orElse]
+    elif isinstance(node, Loop):
+        return [node.body]
+    elif isinstance(node, Switch):
+        return [body for value, body in node.cases] + ([node.default] if node.default is not None else [])
+    else:
+        return []
+
+# Returns all nodes in 'body' including nested ones in program order.
+def allNodes(body):
+    result = []
+    stack = list(reversed(body))
+
+    while stack:
+        node = stack.pop()
+        result.append(node)
+
+        for nested in reversed(bodies(node)):
+            stack.extend(reversed(nested))
+
+    return result
+
+def renameNode(node, renames):
+    if isinstance(node, Local):
+        node.name = renames.get(node.name, node.name)
+
+        if node.init is not None:
+            node.init = renamed(node.init, renames)
+    elif isinstance(node, Assign):
+        node.lv = renamed(node.lv, renames)
+        node.rv = renamed(node.rv, renames)
+    elif isinstance(node, Statement):
+        node.expr = renamed(node.expr, renames)
+    elif isinstance(node, Return):
+        node.value = renamed(node.value, renames)
+    elif isinstance(node, If):
+        node.condition = renamed(node.condition, renames)
+    elif isinstance(node, Switch):
+        node.var = renamed(node.var, renames)
+
+# True if the end of 'body' is not reached because it ends with a jump.
+def jumps(body):
+    nodes = [node for node in body if not isinstance(node, Comment)]
+
+    if not nodes:
+        return False
+
+    return isinstance(nodes[-1], (Return, Break, Continue))
+
+# Passes the nodes in 'body' to the code generator.
+def write(body, code):
+    for node in body:
+        if isinstance(node, Line):
+            code.writeLine(node.text)
+        elif isinstance(node, Comment):
+            code.writeComment(node.text)
+        elif isinstance(node, Local):
+            code.writeLocal(node.type, node.name, node.init)
+        elif isinstance(node, Assign):
+            code.writeAssign(node.lv, node.rv)
+        elif isinstance(node, Statement):
+            code.writeStatement(node.expr)
+        elif isinstance(node, Return):
+            code.writeReturn(node.value)
+        elif isinstance(node, Break):
+            code.writeBreak()
+        elif isinstance(node, Continue):
+            code.writeContinue()
+        elif isinstance(node, If):
+            code.writeIf(node.condition)
+            write(node.body, code)
+
+            if node.orElse is not None:
+                code.writeElse()
+                write(node.orElse, code)
+
+            code.writeEndBlock()
+        elif isinstance(node, Loop):
+            code.writeLoop()
+            write(node.body, code)
+            code.writeEndBlock()
+        elif isinstance(node, Switch):
+            code.writeSwitch(node.var)
+
+            for value, body in node.cases:
+                code.writeCase(value)
+                write(body, code)
+                code.writeEndCase(not jumps(body))
+
+            code.writeDefault()
+            write(node.default or [], code)
+            code.writeEndCase(not jumps(node.default or []))
+            code.writeEndSwitch()
+        else:
+            raise TypeError("cannot write " + type(node).__name__)
+
+################################################################################
+## Methods #####################################################################
+################################################################################
+
+# Records the body of a method. Blocks are opened and closed like in the
+# code generator.
+class Method:
+    def __init__(self, argTypes, argVars):
+        # name -> type
+        self.parameters = dict(zip(argVars, argTypes))
+        # name -> type of the variables from CodeGenerator.createVar
+        self.temps = {}
+        self.body = []
+        # lists to which nodes are added
+        self.lists = [self.body]
+        # open Ifs, Loops and Switches
+        self.blocks = []
+
+    def add(self, node):
+        self.lists[-1].append(node)
+
+    def beginBlock(self, block):
+        self.add(block)
+        self.blocks.append(block)
+
+        if not isinstance(block, Switch):
+            self.lists.append(block.body)
+
+    def elseBlock(self):
+        self.blocks[-1].orElse = []
+        self.lists[-1] = self.blocks[-1].orElse
+
+    def caseBlock(self, value):
+        body = []
+        self.blocks[-1].cases.append((value, body))
+        self.lists.append(body)
+
+    def defaultBlock(self):
+        self.blocks[-1].default = []
+        self.lists.append(self.blocks[-1].default)
+
+    def endCase(self):
+        self.lists.pop()
+
+    def endSwitch(self):
+        self.blocks.pop()
+
+    # Returns True if this closes the method itself.
+    def endBlock(self):
+        if not self.blocks:
+            return True
+
+        self.blocks.pop()
+        self.lists.pop()
+        return False
+
+################################################################################
+## Control flow ################################################################
+################################################################################
+
+# Control flow graph of the statements in a method. Node 0 is the exit of
+# the method, blocks are represented by their condition, Loops by their
+# head.
+class Flow:
+    # @throwsExit if True, parsingError leaves the method. The compiler does
+    #   not know this, hence it is False for its checks.
+    def __init__(self, body, throwsExit):
+        self.throwsExit = throwsExit
+        self.nodes = [None]
+        self.successors = [[]]
+        # Loop -> id of its head
+        self.loopHeads = {}
+        self.entry = self.lower(body, 0, None, None)
+
+    def newNode(self, node, successors):
+        self.nodes.append(node)
+        self.successors.append(successors)
+        return len(self.nodes) - 1
+
+    # Adds the nodes of 'body' and returns the id of the first one.
+    # @next id of the node that follows 'body'.
+    def lower(self, body, next, breakTarget, continueTarget):
+        for node in reversed(body):
+            next = self.lowerNode(node, next, breakTarget, continueTarget)
+
+        return next
+
+    def lowerNode(self, node, next, breakTarget, continueTarget):
+        if isinstance(node, Comment):
+            return next
+        elif isinstance(node, If):
+            body = self.lower(node.body, next, breakTarget, continueTarget)
+            orElse = self.lower(node.orElse, next, breakTarget, continueTarget) \
+                if node.orElse is not None else next
+            return self.newNode(node, [body, orElse])
+        elif isinstance(node, Loop):
+            head = self.newNode(node, [])
+            self.loopHeads[node] = head
+            self.successors[head] = [self.lower(node.body, head, next, head)]
+            return head
+        elif isinstance(node, Switch):
+            # 'break' leaves the switch.
+            targets = [self.lower(body, next, next, continueTarget) for value, body in node.cases]
+            targets.append(self.lower(node.default or [], next, next, continueTarget))
+            return self.newNode(node, targets)
+        elif isinstance(node, Break):
+            return self.newNode(node, [breakTarget])
+        elif isinstance(node, Continue):
+            return self.newNode(node, [continueTarget])
+        elif isinstance(node, Return) or \
+                isinstance(node, Statement) and node.isThrow and self.throwsExit:
+            return self.newNode(node, [0])
+        else:
+            return self.newNode(node, [next])
+
+    # Returns (liveIn, liveOut), the sets of 'variables' that may be read
+    # before they are assigned, for each node.
+    def liveness(self, variables):
+        count = len(self.nodes)
+        nodeUses = [uses(node) & variables if node is not None else set() for node in self.nodes]
+        nodeDefs = [definition(node) if node is not None else None for node in self.nodes]
+        liveIn = [set() for i in range(count)]
+        liveOut = [set() for i in range(count)]
+        changed = True
+
+        # successors mostly have smaller ids.
+        while changed:
+            changed = False
+
+            for i in range(count):
+                out = set()
+
+                for successor in self.successors[i]:
+                    out |= liveIn[successor]
+
+                live = out - {nodeDefs[i]} if nodeDefs[i] is not None else set(out)
+                live |= nodeUses[i]
+
+                if live != liveIn[i] or out != liveOut[i]:
+                    liveIn[i] = live
+                    liveOut[i] = out
+                    changed = True
+
+        return liveIn, liveOut
+
+    # Returns the sets of 'variables' that are definitely assigned before
+    # each node. A Local without a value removes its variable.
+    def assigned(self, variables):
+        count = len(self.nodes)
+        predecessors = [[] for i in range(count)]
+
+        for i, successors in enumerate(self.successors):
+            for successor in successors:
+                predecessors[successor].append(i)
+
+        universe = frozenset(variables)
+        before = [universe] * count
+        after = [universe] * count
+        changed = True
+
+        # predecessors mostly have larger ids.
+        while changed:
+            changed = False
+
+            for i in reversed(range(count)):
+                if i == self.entry:
+                    inSet = frozenset()
+                elif predecessors[i]:
+                    inSet = frozenset.intersection(*[after[predecessor] for predecessor in predecessors[i]])
+                else:
+                    # unreachable
+                    inSet = universe
+
+                node = self.nodes[i]
+
+                if isinstance(node, Local) and node.init is None:
+                    outSet = inSet - {node.name}
+                elif definition(node) is not None:
+                    outSet = inSet | {definition(node)}
+                else:
+                    outSet = inSet
+
+                if inSet != before[i] or outSet != after[i]:
+                    before[i] = inSet
+                    after[i] = outSet
+                    changed = True
+
+        return before
+
+################################################################################
+## Optimization ################################################################
+################################################################################
+
+# Optimizes the variables from CodeGenerator.createVar in 'method':
+#
+# * Their declarations become assignments and assignments of constants or
+#   variables that are never read are removed (eg most '= null').
+# * Variables of the same type that are never live at the same time are
+#   merged, preferably if one is a copy of the other. The copy disappears
+#   then (copy propagation). Variables may also be merged with parameters
+#   that they copy.
+# * Each remaining variable is declared once before its first use. If the
+#   compiler cannot see that it is assigned before it is read, it is
+#   initialized with a default value.
+#
+# Methods with Lines are not changed.
+def optimize(method, code):
+    nodes = allNodes(method.body)
+
+    if not method.temps or any(isinstance(node, Line) for node in nodes):
+        return
+
+    for body in [method.body] + [body for node in nodes for body in bodies(node)]:
+        for i, node in enumerate(body):
+            if isinstance(node, Local) and node.name in method.temps:
+                body[i] = Assign(node.name, node.init)
+
+    variables = set(method.temps) | set(method.parameters)
+
+    while True:
+        flow = Flow(method.body, True)
+        liveIn, liveOut = flow.liveness(variables)
+        dead = deadStores(flow, liveOut, method.temps)
+
+        if not dead:
+            break
+
+        method.body[:] = removed(method.body, dead)
+
+    renames, types = allocate(method, flow, liveOut)
+
+    for node in allNodes(method.body):
+        renameNode(node, renames)
+
+    method.body[:] = cleanup(method.body)
+    declare(method, types, code)
+
+# Returns the assignments of constants or variables to temps that are not
+# read afterwards.
+def deadStores(flow, liveOut, temps):
+    dead = set()
+
+    for i, node in enumerate(flow.nodes):
+        if isinstance(node, Assign) and node.lv in temps and node.lv not in liveOut[i] and \
+                (identifierPattern.fullmatch(node.rv) or node.rv.isdigit()):
+            dead.add(node)
+
+    return dead
+
+# Returns 'body' without the nodes in 'dead'.
+def removed(body, dead):
+    result = []
+
+    for node in body:
+        if node in dead:
+            continue
+
+        if isinstance(node, If):
+            node.body = removed(node.body, dead)
+
+            if node.orElse is not None:
+                node.orElse = removed(node.orElse, dead)
+        elif isinstance(node, Loop):
+            node.body = removed(node.body, dead)
+        elif isinstance(node, Switch):
+            node.cases = [(value, removed(body, dead)) for value, body in node.cases]
+
+            if node.default is not None:
+                node.default = removed(node.default, dead)
+
+        result.append(node)
+
+    return result
+
+# Merges variables by coloring the interference graph. Returns the new
+# names of the temps and the types of the new names.
+def allocate(method, flow, liveOut):
+    parameters = method.parameters
+    types = dict(parameters)
+    types.update(method.temps)
+
+    # variables that are live while another one is assigned interfere. A
+    # copy does not interfere with its source.
+    edges = dict((var, set()) for var in types)
+
+    for i, node in enumerate(flow.nodes):
+        var = definition(node)
+
+        if var not in types:
+            continue
+
+        source = node.rv if isinstance(node, Assign) else None
+
+        for other in liveOut[i]:
+            if other != var and other != source and other in types:
+                edges[var].add(other)
+                edges[other].add(var)
+
+    # groups of merged variables, the root of a group with a parameter is
+    # the parameter.
+    group = dict((var, var) for var in types)
+    members = dict((var, {var}) for var in types)
+    neighbors = edges
+
+    def merge(root, other):
+        if root == other or types[root] != types[other] or members[root] & neighbors[other] or \
+                root in parameters and other in parameters:
+            return False
+
+        if other in parameters:
+            root, other = other, root
+
+        for var in members[other]:
+            group[var] = root
+
+        members[root] |= members.pop(other)
+        neighbors[root] |= neighbors.pop(other)
+        return True
+
+    order = []
+
+    for node in allNodes(method.body):
+        for var in sorted(uses(node)) + [definition(node)]:
+            if var in method.temps and var not in order:
+                order.append(var)
+
+        if isinstance(node, Assign) and node.lv in types and node.rv in types:
+            merge(group[node.lv], group[node.rv])
+
+    # remaining variables reuse earlier ones of the same type.
+    roots = []
+
+    for var in order:
+        root = group[var]
+
+        if root in parameters or root in roots:
+            continue
+
+        for previous in roots:
+            if merge(previous, root):
+                break
+        else:
+            roots.append(root)
+
+    renames = {}
+    newNames = {}
+    newTypes = {}
+
+    for var in order:
+        root = group[var]
+
+        if root not in newNames:
+            if root in parameters:
+                newNames[root] = root
+            else:
+                newNames[root] = "var" + str(len(newTypes))
+                newTypes[newNames[root]] = types[root]
+
+        renames[var] = newNames[root]
+
+    return renames, newTypes
+
+def isEmpty(body):
+    return all(isinstance(node, Comment) for node in body)
+
+# Removes self assignments and empty blocks. Conditions have no side
+# effects.
+def cleanup(body):
+    result = []
+
+    for node in body:
+        if isinstance(node, Assign) and node.lv == node.rv:
+            continue
+        elif isinstance(node, If):
+            node.body = cleanup(node.body)
+
+            if node.orElse is not None:
+                node.orElse = cleanup(node.orElse)
+
+                if isEmpty(node.orElse):
+                    node.orElse = None
+
+            if isEmpty(node.body) and node.orElse is None:
+                continue
+        elif isinstance(node, Loop):
+            node.body = cleanup(node.body)
+        elif isinstance(node, Switch):
+            node.cases = [(value, cleanup(body)) for value, body in node.cases]
+
+            if node.default is not None:
+                node.default = cleanup(node.default)
+
+        result.append(node)
+
+    return result
+
+# Returns the innermost position that contains both 'first' and 'second'.
+# A position is a list of (body, index) from the method body to a node.
+def commonPosition(first, second):
+    if first is None:
+        return second
+
+    result = []
+
+    for (body, index), (otherBody, otherIndex) in zip(first, second):
+        if body is not otherBody:
+            break
+
+        result.append((body, min(index, otherIndex)))
+
+        if index != otherIndex:
+            break
+
+    return result
+
+# Declares the variables in 'types' before the statement that contains all
+# their uses. Variables that are live at the head of a loop are declared
+# outside of it.
+def declare(method, types, code):
+    flow = Flow(method.body, True)
+    liveIn, liveOut = flow.liveness(set(types))
+    positions = {}
+
+    def visit(body, position):
+        for index, node in enumerate(body):
+            nodePosition = position + [(body, index)]
+
+            for var in uses(node) | {definition(node)}:
+                if var in types:
+                    positions[var] = commonPosition(positions.get(var), nodePosition)
+
+            for nested in bodies(node):
+                visit(nested, nodePosition)
+
+    visit(method.body, [])
+
+    insertions = []
+
+    for var in sorted(positions, key = lambda var: int(var[3:])):
+        position = positions[var]
+
+        for level, (body, index) in enumerate(position[:-1]):
+            if isinstance(body[index], Loop) and var in liveIn[flow.loopHeads[body[index]]]:
+                position = position[:level + 1]
+                break
+
+        body, index = position[-1]
+        node = body[index]
+
+        if isinstance(node, Assign) and node.lv == var and var not in names(node.rv):
+            body[index] = Local(types[var], var, node.rv)
+        else:
+            insertions.append((body, index, Local(types[var], var, None)))
+
+    # insert from the end so that indices remain valid.
+    for body, index, local in reversed(sorted(insertions, key = lambda insertion: insertion[1])):
+        body.insert(index, local)
+
+    # the compiler requires a value if it cannot see an assignment.
+    flow = Flow(method.body, False)
+    before = flow.assigned(set(types))
+
+    for i, node in enumerate(flow.nodes):
+        for var in uses(node) & set(types) - before[i]:
+            for local in allNodes(method.body):
+                if isinstance(local, Local) and local.name == var and local.init is None:
+                    local.init = code.defaultValue(types[var])
+
+################################################################################
+## Status ######################################################################
+################################################################################
+
+# Returns the value of the status variable before each node of 'flow': True,
+# False, None if it is unknown or absent if the node cannot be reached.
+# Branches of tests of the status refine it.
+# @literals dict literal -> bool
+# @evaluate see simplifyStatus
+def statusValues(flow, status, literals, evaluate):
+    values = {flow.entry: None}
+    stack = [flow.entry]
+
+    while stack:
+        i = stack.pop()
+        node = flow.nodes[i]
+        value = values[i]
+        after = value
+
+        if definition(node) == status:
+            after = literals.get(node.init if isinstance(node, Local) else node.rv)
+
+        for branch, successor in enumerate(flow.successors[i]):
+            edgeValue = after
+
+            if isinstance(node, If):
+                # values for which this branch may be taken.
+                isTaken = branch == 0
+                possible = [candidate for candidate in (True, False)
+                            if (value is None or value == candidate) and
+                            evaluate(node.condition, candidate) in (None, isTaken)]
+
+                if not possible:
+                    continue
+
+                edgeValue = possible[0] if len(possible) == 1 else None
+
+            if successor not in values:
+                values[successor] = edgeValue
+            elif values[successor] is None or values[successor] == edgeValue:
+                continue
+            else:
+                values[successor] = None
+
+            stack.append(successor)
+
+    return dict((flow.nodes[i], value) for i, value in values.items() if flow.nodes[i] is not None)
+
+# True if 'body' contains a break that leaves the enclosing loop.
+def containsBreak(body):
+    for node in body:
+        if isinstance(node, Break) or isinstance(node, If) and any(containsBreak(nested) for nested in bodies(node)):
+            return True
+
+    return False
+
+# Removes tests of the status variable whose outcome is known and
+# assignments that do not change it. A status that is known is returned as
+# a literal.
+# @status name of the status variable
+# @literals dict literal -> bool for true and false
+# @evaluate function(condition, value) that returns the value of
+#   'condition' if the status is 'value' or None if it also depends on
+#   other variables.
+def simplifyStatus(method, status, literals, evaluate):
+    values = statusValues(Flow(method.body, True), status, literals, evaluate)
+    names = dict((value, literal) for literal, value in literals.items())
+
+    def simplified(body):
+        result = []
+
+        for node in body:
+            value = values.get(node)
+
+            if isinstance(node, If):
+                outcome = evaluate(node.condition, value) if value is not None else None
+
+                # a loop without break would make the code after it unreachable.
+                if outcome is True and not containsBreak(node.orElse or []):
+                    result.extend(simplified(node.body))
+                    continue
+                elif outcome is False and not containsBreak(node.body):
+                    result.extend(simplified(node.orElse or []))
+                    continue
+
+                node.body = simplified(node.body)
+
+                if node.orElse is not None:
+                    node.orElse = simplified(node.orElse)
+            elif isinstance(node, Loop):
+                node.body = simplified(node.body)
+            elif isinstance(node, Switch):
+                node.cases = [(case, simplified(caseBody)) for case, caseBody in node.cases]
+
+                if node.default is not None:
+                    node.default = simplified(node.default)
+            elif isinstance(node, Assign) and node.lv == status and value is not None and \
+                    literals.get(node.rv) == value:
+                continue
+            elif isinstance(node, Return) and node.value == status and value is not None:
+                node.value = names[value]
+
+            result.append(node)
+
+        return result
+
+    method.body[:] = simplified(method.body)
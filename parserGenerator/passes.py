@@ -0,0 +1,81 @@
+import time
+
+# A pass manager runs passes in the order in which they were added and
+# measures how long each of them takes. A pass is a function that receives
+# the target (eg a Grammar or an ir.Method), its result is kept in
+# 'results'. Passes that run more than once (eg once per method) add up
+# their time.
+class PassManager:
+    def __init__(self):
+        # list of (name, function)
+        self.passes = []
+        # name -> result of the last run
+        self.results = {}
+        # name -> [seconds, runs] in the order in which they were first run
+        self.timings = {}
+        self.order = []
+
+    # @before name of the pass before which it runs, by default it runs
+    #   last.
+    def add(self, name, function, before = None):
+        if name in self.names():
+            raise TypeError("duplicate pass: " + name)
+
+        if before is None:
+            self.passes.append((name, function))
+        elif before in self.names():
+            self.passes.insert(self.names().index(before), (name, function))
+        else:
+            raise TypeError("unknown pass: " + before)
+
+        return self
+
+    def remove(self, name):
+        if name not in self.names():
+            raise TypeError("unknown pass: " + name)
+
+        self.passes = [(passName, function) for passName, function in self.passes if passName != name]
+        return self
+
+    def names(self):
+        return [name for name, function in self.passes]
+
+    # Runs all passes on 'target'.
+    def run(self, target):
+        for name, function in self.passes:
+            self.results[name] = self.timed(name, function, target)
+
+        return self.results
+
+    # Calls 'function' with 'args' and adds the time to 'name'.
+    def timed(self, name, function, *args):
+        start = time.perf_counter()
+
+        try:
+            return function(*args)
+        finally:
+            self.addTime(name, time.perf_counter() - start)
+
+    def addTime(self, name, seconds):
+        if name not in self.timings:
+            self.timings[name] = [0.0, 0]
+            self.order.append(name)
+
+        timing = self.timings[name]
+        timing[0] += seconds
+        timing[1] += 1
+
+    def totalTime(self):
+        return sum(timing[0] for timing in self.timings.values())
+
+    # One line per pass: name, milliseconds and number of runs.
+    def report(self):
+        width = max([len(name) for name in self.order] + [0])
+        lines = []
+
+        for name in self.order:
+            seconds, runs = self.timings[name]
+            lines.append(name.ljust(width) + " " + ("%9.3f" % (seconds * 1000)) + " ms" +
+                         (" (" + str(runs) + " runs)" if runs != 1 else ""))
+
+        return "\n".join(lines)
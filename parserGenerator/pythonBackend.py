@@ -0,0 +1,383 @@
+import keyword
+import sys
+import types
+
+from parserGenerator.generator import CodeGenerator
+from parserGenerator.runtime import pythonRegex
+
+# Python names must not be keywords, hence a trailing underscore is
+# added to them (like 'or_' in the runtime).
+def pythonName(name):
+    return name + "_" if keyword.iskeyword(name) else name
+
+# Creates python modules that only depend on parserGenerator.runtime.
+# Types are ignored. Java allows fields, parsers and functions of the same
+# name, therefore fields are class attributes with a leading underscore
+# and functions get a trailing underscore.
+class PythonCodeGenerator(CodeGenerator):
+    language = "python"
+
+    trueLiteral = "True"
+    falseLiteral = "False"
+    nullLiteral = "None"
+
+    writerStateNames = CodeGenerator.writerStateNames + ("blockIsEmpty",)
+
+    def __init__(self, sink = None, **options):
+        CodeGenerator.__init__(self, sink, **options)
+        # python does not allow blocks without statements.
+        self.blockIsEmpty = False
+        # variables of open switch blocks and whether they have a case.
+        self.switches = []
+        # (name, init) of the fields that are set in __init__
+        self.instanceFields = []
+
+    def writeLine(self, line, isBlockStart = False, isBlockEnd = False):
+        CodeGenerator.writeLine(self, line, isBlockStart, isBlockEnd)
+
+        if not line.lstrip().startswith("#"):
+            self.blockIsEmpty = False
+
+    def beginBlock(self, header):
+        self.writeLine(header + ":", True, False)
+        self.indent += 1
+        self.blockJustStarted = True
+        self.blockIsEmpty = True
+
+    def writeElse(self):
+        self.continueBlock("else")
+
+    # Closes the current block and opens a block that belongs to the same
+    # statement, like 'else' or 'elif'.
+    def continueBlock(self, header):
+        if self.blockIsEmpty:
+            self.writeLine("pass")
+
+        self.indent -= 1
+        self.writeLine(header + ":", False, True)
+        self.indent += 1
+        self.blockJustStarted = True
+        self.blockIsEmpty = True
+
+    def writeEndBlock(self):
+        if self.blockIsEmpty:
+            self.writeLine("pass")
+
+        self.indent -= 1
+
+        if self.indent == 1:
+            self.varCount = 0
+
+        self.blockJustEnded = True
+
+        if self.indent == 0:
+            self.flush()
+
+    # Expressions
+
+    def notExpr(self, expr):
+        return "not " + expr
+
+    def andExpr(self, left, right):
+        return left + " and " + right
+
+    def isNull(self, var):
+        return var + " is None"
+
+    def notNull(self, var):
+        return var + " is not None"
+
+    def stringLiteral(self, text):
+        return repr(text)
+
+    def newObject(self, className, args = []):
+        return className + "(" + ", ".join(args) + ")"
+
+    def streamPosition(self, streamVar):
+        return streamVar + ".pos"
+
+    def arrayElement(self, var, index, type):
+        return var + "[" + str(index) + "]"
+
+    def intArray(self, values):
+        return "[" + ", ".join(str(value) for value in values) + "]"
+
+    def stringArray(self, literals):
+        return "[" + ", ".join(literals) + "]"
+
+    def stringTable(self, rows):
+        return "[" + ", ".join(self.stringArray(row) for row in rows) + "]"
+
+    def regexExpr(self, regex):
+        return pythonRegex(regex)
+
+    def fieldName(self, name):
+        return "_" + name
+
+    def fieldRef(self, name):
+        return "self._" + name
+
+    def methodRef(self, name):
+        return "self." + name
+
+    def parserName(self, name):
+        return pythonName(name)
+
+    def functionName(self, name):
+        return name + "_"
+
+    # Statements
+
+    def writeStatement(self, expr):
+        self.writeLine(expr)
+
+    def writeAssign(self, lv, rv):
+        self.writeLine(lv + " = " + rv)
+
+    # Variables need no declaration.
+    def writeLocal(self, type, name, init):
+        if init is not None:
+            self.writeLine(name + " = " + init)
+
+    def declareField(self, modifiers, type, name, init):
+        self.addLine(self.fieldName(name) + " = " + init)
+
+    # Fields that change while parsing are set in __init__ (see
+    # declareConstructor), so that each instance has its own.
+    def declareInstanceField(self, name, init):
+        self.instanceFields.append((name, init))
+
+    # Memo tables are runtime.MemoTables, entries are tuples (result, end
+    # position) or None.
+    def declareMemoTable(self, name, limit):
+        self.memoTables.append((name, limit))
+
+    def memoLookup(self, table, streamVar, start):
+        return self.fieldRef(table) + ".get(" + streamVar + ", " + start + ")"
+
+    def memoFound(self, table, entry):
+        return self.notNull(entry)
+
+    def memoEnd(self, table, entry):
+        return entry + "[1]"
+
+    def memoResult(self, table, entry, type):
+        return entry + "[0]"
+
+    def setStreamPosition(self, streamVar, position):
+        self.assign(streamVar + ".pos", position)
+
+    # Generated classes are modules '<packageName>.<className>'.
+    def importClass(self, className):
+        self.addLine("from " + self.packageName + "." + className + " import " + className)
+
+    def clockExpr(self):
+        return "profileClock()"
+
+    def writeComment(self, text):
+        self.writeLine("# " + text)
+
+    def writeReturn(self, value):
+        self.writeLine("return " + value)
+
+    def writeBreak(self):
+        self.writeLine("break")
+
+    def writeContinue(self):
+        self.writeLine("continue")
+
+    # Blocks
+
+    def writeIf(self, condition):
+        self.beginBlock("if " + condition)
+
+    def writeLoop(self):
+        self.beginBlock("while True")
+
+    # Switches are chains of 'if' and 'elif'.
+    def writeSwitch(self, var):
+        self.switches.append([var, False])
+
+    def writeCase(self, value):
+        switch = self.switches[-1]
+        condition = switch[0] + " == " + str(value)
+
+        if switch[1]:
+            self.continueBlock("elif " + condition)
+        else:
+            self.writeIf(condition)
+            switch[1] = True
+
+    def writeDefault(self):
+        self.continueBlock("else")
+
+    def writeEndCase(self, isReachable = True):
+        pass
+
+    def writeEndSwitch(self):
+        self.switches.pop()
+        self.writeEndBlock()
+
+    def writeMethodBlock(self, returnType, name, argTypes, argVars, modifiers):
+        self.beginBlock("def " + name + "(" + ", ".join(["self"] + [pythonName(v) for v in argVars]) + ")")
+
+    # Class structure
+
+    def beginClass(self, packageName, className, imports):
+        self.packageName = packageName
+        self.className = className
+
+        self.addLine("from parserGenerator.runtime import *\n")
+        self.beginBlock("class " + className)
+
+    # Statements in the class body are executed once, lexers are shared by
+    # all instances.
+    def declareInitializer(self, statements):
+        for statement in statements:
+            self.statement(statement)
+
+    # CharDispatch and MemoTable are part of the runtime.
+    def declareDispatchSupport(self):
+        pass
+
+    # The names are shared, each instance counts on its own.
+    def declareProfileSupport(self):
+        count = len(self.profileNames)
+        self.declareField("", "", "profileNames", self.stringArray([self.stringLiteral(name) for name in self.profileNames]))
+        self.declareInstanceField("profileCounts", "[0] * " + str(3 * count))
+        self.declareInstanceField("profileNanos", "[0] * " + str(count))
+
+        # name -> (calls, successes, failures, nanoseconds)
+        self.beginBlock("def profileSnapshot(self)")
+        self.addLine("counts = self._profileCounts")
+        self.addLine("return dict((name, (counts[3 * i], counts[3 * i + 1], counts[3 * i + 2], self._profileNanos[i]))")
+        self.addLine("            for i, name in enumerate(self._profileNames))")
+        self.endBlock()
+
+        self.beginBlock("def resetProfile(self)")
+        self.addLine("self._profileCounts[:] = [0] * len(self._profileCounts)")
+        self.addLine("self._profileNanos[:] = [0] * len(self._profileNanos)")
+        self.endBlock()
+
+    def declareMemoSupport(self):
+        self.beginBlock("def clearMemo(self)")
+
+        for table, limit in self.memoTables:
+            self.statement(self.fieldRef(table) + ".clear()")
+
+        self.endBlock()
+
+    def declareConstructor(self):
+        fields = [(table, self.newObject("MemoTable", [str(limit)])) for table, limit in self.memoTables]
+        fields += self.instanceFields
+
+        if not fields:
+            return
+
+        self.beginBlock("def __init__(self)")
+
+        for name, init in fields:
+            self.addLine(self.fieldRef(name) + " = " + init)
+
+        self.endBlock()
+
+    def declareErrorHandler(self):
+        if self.options["errorSites"]:
+            self.beginBlock("def parsingError(self, stream, site)")
+            self.addLine("raise self._parseError.record(site, stream)")
+            self.endBlock()
+            self.declareErrorSiteSupport()
+            return
+
+        if self.options["release"]:
+            self.beginBlock("def parsingError(self, stream, code)")
+            self.addLine("raise ParseError(\"Expected \" + self._expectations[code] + \" at \" + str(stream))")
+        else:
+            self.beginBlock("def parsingError(self, stream, expected)")
+            self.addLine("raise ParseError(\"Expected \" + expected + \" at \" + str(stream))")
+
+        self.endBlock()
+
+    # The ParseError is runtime.ParseError with the tables of the class.
+    # Each instance has its own.
+    def declareErrorSiteSupport(self):
+        self.declareField("", "", "errorLabels",
+                          self.stringArray([self.stringLiteral(label) for label, tokens in self.errorSites]))
+        self.declareField("", "", "errorTokens",
+                          self.stringTable([[self.stringLiteral(name) for name in tokens]
+                                            for label, tokens in self.errorSites]))
+        self.declareInstanceField("parseError", "ParseError(None, self._errorLabels, self._errorTokens)")
+
+        self.beginBlock("def parseError(self)")
+        self.addLine("return self._parseError")
+        self.endBlock()
+
+    def objectArray(self, values):
+        return "[" + ", ".join(values) + "]"
+
+    # The driver is runtime.ParseTables, actions are lambdas that it calls
+    # with the parser, the stream and the arguments.
+    def declareTables(self):
+        self.declareTableFields()
+        self.declareField("", "", "tableTokens",
+                          "[" + ", ".join(self.fieldName(token.name) for token in self.tables.tokens) + "]")
+
+        self.addLine(self.fieldName("tableActions") + " = [")
+
+        for unit in self.tables.actions:
+            args = ["arg" + str(i) for i in range(len(unit.inputTypes))]
+            self.addLine("    lambda " + ", ".join(["self", "stream"] + args) + ": " + unit.call(self, args, "stream") + ",")
+
+        self.addLine("]")
+        self.declareField("", "", "tables", "ParseTables(" + ", ".join(self.fieldName(name) for name in
+            ("tableNodes", "tableChildren", "tableSites", "tableEntries", "tableArities", "tableErrors",
+             "tableTokens", "tableActions")) + ")")
+
+        self.beginBlock("def runTables(self, start, stream, values)")
+        self.addLine("return self._tables.run(self, start, stream, values)")
+        self.endBlock()
+
+    # ParseErrors of other classes pass through.
+    def declareRecovery(self, unit, call, inputVars, streamVar):
+        sync = self.fieldRef(unit.sync.name) + ".recognizeToken(" + streamVar + ")"
+        peek = self.fieldRef(unit.sync.lexer.name) + ".peekChar(" + streamVar + ")"
+
+        self.writeLine("start = " + self.streamPosition(streamVar))
+        self.beginBlock("try")
+        self.writeReturn(call)
+        self.continueBlock("except ParseError as e")
+        self.beginBlock("if e is not self._parseError")
+        self.addLine("raise")
+        self.endBlock()
+        self.beginBlock("while not " + sync + " and " + peek + " != -1")
+        self.writeLine(streamVar + ".pos += 1")
+        self.endBlock()
+        self.beginBlock("if " + self.streamPosition(streamVar) + " == start")
+        self.addLine("raise")
+        self.endBlock()
+        self.addLine("self._parseError.collect()")
+        self.writeRecovered(unit, inputVars)
+        self.endBlock()
+
+    # Executes the generated code and returns the class. Requires a ListSink.
+    def load(self):
+        return loadClass(self.getvalue(), self.packageName, self.className)
+
+# Executes 'source' as module '<packageName>.<className>' and returns the
+# class. The module is registered in sys.modules so that other generated
+# classes can import it.
+def loadClass(source, packageName, className):
+    if packageName not in sys.modules:
+        package = types.ModuleType(packageName)
+        package.__path__ = []
+        sys.modules[packageName] = package
+
+    moduleName = packageName + "." + className
+    module = types.ModuleType(moduleName)
+    module.__file__ = "<" + moduleName + ">"
+    sys.modules[moduleName] = module
+
+    exec(compile(source, module.__file__, "exec"), module.__dict__)
+
+    setattr(sys.modules[packageName], className, module)
+    return getattr(module, className)
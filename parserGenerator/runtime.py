@@ -0,0 +1,919 @@
+# Runtime for parsers that are created by PythonCodeGenerator. It mirrors
+# the parts of 'at.searles.parsing' that are used by the generated Java code.
+
+import array
+import bisect
+import re
+import time
+
+# Raised by generated parsers. Classes generated with the option
+# 'errorSites' create one ParseError with the tables of their error sites
+# and raise it for every error, they only record the site and the position
+# (see 'record'). The message is created when it is needed.
+class ParseError(ValueError):
+    # @labels, tokens expectation and expected token names of each site.
+    def __init__(self, message = None, labels = None, tokens = None):
+        ValueError.__init__(self, message)
+        self.labels = labels
+        self.tokens = tokens
+        # the last error
+        self.site = -1
+        self.position = 0
+        self.stream = None
+        # (site, position) of the errors that recovery points collected in
+        # 'stream'.
+        self.errors = []
+
+    # Returns this error after it recorded an error at 'site'. Collected
+    # errors of another stream are dropped. The traceback of the previous
+    # raise is dropped too, otherwise every raise would extend it.
+    def record(self, site, stream):
+        if stream is not self.stream:
+            del self.errors[:]
+
+        self.site = site
+        self.position = stream.pos
+        self.stream = stream
+        return self.with_traceback(None)
+
+    # Adds the last error to 'errors', called by recovery points.
+    def collect(self):
+        self.errors.append((self.site, self.position))
+
+    def clear(self):
+        self.site = -1
+        self.stream = None
+        del self.errors[:]
+
+    def expected(self):
+        return self.labels[self.site]
+
+    def expectedTokens(self):
+        return self.tokens[self.site]
+
+    def errorCount(self):
+        return len(self.errors)
+
+    # Message of the collected error 'i'.
+    def message(self, i):
+        site, position = self.errors[i]
+        return self.siteMessage(site, position)
+
+    def siteMessage(self, site, position):
+        text = "Expected " + self.labels[site]
+
+        if self.tokens[site]:
+            text += " (one of " + ", ".join(self.tokens[site]) + ")"
+
+        line, column = self.stream.lineColumn(position)
+        return text + " at " + str(line) + ":" + str(column)
+
+    def __str__(self):
+        if self.labels is None or self.site < 0:
+            return ValueError.__str__(self)
+
+        return self.siteMessage(self.site, self.position)
+
+# Clock of the profile counters (option 'profile') in nanoseconds.
+def profileClock():
+    return int(time.perf_counter() * 1000000000)
+
+################################################################################
+## Regular expressions #########################################################
+################################################################################
+
+# Token definitions are java expressions, the runtime has the same methods
+# except for 'or' which is a keyword.
+def pythonRegex(expression):
+    return re.sub(r"\.or\(", ".or_(", expression)
+
+# Evaluates the java expression of a token definition, eg
+# "CharSet.interval('0', '9')".
+def evalRegex(expression):
+    return toRegex(eval(pythonRegex(expression)))
+
+# Converts strings to text regexes.
+def toRegex(regex):
+    if isinstance(regex, Regex):
+        return regex
+    elif isinstance(regex, str):
+        return RegexText(regex)
+    else:
+        raise TypeError("not a regex: " + repr(regex))
+
+class Regex:
+    @staticmethod
+    def text(text):
+        return RegexText(text)
+
+    def then(self, other):
+        return RegexThen(self, toRegex(other))
+
+    # 'or' is a keyword in python.
+    def or_(self, other):
+        return RegexOr(self, toRegex(other))
+
+    # @max None for no upper bound.
+    def range(self, min, max):
+        return RegexRange(self, min, max)
+
+    def rep(self):
+        return self.range(0, None)
+
+    def plus(self):
+        return self.range(1, None)
+
+    def opt(self):
+        return self.range(0, 1)
+
+    def count(self, count):
+        return self.range(count, count)
+
+    def min(self, min):
+        return self.range(min, None)
+
+    # The regex stops at the first match instead of the longest one.
+    def nonGreedy(self):
+        return RegexNonGreedy(self)
+
+    # Returns the source of an equivalent pattern for the re-module.
+    def toPattern(self):
+        raise NotImplementedError()
+
+    # True if the regex matches the empty string.
+    def isNullable(self):
+        raise NotImplementedError()
+
+    # Returns the CharSet of all characters that a non-empty match can start
+    # with.
+    def firstChars(self):
+        raise NotImplementedError()
+
+    # True if the regex matches at most one string at each position.
+    def hasSingleMatch(self):
+        return False
+
+    # True if the match of the re-module is always the longest one. Then
+    # tokens need no DFA to find it, see Token.matchEnd.
+    def firstMatchIsLongest(self):
+        return self.hasSingleMatch()
+
+    def __str__(self):
+        return self.toPattern()
+
+class RegexText(Regex):
+    def __init__(self, text):
+        self.string = text
+
+    def toPattern(self):
+        return re.escape(self.string)
+
+    def isNullable(self):
+        return not self.string
+
+    def firstChars(self):
+        return CharSet.chars(self.string[0]) if self.string else CharSet.empty()
+
+    def hasSingleMatch(self):
+        return True
+
+class RegexThen(Regex):
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    def toPattern(self):
+        return "(?:" + self.first.toPattern() + ")(?:" + self.second.toPattern() + ")"
+
+    def isNullable(self):
+        return self.first.isNullable() and self.second.isNullable()
+
+    def firstChars(self):
+        if self.first.isNullable():
+            return self.first.firstChars().union(self.second.firstChars())
+
+        return self.first.firstChars()
+
+    def hasSingleMatch(self):
+        return self.first.hasSingleMatch() and self.second.hasSingleMatch()
+
+    def firstMatchIsLongest(self):
+        return self.first.hasSingleMatch() and self.second.firstMatchIsLongest()
+
+class RegexOr(Regex):
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    def toPattern(self):
+        return "(?:" + self.first.toPattern() + "|" + self.second.toPattern() + ")"
+
+    def isNullable(self):
+        return self.first.isNullable() or self.second.isNullable()
+
+    def firstChars(self):
+        return self.first.firstChars().union(self.second.firstChars())
+
+    # True if at most one alternative can match at a position.
+    def isDisjoint(self):
+        return not self.first.isNullable() and not self.second.isNullable() and \
+            not self.first.firstChars().intersects(self.second.firstChars())
+
+    def hasSingleMatch(self):
+        return self.isDisjoint() and self.first.hasSingleMatch() and self.second.hasSingleMatch()
+
+    def firstMatchIsLongest(self):
+        return self.isDisjoint() and self.first.firstMatchIsLongest() and self.second.firstMatchIsLongest()
+
+class RegexRange(Regex):
+    def __init__(self, child, min, max):
+        if min < 0 or max is not None and max < min:
+            raise ValueError("bad range: " + str(min) + ", " + str(max))
+
+        self.child = child
+        self.min = min
+        self.max = max
+
+    def quantifier(self):
+        return "{" + str(self.min) + "," + ("" if self.max is None else str(self.max)) + "}"
+
+    def toPattern(self):
+        return "(?:" + self.child.toPattern() + ")" + self.quantifier()
+
+    def isNullable(self):
+        return self.min == 0 or self.child.isNullable()
+
+    def firstChars(self):
+        return self.child.firstChars() if self.max != 0 else CharSet.empty()
+
+    # greedy repetitions of a single match take as many as possible.
+    def firstMatchIsLongest(self):
+        return self.child.hasSingleMatch()
+
+class RegexNonGreedy(Regex):
+    def __init__(self, child):
+        self.child = child
+
+    def toPattern(self):
+        if isinstance(self.child, RegexRange):
+            return "(?:" + self.child.child.toPattern() + ")" + self.child.quantifier() + "?"
+
+        return self.child.toPattern()
+
+    def isNullable(self):
+        return self.child.isNullable()
+
+    def firstChars(self):
+        return self.child.firstChars()
+
+MAX_CHAR = 0x10ffff
+
+def codePoint(ch):
+    return ch if isinstance(ch, int) else ord(ch)
+
+# Merges two arrays of boundaries (see CharSet). 'contains' tells whether a
+# character belongs to the result if it is in the first and/or in the
+# second set.
+def merge(first, second, contains):
+    bounds = array.array("I")
+    i = j = 0
+    inFirst = inSecond = inResult = False
+
+    while i < len(first) or j < len(second):
+        if j == len(second) or i < len(first) and first[i] <= second[j]:
+            bound = first[i]
+        else:
+            bound = second[j]
+
+        if i < len(first) and first[i] == bound:
+            inFirst = not inFirst
+            i += 1
+
+        if j < len(second) and second[j] == bound:
+            inSecond = not inSecond
+            j += 1
+
+        if contains(inFirst, inSecond) != inResult:
+            inResult = not inResult
+            bounds.append(bound)
+
+    return bounds
+
+# Set of characters, stored as a sorted array of boundaries: the set
+# contains the characters from bounds[0] to bounds[1] - 1, from bounds[2] to
+# bounds[3] - 1 and so on. Set operations merge the arrays in linear time.
+class CharSet(Regex):
+    # @bounds normalized boundaries, ie strictly increasing and of even length.
+    def __init__(self, bounds):
+        self.bounds = bounds if isinstance(bounds, array.array) else array.array("I", bounds)
+        # bit i is set if character i < 128 is contained.
+        self.ascii = 0
+
+        for i in range(0, len(self.bounds), 2):
+            if self.bounds[i] >= 128:
+                break
+
+            self.ascii |= ((1 << (min(self.bounds[i + 1], 128) - self.bounds[i])) - 1) << self.bounds[i]
+
+    @staticmethod
+    def chars(*chars):
+        return CharSet.fromIntervals([(codePoint(ch), codePoint(ch)) for ch in chars])
+
+    @staticmethod
+    def interval(start, end):
+        return CharSet.fromIntervals([(codePoint(start), codePoint(end))])
+
+    @staticmethod
+    def all():
+        return CharSet([0, MAX_CHAR + 1])
+
+    @staticmethod
+    def empty():
+        return CharSet([])
+
+    # Normalizes arbitrary intervals (start, end), both inclusive.
+    @staticmethod
+    def fromIntervals(intervals):
+        bounds = array.array("I")
+
+        for start, end in sorted(intervals):
+            if start > end:
+                continue
+
+            if bounds and start <= bounds[-1]:
+                if end >= bounds[-1]:
+                    bounds[-1] = end + 1
+            else:
+                bounds.append(start)
+                bounds.append(end + 1)
+
+        return CharSet(bounds)
+
+    # Sorted list of disjoint intervals (start, end), both inclusive.
+    @property
+    def intervals(self):
+        return [(self.bounds[i], self.bounds[i + 1] - 1) for i in range(0, len(self.bounds), 2)]
+
+    def contains(self, ch):
+        ch = codePoint(ch)
+
+        if ch < 128:
+            return (self.ascii >> ch) & 1 == 1
+
+        return bisect.bisect_right(self.bounds, ch) & 1 == 1
+
+    def union(self, other):
+        return CharSet(merge(self.bounds, other.bounds, lambda inSelf, inOther: inSelf or inOther))
+
+    def intersect(self, other):
+        return CharSet(merge(self.bounds, other.bounds, lambda inSelf, inOther: inSelf and inOther))
+
+    def minus(self, other):
+        return CharSet(merge(self.bounds, other.bounds, lambda inSelf, inOther: inSelf and not inOther))
+
+    # True if both sets have a character in common.
+    def intersects(self, other):
+        i = j = 0
+
+        while i < len(self.bounds) and j < len(other.bounds):
+            if self.bounds[i + 1] <= other.bounds[j]:
+                i += 2
+            elif other.bounds[j + 1] <= self.bounds[i]:
+                j += 2
+            else:
+                return True
+
+        return False
+
+    def invert(self):
+        bounds = array.array("I")
+
+        if not self.bounds or self.bounds[0] != 0:
+            bounds.append(0)
+
+        bounds.extend(self.bounds[1:] if self.bounds and self.bounds[0] == 0 else self.bounds)
+
+        if bounds and bounds[-1] == MAX_CHAR + 1:
+            bounds.pop()
+        else:
+            bounds.append(MAX_CHAR + 1)
+
+        return CharSet(bounds)
+
+    def or_(self, other):
+        if isinstance(other, CharSet):
+            return self.union(other)
+
+        return Regex.or_(self, other)
+
+    def toPattern(self):
+        if not self.bounds:
+            return "(?!)"
+
+        ranges = []
+
+        for start, end in self.intervals:
+            if start == end:
+                ranges.append("\\U%08x" % start)
+            else:
+                ranges.append("\\U%08x-\\U%08x" % (start, end))
+
+        return "[" + "".join(ranges) + "]"
+
+    def __eq__(self, other):
+        return isinstance(other, CharSet) and self.bounds == other.bounds
+
+    def __hash__(self):
+        return hash(self.bounds.tobytes())
+
+    def isNullable(self):
+        return False
+
+    def firstChars(self):
+        return self
+
+    def hasSingleMatch(self):
+        return True
+
+################################################################################
+## Lexer #######################################################################
+################################################################################
+
+class TokStream:
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        # matches of each lexer at the last position:
+        # lexer -> (pos, start after hidden tokens, {token: end})
+        self.matches = {}
+        # positions of the newlines, see lineColumn
+        self.newlines = None
+
+    # Returns line and column of 'pos', both starting at 1. The newlines
+    # are found when it is called the first time.
+    def lineColumn(self, pos):
+        if self.newlines is None:
+            self.newlines = array.array("l")
+            index = self.text.find("\n")
+
+            while index >= 0:
+                self.newlines.append(index)
+                index = self.text.find("\n", index + 1)
+
+        line = bisect.bisect_left(self.newlines, pos)
+        column = pos - self.newlines[line - 1] if line > 0 else pos + 1
+        return line + 1, column
+
+    def __str__(self):
+        line, column = self.lineColumn(self.pos)
+        return str(line) + ":" + str(column) + " (" + repr(self.text[self.pos:self.pos + 16]) + ")"
+
+class Token:
+    def __init__(self, lexer, id, regex, isHidden):
+        self.lexer = lexer
+        self.id = id
+        self.regex = regex
+        self.isHidden = isHidden
+        self.pattern = None
+        # see Regex.firstMatchIsLongest, set by 'compiled'.
+        self.firstIsLongest = False
+        # None until the first match that needs it, see matchEnd.
+        self.dfa = None
+
+    def compiled(self):
+        if self.pattern is None:
+            self.pattern = re.compile(self.regex.toPattern(), re.DOTALL)
+            self.firstIsLongest = self.regex.firstMatchIsLongest()
+
+        return self.pattern
+
+    # Returns the end of the longest non-empty match at 'pos' or -1. The
+    # re-module returns the first alternative that matches (eg 'a' for
+    # 'a|ab' in "ab"), hence it only tells whether there is a match and the
+    # DFA of this token finds its end, like the Java lexer does.
+    def matchEnd(self, text, pos):
+        m = self.compiled().match(text, pos)
+
+        if m is None:
+            return -1
+
+        if self.firstIsLongest:
+            return m.end() if m.end() > pos else -1
+
+        if self.dfa is None:
+            from parserGenerator.dfa import compileDfa
+            self.dfa = compileDfa([self.regex])
+
+        return self.dfa.match(text, pos).get(0, -1)
+
+    # Consumes this token if it is next in the stream.
+    def recognizeToken(self, stream):
+        start, end = self.lexer.find(stream, self)
+
+        if end >= 0:
+            stream.pos = end
+            return True
+
+        return False
+
+    # Returns whether this token follows without consuming it.
+    def isNext(self, stream):
+        return self.lexer.find(stream, self)[1] >= 0
+
+    # Like recognizeToken but returns the consumed text or None.
+    def parseToken(self, stream):
+        start, end = self.lexer.find(stream, self)
+
+        if end >= 0:
+            stream.pos = end
+            return stream.text[start:end]
+
+        return None
+
+# Tokens are matched on demand: A parser asks whether a certain token
+# follows (after skipping hidden tokens), so tokens of the same lexer may
+# overlap and the grammar decides which one applies. Matches are cached
+# for the current position of the stream.
+class Lexer:
+    def __init__(self):
+        self.tokens = []
+        self.hiddenTokens = []
+        self.dfa = None
+
+    def token(self, regex):
+        return self.add(regex, False)
+
+    # Hidden tokens are skipped, eg white spaces.
+    def hiddenToken(self, regex):
+        return self.add(regex, True)
+
+    def add(self, regex, isHidden):
+        token = Token(self, len(self.tokens), toRegex(regex), isHidden)
+        self.tokens.append(token)
+
+        if isHidden:
+            self.hiddenTokens.append(token)
+
+        return token
+
+    # Afterwards, all tokens are matched at once by 'dfa' which must be
+    # compiled from the regexes of the tokens in the order in which they
+    # were added.
+    def setDfa(self, dfa):
+        self.dfa = dfa
+
+    # Returns (start, end) of the longest match of 'token' at the current
+    # position after skipping hidden tokens. 'end' is -1 if there is no
+    # non-empty match.
+    def find(self, stream, token):
+        cached = self.cached(stream)
+        start = cached[1]
+        ends = cached[2]
+        end = ends.get(token.id)
+
+        if end is None:
+            if self.dfa is not None:
+                # the dfa found all matches.
+                return start, -1
+
+            end = token.matchEnd(stream.text, start)
+            ends[token.id] = end
+
+        return start, end
+
+    # Consumes the longest token that follows and returns (token, text) or
+    # None. If several tokens match, the one that was added first wins.
+    def nextToken(self, stream):
+        start = self.cached(stream)[1]
+        best = None
+        bestEnd = start
+
+        for token in self.tokens:
+            if not token.isHidden:
+                end = self.find(stream, token)[1]
+
+                if end > bestEnd:
+                    best = token
+                    bestEnd = end
+
+        if best is None:
+            return None
+
+        stream.pos = bestEnd
+        return best, stream.text[start:bestEnd]
+
+    # Returns the code point of the next character after hidden tokens or
+    # -1 at the end of the stream. Parsers use it to select an alternative,
+    # see CharDispatch.
+    def peekChar(self, stream):
+        start = self.cached(stream)[1]
+        return ord(stream.text[start]) if start < len(stream.text) else -1
+
+    # Returns the cached matches at the current position of the stream.
+    def cached(self, stream):
+        cached = stream.matches.get(self)
+
+        if cached is None or cached[0] != stream.pos:
+            if self.dfa is not None:
+                start, ends = self.skipHiddenDfa(stream.text, stream.pos)
+            else:
+                start, ends = self.skipHidden(stream.text, stream.pos), {}
+
+            cached = (stream.pos, start, ends)
+            stream.matches[self] = cached
+
+        return cached
+
+    # Returns the position after the hidden tokens at 'pos' and the matches
+    # of all tokens there.
+    def skipHiddenDfa(self, text, pos):
+        while True:
+            ends = self.dfa.match(text, pos)
+            end = pos
+
+            for token in self.hiddenTokens:
+                end = max(end, ends.get(token.id, -1))
+
+            if end == pos:
+                return pos, ends
+
+            pos = end
+
+    # Returns the position after the hidden tokens at 'pos'.
+    def skipHidden(self, text, pos):
+        if self.dfa is not None:
+            return self.skipHiddenDfa(text, pos)[0]
+
+        while True:
+            end = pos
+
+            for token in self.hiddenTokens:
+                end = max(end, token.matchEnd(text, pos))
+
+            if end == pos:
+                return pos
+
+            pos = end
+
+    # True if only hidden tokens remain in the stream.
+    def atEnd(self, stream):
+        return self.skipHidden(stream.text, stream.pos) == len(stream.text)
+
+# Maps characters to the index of the alternative that starts with them
+# (or -1). Characters below 128 are looked up in an array, others by a
+# binary search.
+class CharDispatch:
+    # @table flat list 'start, end, index' of sorted, disjoint intervals.
+    def __init__(self, table):
+        self.starts = table[0::3]
+        self.ends = table[1::3]
+        self.indices = table[2::3]
+        self.ascii = [-1] * 128
+
+        for start, end, index in zip(self.starts, self.ends, self.indices):
+            for ch in range(start, min(end + 1, 128)):
+                self.ascii[ch] = index
+
+    def lookup(self, ch):
+        if 0 <= ch < 128:
+            return self.ascii[ch]
+
+        i = bisect.bisect_right(self.starts, ch) - 1
+
+        if i >= 0 and ch <= self.ends[i]:
+            return self.indices[i]
+
+        return -1
+
+# Matches all tokens of a lexer in a single pass. Tables:
+# @bounds sorted starts of character intervals, the first one is 0.
+# @classes character class of each interval, -1 if no token contains it.
+# @transitions next state for each state and class (state * classCount +
+#   class), -1 if there is none. State 0 is the start state.
+# @acceptOffsets tokens that match up to state s are
+#   acceptTokens[acceptOffsets[s]:acceptOffsets[s + 1]].
+# @shortest ids of tokens that use their shortest match (non-greedy).
+class Dfa:
+    def __init__(self, bounds, classes, transitions, acceptOffsets, acceptTokens, shortest):
+        self.bounds = bounds
+        self.classes = classes
+        self.transitions = transitions
+        self.acceptOffsets = acceptOffsets
+        self.acceptTokens = acceptTokens
+        self.shortest = shortest
+        self.classCount = max(classes) + 1 if classes else 0
+        self.ascii = [self.searchClass(ch) for ch in range(128)]
+        self.shortestSet = frozenset(shortest)
+
+    # Arguments for the constructor.
+    def tables(self):
+        return [self.bounds, self.classes, self.transitions, self.acceptOffsets, self.acceptTokens, self.shortest]
+
+    def charClass(self, ch):
+        if ch < 128:
+            return self.ascii[ch]
+
+        return self.searchClass(ch)
+
+    def searchClass(self, ch):
+        return self.classes[bisect.bisect_right(self.bounds, ch) - 1]
+
+    # Returns a dict token id -> end of its longest non-empty match at
+    # 'start'.
+    def match(self, text, start):
+        ends = {}
+        state = 0
+        pos = start
+        length = len(text)
+
+        while pos < length:
+            charClass = self.charClass(ord(text[pos]))
+
+            if charClass < 0:
+                break
+
+            state = self.transitions[state * self.classCount + charClass]
+
+            if state < 0:
+                break
+
+            pos += 1
+
+            for i in range(self.acceptOffsets[state], self.acceptOffsets[state + 1]):
+                token = self.acceptTokens[i]
+
+                if token not in self.shortestSet or token not in ends:
+                    ends[token] = pos
+
+        return ends
+
+    # Returns (token id, end) of the longest match at 'start' or None. Of
+    # tokens with equally long matches, the lowest id wins.
+    def longestMatch(self, text, start):
+        best = None
+
+        for token, end in self.match(text, start).items():
+            if best is None or end > best[1] or end == best[1] and token < best[0]:
+                best = (token, end)
+
+        return best
+
+################################################################################
+## Memoization #################################################################
+################################################################################
+
+# Table of a memoized parser: start position -> (result, end position).
+# It belongs to one stream and is reset if a different stream is passed.
+class MemoTable:
+    # @limit if positive, the table is cleared when it is full.
+    def __init__(self, limit):
+        self.limit = limit
+        self.stream = None
+        self.entries = {}
+
+    def get(self, stream, start):
+        if self.stream is not stream:
+            self.entries = {}
+            self.stream = stream
+
+        return self.entries.get(start)
+
+    def put(self, start, result, end):
+        if 0 < self.limit <= len(self.entries):
+            self.entries = {}
+
+        self.entries[start] = (result, end)
+
+    def clear(self):
+        self.entries = {}
+        self.stream = None
+
+################################################################################
+## Parse tables ################################################################
+################################################################################
+
+# Kinds of the nodes of ParseTables, see tables.py.
+TOKEN, TOKEN_PARSER, ACTION, PARSER, SEQUENCE, CHOICE, REP, OPT, PASS = range(9)
+
+# Tables of a class that PythonCodeGenerator created with the option
+# 'tables'. The methods of its parsers call 'run'.
+# @arities argument count, return count and 1 for parsers of each action.
+# @actions functions (parser, stream, *arguments) that call the actions.
+class ParseTables:
+    def __init__(self, nodes, children, sites, entries, arities, errors, tokens, actions):
+        self.nodes = nodes
+        self.children = children
+        self.sites = sites
+        self.entries = entries
+        self.arities = arities
+        self.errors = errors
+        self.tokens = tokens
+        self.actions = actions
+
+    # Runs node 'start' on 'values' (a list of the arguments) and returns
+    # the values that are left or None if it failed. 'frames' contains the
+    # node and the state of each unit that did not return: the next child
+    # of sequences, the next entry of choices and whether Reps and Opts ran
+    # their child. 'ok' is the result of the unit that returned last.
+    def run(self, parser, start, stream, values):
+        nodes = self.nodes
+        entries = self.entries
+        tokens = self.tokens
+        frames = [start, 0]
+        ok = True
+
+        while frames:
+            node = frames[-2]
+            state = frames[-1]
+            kind = nodes[4 * node]
+            a = nodes[4 * node + 1]
+
+            if kind == SEQUENCE:
+                if state > 0 and not ok:
+                    if state == 1:
+                        del frames[-2:]
+                        continue
+
+                    parser.parsingError(stream, self.errors[self.sites[a + state - 1]])
+
+                if state == nodes[4 * node + 2]:
+                    del frames[-2:]
+                else:
+                    frames[-1] = state + 1
+                    frames += (self.children[a + state], 0)
+            elif kind == CHOICE:
+                if state > 0 and ok:
+                    # the alternative that was tried succeeded.
+                    del frames[-2:]
+                    continue
+
+                for i in range(2 * (a + state), 2 * (a + nodes[4 * node + 2]), 2):
+                    token = entries[i]
+
+                    if token < 0:
+                        frames[-1] = i // 2 - a + 1
+                        frames += (entries[i + 1], 0)
+                        break
+                    elif tokens[token].isNext(stream):
+                        frames[-2:] = (entries[i + 1], 0)
+                        break
+                else:
+                    if nodes[4 * node + 3] >= 0:
+                        frames[-2:] = (nodes[4 * node + 3], 0)
+                    else:
+                        ok = False
+                        del frames[-2:]
+            elif kind == REP:
+                if state > 0 and not ok:
+                    ok = True
+                    del frames[-2:]
+                else:
+                    frames[-1] = 1
+                    frames += (a, 0)
+            elif kind == OPT:
+                if state > 0:
+                    ok = True
+                    del frames[-2:]
+                else:
+                    frames[-1] = 1
+                    frames += (a, 0)
+            elif kind == PARSER:
+                frames[-2:] = (a, 0)
+            elif kind == TOKEN:
+                ok = tokens[a].recognizeToken(stream)
+                del frames[-2:]
+            elif kind == TOKEN_PARSER:
+                text = tokens[a].parseToken(stream)
+                ok = text is not None
+
+                if ok:
+                    values.append(text)
+                    self.call(parser, stream, nodes[4 * node + 2], values)
+
+                del frames[-2:]
+            elif kind == ACTION:
+                ok = self.call(parser, stream, a, values)
+                del frames[-2:]
+            else:
+                ok = True
+                del frames[-2:]
+
+        return values if ok else None
+
+    # Calls 'action' with its arguments at the end of 'values' and replaces
+    # them by the return value. Parsers of other grammars may fail, then
+    # 'values' is not changed.
+    def call(self, parser, stream, action, values):
+        returnCount = self.arities[3 * action + 1]
+        split = len(values) - self.arities[3 * action]
+        result = self.actions[action](parser, stream, *values[split:])
+
+        if self.arities[3 * action + 2] and (result is None if returnCount else not result):
+            return False
+
+        del values[split:]
+
+        if returnCount:
+            values.append(result)
+
+        return True
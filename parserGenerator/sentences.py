@@ -0,0 +1,254 @@
+import random
+
+import parserGenerator.runtime as runtime
+
+from parserGenerator.analysis import children
+from parserGenerator.units import *
+
+# Creates random sentences of a grammar by walking its units: an Or picks
+# one of its alternatives, a Rep repeats its child a random number of times
+# and a token is replaced by a random text that its regex matches. Hidden
+# tokens (eg white spaces) are inserted between tokens from time to time.
+#
+# Parsers do not backtrack and lexers match tokens on demand, so a random
+# sentence is not necessarily accepted. Check the sentences with a parser
+# if this matters (like benchmarks/throughput.py).
+class SentenceGenerator:
+    # @parsers maps ExternFunctions (or their names) that are parsers to the
+    #   Parsers of the other grammars.
+    # @maxDepth number of nested parsers after which the shortest
+    #   alternative is chosen and repetitions stop.
+    # @meanRepeat mean number of iterations of a Rep.
+    # @hiddenProbability probability of a hidden token before a token.
+    def __init__(self, parsers = None, maxDepth = 12, meanRepeat = 2.0, hiddenProbability = 0.2, seed = None):
+        self.parsers = dict(parsers) if parsers else {}
+        self.maxDepth = maxDepth
+        self.meanRepeat = meanRepeat
+        self.hiddenProbability = hiddenProbability
+        self.random = random.Random(seed)
+        # unit -> minimum number of tokens in its sentences
+        self.minTokens = {}
+        # token -> runtime regex
+        self.regexes = {}
+        self.hiddenTokens = {}
+
+    # Returns a random sentence of 'unit' and the number of tokens in it.
+    def sentence(self, unit):
+        self.prepare(unit)
+        self.parts = []
+        self.tokenCount = 0
+        self.visit(unit, 0)
+        return "".join(self.parts), self.tokenCount
+
+    # Returns sentences until they contain at least 'size' characters. If
+    # 'accept' is given, only sentences for which it returns True are
+    # kept. Returns the list of sentences, the number of tokens in them and
+    # the number of sentences that were rejected.
+    def corpus(self, unit, size, accept = None, maxRejected = 1000):
+        sentences = []
+        tokens = 0
+        length = 0
+        rejected = 0
+
+        while length < size:
+            text, count = self.sentence(unit)
+
+            if accept is not None and not accept(text):
+                rejected += 1
+
+                if rejected > maxRejected and rejected > 10 * len(sentences):
+                    raise TypeError("too many rejected sentences of " + str(unit))
+
+                continue
+
+            sentences.append(text)
+            tokens += count
+            length += len(text)
+
+        return sentences, tokens, rejected
+
+    def target(self, unit):
+        if unit in self.parsers:
+            return self.parsers[unit]
+        if unit.name in self.parsers:
+            return self.parsers[unit.name]
+
+        raise TypeError("no parser for " + unit.name)
+
+    # Computes the minimum number of tokens of all reachable units with a
+    # fixpoint iteration.
+    def prepare(self, root):
+        units = []
+        visited = set()
+        stack = [root]
+
+        while stack:
+            unit = stack.pop()
+
+            if unit in visited or unit in self.minTokens:
+                continue
+
+            visited.add(unit)
+            units.append(unit)
+
+            if isinstance(unit, ExternFunction) and unit.isParserUnit:
+                stack.append(self.target(unit))
+            else:
+                stack.extend(children(unit))
+
+        infinity = float("inf")
+
+        for unit in units:
+            self.minTokens[unit] = infinity
+
+        changed = True
+
+        while changed:
+            changed = False
+
+            for unit in reversed(units):
+                value = self.evaluate(unit)
+
+                if value < self.minTokens[unit]:
+                    self.minTokens[unit] = value
+                    changed = True
+
+        for unit in units:
+            if self.minTokens[unit] == infinity:
+                raise TypeError("no finite sentence of " + str(unit))
+
+    def evaluate(self, unit):
+        if isinstance(unit, Parser):
+            return self.minTokens[unit.definition]
+        elif isinstance(unit, (Token, TokenParser)):
+            return 1
+        elif isinstance(unit, ExternFunction) and unit.isParserUnit:
+            return self.minTokens[self.target(unit)]
+        elif isinstance(unit, Recover):
+            return self.minTokens[unit.child]
+        elif isinstance(unit, (NamedUnit, Pass, Closure)):
+            return 0
+        elif isinstance(unit, Or):
+            return min(self.minTokens[element] for element in unit.elements)
+        elif isinstance(unit, Then):
+            return sum(self.minTokens[element] for element in unit.elements)
+        else:
+            raise TypeError("cannot create sentences of " + type(unit).__name__)
+
+    def visit(self, unit, depth):
+        if isinstance(unit, Parser):
+            self.visit(unit.definition, depth + 1)
+        elif isinstance(unit, Token):
+            self.addToken(unit)
+        elif isinstance(unit, TokenParser):
+            self.addToken(unit.token)
+        elif isinstance(unit, ExternFunction) and unit.isParserUnit:
+            self.visit(self.target(unit), depth + 1)
+        elif isinstance(unit, (NamedUnit, Pass)):
+            pass
+        elif isinstance(unit, Or):
+            alternatives = unit.alternatives()
+
+            if depth >= self.maxDepth:
+                alternative = min(alternatives, key = lambda alternative: self.minTokens[alternative])
+            else:
+                alternative = self.random.choice(alternatives)
+
+            self.visit(alternative, depth)
+        elif isinstance(unit, Then):
+            for element in unit.elements:
+                self.visit(element, depth)
+        elif isinstance(unit, Rep):
+            for i in range(self.repeatCount(depth)):
+                self.visit(unit.child, depth)
+        elif isinstance(unit, Opt):
+            if depth < self.maxDepth and self.random.random() < 0.5:
+                self.visit(unit.child, depth)
+        elif isinstance(unit, Recover):
+            # sentences contain no errors.
+            self.visit(unit.child, depth)
+        else:
+            raise TypeError("cannot create sentences of " + type(unit).__name__)
+
+    # Geometric distribution with mean 'meanRepeat'.
+    def repeatCount(self, depth):
+        if depth >= self.maxDepth:
+            return 0
+
+        count = 0
+        probability = self.meanRepeat / (self.meanRepeat + 1)
+
+        while self.random.random() < probability:
+            count += 1
+
+        return count
+
+    def addToken(self, token):
+        hiddenTokens = self.lexerHiddenTokens(token.lexer)
+
+        if hiddenTokens and self.random.random() < self.hiddenProbability:
+            self.parts.append(self.text(self.regex(self.random.choice(hiddenTokens))))
+
+        self.parts.append(self.text(self.regex(token)))
+        self.tokenCount += 1
+
+    def lexerHiddenTokens(self, lexer):
+        if lexer not in self.hiddenTokens:
+            self.hiddenTokens[lexer] = [token for token in lexer.tokens if not isinstance(token, Token)]
+
+        return self.hiddenTokens[lexer]
+
+    def regex(self, token):
+        if token not in self.regexes:
+            try:
+                self.regexes[token] = runtime.evalRegex(token.regex)
+            except (NameError, AttributeError, SyntaxError, TypeError):
+                raise TypeError("cannot create text for token " + token.name)
+
+        return self.regexes[token]
+
+    # Random text that 'regex' matches.
+    def text(self, regex):
+        if isinstance(regex, runtime.CharSet):
+            return chr(self.char(regex))
+        elif isinstance(regex, runtime.RegexText):
+            return regex.string
+        elif isinstance(regex, runtime.RegexThen):
+            return self.text(regex.first) + self.text(regex.second)
+        elif isinstance(regex, runtime.RegexOr):
+            return self.text(self.random.choice([regex.first, regex.second]))
+        elif isinstance(regex, runtime.RegexRange):
+            count = regex.min
+
+            if regex.max is None:
+                count += self.repeatCount(0)
+            else:
+                count = self.random.randint(regex.min, regex.max)
+
+            return "".join(self.text(regex.child) for i in range(count))
+        elif isinstance(regex, runtime.RegexNonGreedy):
+            return self.text(regex.child)
+        else:
+            raise TypeError("cannot create text for " + type(regex).__name__)
+
+    # Prefers letters and digits, then printable ASCII, so that large sets
+    # like CharSet.all() do not produce characters of other tokens.
+    def char(self, charSet):
+        for candidates in (alphanumeric, printable):
+            intervals = charSet.intersect(candidates).intervals
+
+            if intervals and (candidates is printable or self.random.random() < 0.9):
+                break
+        else:
+            intervals = charSet.minus(surrogates).intervals
+
+        if not intervals:
+            raise TypeError("cannot create text for an empty CharSet")
+
+        start, end = self.random.choice(intervals)
+        return self.random.randint(start, end)
+
+alphanumeric = runtime.CharSet.interval("a", "z").union(runtime.CharSet.interval("A", "Z")) \
+    .union(runtime.CharSet.interval("0", "9"))
+printable = runtime.CharSet.interval(" ", "~")
+surrogates = runtime.CharSet.interval(0xd800, 0xdfff)
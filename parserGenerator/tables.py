@@ -0,0 +1,187 @@
+from parserGenerator.analysis import reachableParsers
+from parserGenerator.hazards import HazardAnalysis, unitsOf
+from parserGenerator.runtime import TOKEN, TOKEN_PARSER, ACTION, PARSER, SEQUENCE, CHOICE, REP, OPT, PASS
+from parserGenerator.units import *
+
+# Compiles parsers into int tables for a driver with an explicit stack
+# (option 'tables'). The generated class has no method per unit, parsers
+# are entries into the tables, see CodeGenerator.declareTableEntry. Values
+# are kept on a stack: a unit takes its arguments from the top and pushes
+# its return values, like Unit.createCall does with variables.
+#
+# Each unit is a node of four ints in 'nodes': its kind and up to three
+# arguments.
+#
+# * TOKEN token: recognizes the token.
+# * TOKEN_PARSER token action: parses the token and calls the action with
+#   the text as last argument.
+# * ACTION action: calls the action. Parsers of other grammars are actions
+#   that can fail.
+# * PARSER node: continues with the node of the definition.
+# * SEQUENCE offset count: runs 'children[offset:offset + count]'. If the
+#   first child fails, the sequence fails, if another one fails,
+#   parsingError receives 'errors[sites[i]]'.
+# * CHOICE offset count default: 'entries[2 * offset:2 * (offset + count)]'
+#   are pairs of a token and a node. The node of the first token that
+#   follows is run. Token -1 means that the node is tried because its first
+#   tokens are unknown. If nothing matches, 'default' is run or the choice
+#   fails if it is -1.
+# * REP node, OPT node: like Rep and Opt.
+# * PASS: does nothing.
+#
+# Like the generated methods, parsers commit to an alternative once it
+# consumed a token, hence a choice can select the alternative from the
+# next token: it is the alternative that starts with a token that follows
+# or the first one that cannot fail (see HazardAnalysis.canFail). Tables
+# are only built for LL(1) choices, a TypeError is raised if alternatives
+# start with the same token (left factoring fixes some of them).
+
+class TableBuilder:
+    def __init__(self, code):
+        self.code = code
+        self.hazards = HazardAnalysis(code.analysis())
+        self.solvedParsers = set()
+        # unit -> index of its node
+        self.indices = {}
+        # units whose node must be filled in
+        self.pending = []
+        self.nodes = []
+        self.children = []
+        self.sites = []
+        self.entries = []
+        self.tokens = []
+        self.tokenIndices = {}
+        # units that are called by ACTION and TOKEN_PARSER nodes
+        self.actions = []
+        self.actionIndices = {}
+        # arguments of parsingError (see CodeGenerator.expected)
+        self.errors = []
+        self.errorIndices = {}
+
+    # Returns the node of 'unit' after all nodes that it reaches were
+    # filled in.
+    def build(self, unit):
+        self.solve(unit)
+        index = self.node(unit)
+
+        while self.pending:
+            self.fill(self.pending.pop())
+
+        return index
+
+    # Computes canFail of the units of the parsers that 'unit' reaches.
+    def solve(self, unit):
+        parsers = reachableParsers([unit], self.solvedParsers)
+
+        for parser in parsers:
+            self.code.prepare(parser)
+
+        self.solvedParsers.update(parsers)
+
+        units = [child for parser in parsers for child in unitsOf(parser)] + parsers
+
+        if not isinstance(unit, Parser):
+            units.append(unit)
+
+        self.hazards.solve(units)
+
+    def node(self, unit):
+        index = self.indices.get(unit)
+
+        if index is None:
+            index = len(self.nodes) // 4
+            self.indices[unit] = index
+            self.nodes.extend([PASS, 0, 0, 0])
+            self.pending.append(unit)
+
+        return index
+
+    def fill(self, unit):
+        index = self.indices[unit]
+
+        if isinstance(unit, Token):
+            node = [TOKEN, self.token(unit)]
+        elif isinstance(unit, TokenParser):
+            node = [TOKEN_PARSER, self.token(unit.token), self.action(unit.func)]
+        elif isinstance(unit, Parser):
+            node = [PARSER, self.node(unit.definition)]
+        elif isinstance(unit, (FuncUnit, Expr, ExternFunction)):
+            node = [ACTION, self.action(unit)]
+        elif isinstance(unit, Pass):
+            node = [PASS]
+        elif isinstance(unit, Then):
+            node = [SEQUENCE, len(self.children), len(unit.elements)]
+
+            for i, element in enumerate(unit.elements):
+                self.children.append(self.node(element))
+                self.sites.append(self.error(element) if i > 0 and element.isParserUnit else -1)
+        elif isinstance(unit, Or):
+            node = [CHOICE, len(self.entries) // 2] + self.choice(unit)
+        elif isinstance(unit, Rep):
+            node = [REP, self.node(unit.child)]
+        elif isinstance(unit, Opt):
+            node = [OPT, self.node(unit.child)]
+        else:
+            raise TypeError("cannot create tables for " + type(unit).__name__ + " " + str(unit))
+
+        self.nodes[4 * index:4 * index + len(node)] = node
+
+    # Adds the entries of 'unit' (an Or) and returns their count and the
+    # default node.
+    def choice(self, unit):
+        analysis = self.code.analysis()
+        count = 0
+        seen = set()
+
+        for alternative in unit.elements:
+            if not self.hazards.canFail[alternative]:
+                return [count, self.node(alternative)]
+
+            first = analysis.first(alternative)
+
+            if first is None:
+                self.entries.extend([-1, self.node(alternative)])
+                count += 1
+                continue
+
+            if first & seen:
+                names = ", ".join(sorted(token.name for token in first & seen))
+                raise TypeError("cannot create tables for '" + str(unit) + "', '" + str(alternative) +
+                                "' starts with " + names + " like an earlier alternative")
+
+            for token in sorted(first, key = lambda token: token.name):
+                self.entries.extend([self.token(token), self.node(alternative)])
+                count += 1
+
+            seen.update(first)
+
+        return [count, -1]
+
+    def token(self, token):
+        if token not in self.tokenIndices:
+            self.tokenIndices[token] = len(self.tokens)
+            self.tokens.append(token)
+
+        return self.tokenIndices[token]
+
+    def action(self, unit):
+        if unit not in self.actionIndices:
+            self.actionIndices[unit] = len(self.actions)
+            self.actions.append(unit)
+
+        return self.actionIndices[unit]
+
+    def error(self, unit):
+        expected = self.code.expected(unit)
+
+        if expected not in self.errorIndices:
+            self.errorIndices[expected] = len(self.errors)
+            self.errors.append(expected)
+
+        return self.errorIndices[expected]
+
+    # Argument count, return count and whether it is a parser for each
+    # action.
+    def arities(self):
+        return [value for unit in self.actions
+                for value in (len(unit.inputTypes), len(unit.returnTypes), int(unit.isParserUnit))]
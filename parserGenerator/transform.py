@@ -0,0 +1,398 @@
+from parserGenerator.analysis import Analysis, reachableParsers, stronglyConnectedComponents
+from parserGenerator.units import *
+
+# Transformations of the definitions of parsers. They are applied before
+# code is generated and modify the parsers in place.
+
+# Returns the elements of a sequence 'a + b + c', including those of nested
+# Thens.
+def elements(unit):
+    if not isinstance(unit, Then):
+        return [unit]
+
+    result = []
+
+    for element in unit.elements:
+        result.extend(elements(element))
+
+    return result
+
+# Inverse of 'elements'. Sequences are built like with '+'.
+def sequence(elements):
+    return elements[0] if len(elements) == 1 else Then(*elements)
+
+# Returns the alternatives of 'unit', which is the unit itself if it is no
+# Or.
+def alternatives(unit):
+    return unit.alternatives() if isinstance(unit, Or) else [unit]
+
+# Inverse of Or.alternatives.
+def choice(alternatives):
+    return alternatives[0] if len(alternatives) == 1 else Or(*alternatives)
+
+# True if 'then' passes values like a stack, ie each element takes its
+# arguments from the top and the next one only takes arguments that are
+# below them if the elements before have no arguments. Only then sequences
+# can be regrouped.
+def isStackSequence(then):
+    inputTypes = then.elements[0].inputTypes
+    returnTypes = then.elements[0].returnTypes
+
+    for element in then.elements[1:]:
+        overlapLen = min(len(returnTypes), len(element.inputTypes))
+
+        if inputTypes and len(element.inputTypes) != overlapLen:
+            return False
+
+        inputTypes, returnTypes = appendTypes(inputTypes, returnTypes, element)
+
+    return True
+
+def isStackUnit(unit):
+    return not isinstance(unit, Then) or \
+        isStackSequence(unit) and all(isStackUnit(element) for element in unit.elements)
+
+# A rule that was changed by a transformation.
+class Rewrite:
+    # @summary what was changed, eg "2 unit(s) factored".
+    def __init__(self, parser, before, after, summary):
+        self.parser = parser
+        self.before = before
+        self.after = after
+        self.summary = summary
+
+    def __str__(self):
+        return self.parser.name + ": " + self.summary + "\n" + \
+            "    before: " + self.before + "\n" + \
+            "    after:  " + self.after
+
+################################################################################
+## Left factoring ##############################################################
+################################################################################
+
+# Factors common prefixes of adjacent alternatives, ie 'a b | a c | d'
+# becomes 'a (b | c) | d'. Alternatives are not reordered, so the first one
+# that matches is still chosen. Afterwards, an alternative that fails after
+# the prefix succeeded is followed by the next one instead of a parsing
+# error.
+class LeftFactoring:
+    def __init__(self):
+        self.rewrites = []
+        self.saved = 0
+        # parsers that were already factored.
+        self.done = set()
+
+    # Rewrites all parsers that are reachable from 'units' and returns the
+    # list of Rewrites.
+    def run(self, units):
+        parsers = reachableParsers(units, self.done)
+        self.done.update(parsers)
+
+        for parser in parsers:
+            self.saved = 0
+            definition = self.factor(parser.definition)
+
+            if definition is not parser.definition:
+                before = str(parser.definition)
+                parser.setDefinition(definition)
+                self.rewrites.append(Rewrite(parser, before, str(definition),
+                                             str(self.saved) + " unit(s) factored"))
+
+        return self.rewrites
+
+    def report(self):
+        return "\n".join(str(rewrite) for rewrite in self.rewrites)
+
+    # Returns 'unit' if nothing was changed.
+    def factor(self, unit):
+        if isinstance(unit, Or):
+            alternatives = unit.alternatives()
+            factored = [self.factor(alternative) for alternative in alternatives]
+            factored = self.factorAlternatives(factored)
+
+            if factored == alternatives:
+                return unit
+
+            return choice(factored)
+        elif isinstance(unit, Then):
+            factored = [self.factor(element) for element in unit.elements]
+
+            if all(element is original for element, original in zip(factored, unit.elements)):
+                return unit
+
+            return Then(*factored)
+        elif isinstance(unit, Closure):
+            child = self.factor(unit.child)
+
+            if child is unit.child:
+                return unit
+            elif isinstance(unit, Recover):
+                return Recover(child, unit.sync)
+
+            return type(unit)(child)
+        else:
+            return unit
+
+    def factorAlternatives(self, alternatives):
+        factored = []
+        start = 0
+
+        while start < len(alternatives):
+            head = elements(alternatives[start])[0]
+            end = start + 1
+
+            while end < len(alternatives) and elements(alternatives[end])[0] is head:
+                end += 1
+
+            group = alternatives[start:end]
+            unit = self.factorGroup(group) if len(group) > 1 else None
+
+            if unit is not None:
+                factored.append(unit)
+            else:
+                factored.extend(group)
+
+            start = end
+
+        return factored
+
+    # Returns the factored unit or None if the alternatives cannot be
+    # factored without changing their types.
+    def factorGroup(self, group):
+        if not all(isStackUnit(alternative) for alternative in group):
+            return None
+
+        sequences = [elements(alternative) for alternative in group]
+        prefixLen = 0
+
+        # each alternative keeps at least one element.
+        while all(prefixLen < len(units) - 1 for units in sequences) and \
+                all(units[prefixLen] is sequences[0][prefixLen] for units in sequences):
+            prefixLen += 1
+
+        if prefixLen == 0:
+            return None
+
+        saved = self.saved
+
+        try:
+            prefix = sequence(sequences[0][:prefixLen])
+            suffixes = self.factorAlternatives([sequence(units[prefixLen:]) for units in sequences])
+            unit = Then(prefix, choice(suffixes))
+        except TypeError:
+            unit = None
+
+        if unit is None or not isStackUnit(unit) or unit.inputTypes != group[0].inputTypes or \
+                unit.returnTypes != group[0].returnTypes or unit.isParserUnit != group[0].isParserUnit:
+            self.saved = saved
+            return None
+
+        self.saved += prefixLen * (len(group) - 1)
+        return unit
+
+# Applies LeftFactoring to all parsers that are reachable from 'units' and
+# returns the list of Rewrites.
+def leftFactor(units):
+    return LeftFactoring().run(units)
+
+################################################################################
+## Left recursion ##############################################################
+################################################################################
+
+# Rewrites left recursive parsers into loops. 'sum = sum + plus + product +
+# add | product' becomes 'sum = product + (plus + product + add).rep()', so
+# the result is still folded from the left. Parsers that call each other at
+# the start of an alternative (indirect left recursion) are each rewritten
+# on their own: the others are inlined at the start of its alternatives
+# until only calls of the parser itself are left, so it gets its own loop.
+# Of 'a = b + x | c' and 'b = a + y | d', 'a' becomes 'a = (d + x | c) +
+# (y + x).rep()'. The choices that are created are left factored, 'c + x |
+# c' becomes 'c + x.opt()', and they must not start with the same tokens
+# otherwise, because alternatives are committed to.
+class LeftRecursionElimination:
+    def __init__(self):
+        self.rewrites = []
+        # parsers that were already checked.
+        self.done = set()
+
+    # Rewrites all left recursive parsers that are reachable from 'units'
+    # and returns the list of Rewrites.
+    def run(self, units):
+        parsers = reachableParsers(units, self.done)
+        self.done.update(parsers)
+
+        order = dict((parser, i) for i, parser in enumerate(parsers))
+        successors = lambda parser: [next for next in self.leftCalls(parser) if next in order]
+
+        for component in stronglyConnectedComponents(parsers, successors):
+            if len(component) > 1 or component[0] in successors(component[0]):
+                self.eliminate(sorted(component, key = lambda parser: order[parser]))
+
+        return self.rewrites
+
+    def report(self):
+        return "\n".join(str(rewrite) for rewrite in self.rewrites)
+
+    # Returns the parsers that 'parser' calls at the start of an alternative.
+    def leftCalls(self, parser):
+        calls = []
+
+        for alternative in alternatives(parser.definition):
+            first = elements(alternative)[0]
+
+            if isinstance(first, Parser):
+                calls.append(first)
+
+        return calls
+
+    # All parsers of 'component' are rewritten from their original
+    # definitions, hence the order in which they are found does not matter.
+    def eliminate(self, component):
+        definitions = dict((parser, parser.definition) for parser in component)
+        isIndirect = len(component) > 1
+        analysis = Analysis()
+        rewritten = []
+
+        for parser in component:
+            options = []
+
+            for alternative in alternatives(definitions[parser]):
+                options.extend(self.inline(parser, alternative, definitions, frozenset()))
+
+            suffixes = []
+            bases = []
+
+            for alternative in options:
+                units = elements(alternative)
+
+                if units[0] is not parser:
+                    bases.append(alternative)
+                elif len(units) > 1:
+                    suffixes.append(self.checked(parser, sequence(units[1:]), alternative))
+
+            if not bases:
+                raise TypeError("left recursive parser " + parser.name + " has no other alternative")
+
+            if not suffixes and len(bases) == len(alternatives(definitions[parser])):
+                # neither inlined nor left recursive.
+                continue
+
+            if isIndirect:
+                bases = self.factor(parser, bases)
+                suffixes = self.factor(parser, suffixes)
+                self.checkChoice(parser, analysis, bases)
+                self.checkChoice(parser, analysis, suffixes)
+
+            if suffixes:
+                try:
+                    definition = Then(choice(bases), Rep(choice(suffixes)))
+                except TypeError:
+                    raise TypeError("cannot turn left recursion of " + parser.name + " into a loop")
+            else:
+                definition = choice(bases)
+
+            rewritten.append((parser, definition))
+
+        # the definitions are only replaced after all were rewritten, the
+        # analysis sees the original ones.
+        for parser, definition in rewritten:
+            before = str(parser.definition)
+            parser.setDefinition(definition)
+            self.rewrites.append(Rewrite(parser, before, str(definition), "left recursion removed"))
+
+    # Returns the alternatives of 'alternative' after the other parsers of
+    # the component at its start were replaced by their definitions.
+    # 'inlined' are the parsers that were replaced on the way there.
+    def inline(self, parser, alternative, definitions, inlined):
+        units = elements(alternative)
+        first = units[0]
+
+        if first is parser or first not in definitions:
+            return [alternative]
+
+        if first in inlined:
+            raise TypeError("cannot remove left recursion of " + parser.name + ", " +
+                            first.name + " is left recursive without it")
+
+        options = []
+
+        for option in alternatives(definitions[first]):
+            unit = self.checked(parser, sequence(elements(option) + units[1:]), alternative)
+            options.extend(self.inline(parser, unit, definitions, inlined | frozenset([first])))
+
+        return options
+
+    # Factors the prefixes of adjacent alternatives that start with the same
+    # unit. Unlike in LeftFactoring an alternative may be the prefix itself,
+    # then the rest of the others becomes optional.
+    def factor(self, parser, options):
+        factored = []
+        start = 0
+
+        while start < len(options):
+            first = elements(options[start])[0]
+            end = start + 1
+
+            while end < len(options) and elements(options[end])[0] is first:
+                end += 1
+
+            group = options[start:end]
+            factored.append(self.factorGroup(parser, group) if len(group) > 1 else group[0])
+            start = end
+
+        return factored
+
+    def factorGroup(self, parser, group):
+        sequences = [elements(alternative) for alternative in group]
+        prefixLen = 0
+
+        while all(prefixLen < len(units) for units in sequences) and \
+                all(units[prefixLen] is sequences[0][prefixLen] for units in sequences):
+            prefixLen += 1
+
+        rests = [sequence(units[prefixLen:]) for units in sequences if len(units) > prefixLen]
+
+        if not rests:
+            # all alternatives are the same.
+            return group[0]
+
+        try:
+            rest = choice(self.factor(parser, rests))
+
+            if len(rests) < len(group):
+                rest = Opt(rest)
+
+            unit = Then(sequence(sequences[0][:prefixLen]), rest)
+        except TypeError:
+            unit = None
+
+        if unit is None or not isStackUnit(unit) or unit.inputTypes != group[0].inputTypes or \
+                unit.returnTypes != group[0].returnTypes:
+            raise TypeError("cannot factor '" + str(choice(group)) + "' in " + parser.name)
+
+        return unit
+
+    # Committed choice would never try the second of two alternatives that
+    # start with the same token.
+    def checkChoice(self, parser, analysis, options):
+        for i, option in enumerate(options):
+            first = analysis.first(option)
+
+            for other in options[i + 1:]:
+                otherFirst = analysis.first(other)
+
+                if first is not None and otherFirst is not None and first & otherFirst:
+                    raise TypeError("cannot remove left recursion of " + parser.name + ", '" +
+                                    str(option) + "' and '" + str(other) + "' start with the same token")
+
+    # Sequences may only be regrouped if they pass values like a stack.
+    def checked(self, parser, unit, original):
+        if not isStackUnit(unit) or not isStackUnit(original):
+            raise TypeError("cannot regroup '" + str(original) + "' in " + parser.name)
+
+        return unit
+
+# Applies LeftRecursionElimination to all parsers that are reachable from
+# 'units' and returns the list of Rewrites.
+def eliminateLeftRecursion(units):
+    return LeftRecursionElimination().run(units)
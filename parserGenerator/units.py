@@ -1,8 +1,48 @@
+import weakref
+
 # global constant for the name of the boolean to check whether the parser succeeded.
 statusVarName = "status"
 tokenSequenceVarName = "seq"
-
+# true after a parser jumped to its start instead of calling itself.
+tailCallVarName = "isTailCall"
+# field that parsers with a primitive return type set instead of returning
+# null if they fail (see CodeGenerator.isPrimitive).
+successFieldName = "succeeded"
+
+# Combinators and Pass are interned (hash-consing): creating a unit of the
+# same type with the same children returns the existing unit. Hence equal
+# subtrees are the same object and can be shared in the generated code.
+# key -> unit, entries are removed once the unit is not used anymore.
+internedUnits = weakref.WeakValueDictionary()
+
+# Large grammars consist of many units, hence units have no __dict__.
+# Subclasses declare their fields in __slots__.
 class Unit:
+    __slots__ = ("returnTypes", "inputTypes", "isParserUnit", "cachedLabel", "isInterned", "__weakref__")
+
+    def __new__(cls, *args, **kwargs):
+        key = cls.internKey(*args, **kwargs)
+        unit = internedUnits.get(key) if key is not None else None
+
+        if unit is None:
+            unit = object.__new__(cls)
+            # True for units in internedUnits. Their constructor returns at
+            # once if they are created again.
+            unit.isInterned = False
+
+        return unit
+
+    # Returns the key under which units of this class are interned or None
+    # if they are not interned. Children are compared by identity.
+    @classmethod
+    def internKey(cls, *args, **kwargs):
+        return None
+
+    # Called at the end of the constructor of interned units.
+    def intern(self, *children):
+        self.isInterned = True
+        internedUnits[self.internKey(*children)] = self
+
     # @inputTypes Types of arguments (empty list if there are none)
     # @returnTypes Types of the return values. Functions and NamedUnits
     # are restricted to one.
@@ -13,6 +53,7 @@ class Unit:
         self.returnTypes = returnTypes
         self.inputTypes = inputTypes
         self.isParserUnit = isParserUnit
+        self.cachedLabel = None
 
     def __or__(self, other):
         return Or(self, other)
@@ -34,20 +75,65 @@ class Unit:
         # create new variable for each returnType.
         returnVars = [code.createVar(t, None) for t in self.returnTypes]
 
-        self.assignReturnVars(code, localInputVars, streamVar, returnVars)
+        # same as 'generate', but nested units need one call less.
+        helper = code.helper(self)
+        unit = helper if helper is not None else self
+        unit.assignReturnVars(code, localInputVars, streamVar, returnVars)
 
         return inputVars[:len(inputVars) - len(self.inputTypes)] + returnVars
 
+    # Like assignReturnVars, but calls the helper method of this unit if it
+    # is shared (see CodeGenerator.helper).
+    def generate(self, code, inputVars, streamVar, returnVars):
+        helper = code.helper(self)
+
+        if helper is not None:
+            helper.assignReturnVars(code, inputVars, streamVar, returnVars)
+        else:
+            self.assignReturnVars(code, inputVars, streamVar, returnVars)
+
     # Calls this unit and writes the result into var.
     # input must be fully consumed.
     def assignReturnVars(self, code, inputVars, streamVar, returnVars):
         raise NotImplementedError()
 
+    # Units do not change after they were created, hence the label which
+    # is used in comments and error messages is only created once. Labels
+    # of children are created first, so that deeply nested units do not
+    # exceed the recursion limit.
+    def __str__(self):
+        if self.cachedLabel is None:
+            stack = [(self, False)]
+
+            while stack:
+                unit, isExpanded = stack.pop()
+
+                if unit.cachedLabel is not None:
+                    continue
+
+                if isExpanded:
+                    unit.cachedLabel = unit.label()
+                else:
+                    stack.append((unit, True))
+                    stack.extend((child, False) for child in unit.children())
+
+        return self.cachedLabel
+
+    def label(self):
+        raise NotImplementedError()
+
+    # Units that are part of this unit. Parsers and other NamedUnits have
+    # none.
+    def children(self):
+        return []
+
 ################################################################################
 ## Subtypes of Unit ############################################################
 ################################################################################
 
 class NamedUnit(Unit):
+    __slots__ = ("name",)
+
     def __init__(self, name, inputTypes, returnTypes, isParserUnit):
 
         if len(returnTypes) > 1:
@@ -72,35 +158,53 @@ class NamedUnit(Unit):
     # by a call to declare.
     # @inputVars arguments for a method call. May be none if not needed.
     # @streamVar Name of variable that contains the TokStream
-    def call(self, inputVars, streamVar):
+    def call(self, code, inputVars, streamVar):
         if self.isParserUnit:
             argVars = inputVars + [streamVar]
         else:
             argVars = inputVars
 
-        return self.name  + "(" + ", ".join(argVars) + ")"
+        return code.methodRef(self.methodName(code, self.name)) + "(" + ", ".join(argVars) + ")"
+
+    # Name of the method for 'name' in the target language. Parsers and
+    # functions may have the same name since they differ in their arguments.
+    def methodName(self, code, name):
+        if self.isParserUnit:
+            return code.parserName(name)
+        else:
+            return code.functionName(name)
 
     def assignReturnVars(self, code, inputVars, streamVar, returnVars):
         # returnVars is either empty or contains exactly one element.
-        call = self.call(inputVars, streamVar) + ";"
+        call = self.call(code, inputVars, streamVar)
 
         if not returnVars:
             if not self.isParserUnit:
                 # void function
-                code.addLine(call)
+                code.statement(call)
             else:
                 # recognizer
-                code.addLine(statusVarName + " = " + call)
+                code.assign(statusVarName, call)
         else:
-            code.addLine(returnVars[0] + " = " + call)
+            code.assign(returnVars[0], call)
 
             if self.isParserUnit:
-                code.addLine(statusVarName + " = " + returnVars[0] + " != null;")
-
-
-    def signature(self, inputVars, streamVar):
+                if code.isPrimitive(self.returnTypes[0]):
+                    # primitive values cannot be null.
+                    code.assign(statusVarName, self.successRef(code))
+                else:
+                    code.assign(statusVarName, code.notNull(returnVars[0]))
+
+    # The field in which a parser with a primitive return type reports
+    # whether it succeeded. It must be read right after the call.
+    def successRef(self, code):
+        return code.useSuccessField()
+
+    # Opens the block of the method that implements this unit.
+    # @name name of the method if it is not the name of this unit.
+    def beginDeclaration(self, code, inputVars, streamVar, name = None, modifiers = "public"):
         returnType = self.returnTypes[0] if len(self.returnTypes) != 0 else \
-            "boolean" if self.isParserUnit else "void"
+            "boolean" if self.isParserUnit else None
 
         if self.isParserUnit:
             argTypes = self.inputTypes + ["TokStream"]
@@ -109,11 +213,9 @@ class NamedUnit(Unit):
             argTypes = self.inputTypes
             argVars = inputVars
 
-        typedArgs = [" ".join(pair) for pair in zip(argTypes, argVars)]
-
-        return "public " + returnType + " " + self.name + "(" + ", ".join(typedArgs) + ")"
+        code.methodBlock(returnType, self.methodName(code, name or self.name), argTypes, argVars, modifiers)
 
-    def __str__(self):
+    def label(self):
         return self.name
 
 ################################################################################
@@ -123,9 +225,11 @@ class NamedUnit(Unit):
 class Lexer:
     def __init__(self, name):
         self.name = name;
+        # all tokens (including hidden ones) in order of creation.
+        self.tokens = []
 
     def declare(self, code):
-        code.addLine("private final Lexer " + self.name + " = new Lexer();")
+        code.declareField("private final", "Lexer", self.name, code.newObject("Lexer"))
         return self
 
 class Object:
@@ -134,46 +238,98 @@ class Object:
         self.className = className
 
     def declare(self, code):
-        code.addLine("private final " + self.className + " " + self.name + " = new " + self.className + "();")
+        code.importClass(self.className)
+        code.declareField("private final", self.className, self.name, code.newObject(self.className))
         return self
 
     def externCall(self, name, inputTypes, returnType, isParserUnit):
-        return ExternFunction(self.name, name, inputTypes, returnType, isParserUnit)
+        function = ExternFunction(self.name, name, inputTypes, returnType, isParserUnit)
+        function.object = self
+        return function
 
 class ExternFunction(NamedUnit):
+    __slots__ = ("qualifier", "functionName", "object")
+
     def __init__(self, qualifier, name, inputTypes, returnType, isParserUnit):
         NamedUnit.__init__(self, qualifier + "." + name, inputTypes, [returnType], isParserUnit)
+        self.qualifier = qualifier
+        self.functionName = name
+        # the Object if this function was created by Object.externCall
+        self.object = None
 
+    def call(self, code, inputVars, streamVar):
+        if self.isParserUnit:
+            argVars = inputVars + [streamVar]
+        else:
+            argVars = inputVars
+
+        return code.fieldRef(self.qualifier) + "." + self.methodName(code, self.functionName) + \
+               "(" + ", ".join(argVars) + ")"
+
+    # The other grammar must be generated with the same option 'primitives'.
+    def successRef(self, code):
+        return code.fieldRef(self.qualifier) + "." + code.fieldName(successFieldName)
+
+# An expression in the target language that is called with the input
+# variables as arguments, eg "new StringBuilder".
 class Expr(NamedUnit):
+    __slots__ = ("callCodes",)
+
     def __init__(self, callCode, inputTypes, returnTypes, isParserUnit):
         NamedUnit.__init__(self, callCode, inputTypes, returnTypes, isParserUnit)
+        self.callCodes = {}
+
+    # Sets the call code for a language other than the one passed to
+    # the constructor.
+    def setCallCode(self, callCode, language):
+        self.callCodes[language] = callCode
+        return self
+
+    def call(self, code, inputVars, streamVar):
+        if self.isParserUnit:
+            argVars = inputVars + [streamVar]
+        else:
+            argVars = inputVars
+
+        callCode = self.callCodes.get(code.language, self.name)
+        return callCode + "(" + ", ".join(argVars) + ")"
 
 class HiddenToken:
     def __init__(self, name, lexer, regex):
         self.lexer = lexer
         self.name = name
         self.regex = regex
+        lexer.tokens.append(self)
 
     def declare(self, code):
-        code.addLine("public final Token " + self.name + " = " + self.lexer.name + ".hiddenToken(" + self.regex + ");")
+        code.declareField("public final", "Token", self.name,
+                          code.fieldName(self.lexer.name) + ".hiddenToken(" + code.regexExpr(self.regex) + ")")
+        code.registerToken(self)
         return self
 
 class Token(NamedUnit):
+    __slots__ = ("lexer", "regex")
+
     def __init__(self, name, lexer, regex):
         NamedUnit.__init__(self, name, [], [], True)
         self.lexer = lexer
         self.name = name
         self.regex = regex
+        lexer.tokens.append(self)
 
-    def call(self, inputVars, stream):
+    def call(self, code, inputVars, stream):
         # This one has a special call.
-        return self.name + ".recognizeToken(" + stream + ")"
+        return code.fieldRef(self.name) + ".recognizeToken(" + stream + ")"
 
     def declare(self, code):
-        code.addLine("public final Token " + self.name + " = " + self.lexer.name + ".token(" + self.regex + ");")
+        code.declareField("public final", "Token", self.name,
+                          code.fieldName(self.lexer.name) + ".token(" + code.regexExpr(self.regex) + ")")
+        code.registerToken(self)
         return self
 
 class TokenParser(NamedUnit):
+    __slots__ = ("token", "func")
+
     def __init__(self, name, token, func):
         if not func.inputTypes or func.inputTypes[-1] != 'CharSequence':
             raise TypeError("last argument of func must be CharSequence")
@@ -188,12 +344,15 @@ class TokenParser(NamedUnit):
     def declare(self, code, inputVars, streamVar):
         assert len(inputVars) == len(self.inputTypes)
 
-        code.beginBlock(NamedUnit.signature(self, inputVars, streamVar))
-        code.addLine("CharSequence " +
-                     tokenSequenceVarName + " = " +
-                     self.token.name + ".parseToken(" + streamVar+ ");")
+        if code.options["tables"]:
+            code.declareTableEntry(self, inputVars, streamVar)
+            return self
+
+        self.beginDeclaration(code, inputVars, streamVar)
+        code.declareLocal("CharSequence", tokenSequenceVarName,
+                          code.fieldRef(self.token.name) + ".parseToken(" + streamVar + ")")
 
-        code.beginBlock("if(" + tokenSequenceVarName + " != null)")
+        code.ifBlock(code.notNull(tokenSequenceVarName))
 
         returnVars = self.func.createCall(code, inputVars + [tokenSequenceVarName], streamVar)
 
@@ -201,13 +360,20 @@ class TokenParser(NamedUnit):
             assert len(returnVars) == 1
             # funcs only have one returnType.
             # and they are not ParserUnits
-            code.addLine("return " + returnVars[0] + ";")
-            code.endBlock() # success parse
-            code.addLine("return null;") # alternative fail
+            if code.isPrimitive(self.returnTypes[0]):
+                code.assign(code.useSuccessField(), code.trueLiteral)
+                code.returnValue(returnVars[0])
+                code.endBlock() # success parse
+                code.assign(code.useSuccessField(), code.falseLiteral)
+                code.returnValue(code.defaultValue(self.returnTypes[0])) # alternative fail
+            else:
+                code.returnValue(returnVars[0])
+                code.endBlock() # success parse
+                code.returnValue(code.nullLiteral) # alternative fail
         else:
-            code.addLine("return true;")
+            code.returnValue(code.trueLiteral)
             code.endBlock() # success parse
-            code.addLine("return false;") # alternative fail
+            code.returnValue(code.falseLiteral) # alternative fail
 
         code.endBlock()
         return self
@@ -217,28 +383,45 @@ class TokenParser(NamedUnit):
 ################################################################################
 
 class Pass(Unit):
+    __slots__ = ()
+
     def __init__(self, types):
+        if self.isInterned:
+            return
+
         Unit.__init__(self, types, types, False)
+        self.intern(types)
+
+    @classmethod
+    def internKey(cls, types):
+        return cls, tuple(types)
 
     def createCall(self, code, inputVars, streamVar):
         return inputVars
 
-    def __str__(self):
+    def label(self):
         return ""
 
 class FuncUnit(NamedUnit):
+    __slots__ = ("bodies",)
+
     def __init__(self, name, inputTypes, returnTypes):
         NamedUnit.__init__(self, name, inputTypes, returnTypes, False)
+        self.bodies = {}
 
-    def setBody(self, body):
-        self.body = body
+    # @language the body is only used by code generators for this language.
+    def setBody(self, body, language = "java"):
+        self.bodies[language] = body
         return self
 
     def declare(self, code, inputVars):
         assert len(inputVars) == len(self.inputTypes)
 
-        code.beginBlock(NamedUnit.signature(self, inputVars, None))
-        for line in self.body.split("\n"):
+        if code.language not in self.bodies:
+            raise TypeError("no " + code.language + " body for " + self.name)
+
+        self.beginDeclaration(code, inputVars, None)
+        for line in self.bodies[code.language].split("\n"):
             code.addLine(line)
         code.endBlock()
         return self
@@ -248,12 +431,16 @@ class FuncUnit(NamedUnit):
 ################################################################################
 
 class Parser(NamedUnit):
+    __slots__ = ("definition", "memoize", "memoLimit")
+
     def __init__(self, name, inputTypes, returnTypes):
         # Although this is reserved for parsers, the definition
         # is not necessarily a parser. Therefore the isParserUnit-flag
         # is set in accordance with definition.
         NamedUnit.__init__(self, name, inputTypes, returnTypes, True)
         self.definition = None
+        self.memoize = False
+        self.memoLimit = 0
 
     def setDefinition(self, definition):
         if self.inputTypes != definition.inputTypes:
@@ -265,121 +452,494 @@ class Parser(NamedUnit):
         self.definition = definition
         return self
 
+    # Memoized parsers store their result, end position and status for
+    # every start position (packrat parsing), so that each parser is called
+    # at most once per position. The table belongs to the stream that is
+    # parsed and it is reset for a new stream.
+    # @limit if positive, the table is cleared when it contains that many
+    #   entries. The generated class also has a method 'clearMemo'.
+    def setMemoize(self, memoize = True, limit = 0):
+        if memoize and self.inputTypes:
+            raise TypeError("only parsers without input types can be memoized")
+
+        self.memoize = memoize
+        self.memoLimit = limit
+        return self
+
     def declare(self, code, inputVars, streamVar):
         assert len(inputVars) == len(self.inputTypes)
 
-        # Create constant
-        code.beginBlock(NamedUnit.signature(self, inputVars, streamVar))
+        if code.options["tables"]:
+            code.declareTableEntry(self, inputVars, streamVar)
+            return self
+
+        code.prepare(self)
+
+        if self.memoize:
+            # only called by the memoized method.
+            self.declareMemoized(code, streamVar)
+            self.beginDeclaration(code, inputVars, streamVar, self.name + "Unmemoized", "private")
+        else:
+            self.beginDeclaration(code, inputVars, streamVar)
+
+        # calls of this parser are counted once, also if it calls itself at
+        # the end.
+        counter = code.profileCounter(self.name)
+
+        if counter is not None:
+            code.countCall(counter)
+            code.beginProfileTime()
+
+        tailCalls, reportedUnit = code.tailCalls(self)
+
+        if tailCalls:
+            # calls of this parser at the end of the definition assign
+            # the arguments to the parameters and continue the loop.
+            code.declareLocal("boolean", tailCallVarName, code.falseLiteral)
+            code.loopBlock()
+            code.tailCallContext = (inputVars, tailCalls, containing(self.definition, tailCalls))
 
         # declare status variable
-        code.addLine("boolean " + statusVarName + " = true;")
+        code.declareLocal("boolean", statusVarName, code.trueLiteral)
 
         returnVars = self.definition.createCall(code, inputVars, streamVar)
 
+        if tailCalls:
+            code.tailCallContext = None
+
+            # the caller would report that the unit with the call failed.
+            code.ifBlock(code.andExpr(code.notExpr(statusVarName), tailCallVarName))
+            code.parsingError(streamVar, reportedUnit)
+            code.endBlock()
+
+        if counter is not None:
+            code.countOutcome(counter, statusVarName)
+            code.endProfileTime(counter)
+
+        if returnVars:
+            if code.isPrimitive(self.returnTypes[0]):
+                code.assign(code.useSuccessField(), statusVarName)
+
+            code.returnValue(returnVars[0])
+        elif self.isParserUnit:
+            code.returnValue(statusVarName)
+
+        if tailCalls:
+            code.endBlock()
+
+        code.endBlock()
+        code.declareHelpers()
+        return self
+
+    # Declares the memo table and the method that looks up results in it
+    # before it calls the actual parser.
+    def declareMemoized(self, code, streamVar):
+        returnType = self.returnTypes[0] if self.returnTypes else "boolean"
+        isPrimitive = bool(self.returnTypes) and code.isPrimitive(returnType)
+        table = self.name + "Memo"
+        code.declareMemoTable(table, self.memoLimit)
+
+        self.beginDeclaration(code, [], streamVar)
+        code.declareLocal("int", "start", code.streamPosition(streamVar))
+        code.declareLocal(code.memoEntryType(), "entry", code.memoLookup(table, streamVar, "start"))
+
+        code.ifBlock(code.memoFound(table, "entry"))
+        code.setStreamPosition(streamVar, code.memoEnd(table, "entry"))
+
+        if isPrimitive:
+            # failures are stored as null.
+            code.assign(code.useSuccessField(), code.notNull(code.memoResult(table, "entry", None)))
+            code.ifBlock(code.useSuccessField())
+            code.returnValue(code.memoResult(table, "entry", returnType))
+            code.endBlock()
+            code.returnValue(code.defaultValue(returnType))
+        else:
+            code.returnValue(code.memoResult(table, "entry", returnType))
+
+        code.endBlock()
+
+        call = code.methodRef(self.methodName(code, self.name + "Unmemoized")) + "(" + streamVar + ")"
+        code.declareLocal(returnType, "result", call)
+        end = code.streamPosition(streamVar)
+
+        if isPrimitive:
+            code.ifBlock(code.useSuccessField())
+            code.statement(code.fieldRef(table) + ".put(start, result, " + end + ")")
+            code.elseBlock()
+            code.statement(code.fieldRef(table) + ".put(start, " + code.nullLiteral + ", " + end + ")")
+            code.endBlock()
+        else:
+            code.statement(code.fieldRef(table) + ".put(start, result, " + end + ")")
+
+        code.returnValue("result")
+        code.endBlock()
+
+# The method of a unit that is used more than once (see
+# CodeGenerator.helper). It is called like a parser or a function. Like
+# parsers, a helper that returns null (or clears the success field) failed.
+class Helper(NamedUnit):
+    __slots__ = ("unit",)
+
+    def __init__(self, name, unit):
+        NamedUnit.__init__(self, name, unit.inputTypes, unit.returnTypes, unit.isParserUnit)
+        self.unit = unit
+
+    def declare(self, code):
+        inputVars = ["arg" + str(i) for i in range(len(self.inputTypes))]
+        streamVar = "stream"
+
+        self.beginDeclaration(code, inputVars, streamVar, None, "private")
+        code.declareLocal("boolean", statusVarName, code.trueLiteral)
+
+        returnVars = [code.createVar(t, None) for t in self.returnTypes]
+        self.unit.assignReturnVars(code, inputVars, streamVar, returnVars)
+
         if returnVars:
-            code.addLine("return " + returnVars[0] + ";")
+            if self.isParserUnit and code.isPrimitive(self.returnTypes[0]):
+                code.assign(code.useSuccessField(), statusVarName)
+            elif self.isParserUnit:
+                code.ifBlock(code.notExpr(statusVarName))
+                code.returnValue(code.nullLiteral)
+                code.endBlock()
+
+            code.returnValue(returnVars[0])
         elif self.isParserUnit:
-            code.addLine("return " + statusVarName + ";")
+            code.returnValue(statusVarName)
 
         code.endBlock()
         return self
 
+# The method of a Recover (see CodeGenerator.recoveryPoint). It is called
+# like a Helper. It calls the method '<name>Body' of the child and catches
+# the ParseError of the class (see CodeGenerator.declareRecovery).
+class RecoveryPoint(NamedUnit):
+    __slots__ = ("unit",)
+
+    def __init__(self, name, unit):
+        NamedUnit.__init__(self, name, unit.inputTypes, unit.returnTypes, True)
+        self.unit = unit
+
+    def declare(self, code):
+        inputVars = ["arg" + str(i) for i in range(len(self.inputTypes))]
+        streamVar = "stream"
+        body = Helper(self.name + "Body", self.unit.child)
+        returnType = self.returnTypes[0] if self.returnTypes else "boolean"
+
+        code.writeMethodBlock(returnType, self.methodName(code, self.name), self.inputTypes + ["TokStream"],
+                              inputVars + [streamVar], "private")
+        code.declareRecovery(self.unit, body.call(code, inputVars, streamVar), inputVars, streamVar)
+        code.writeEndBlock()
+
+        body.declare(code)
+        return self
+
+# Replaces a call of 'parser' in tail position by a jump to its start: the
+# arguments, ie the last values of 'inputVars', become the new values of
+# the parameters.
+def jumpToStart(code, parser, inputVars):
+    parameters = code.tailCallContext[0]
+    arguments = inputVars[len(inputVars) - len(parameters):]
+
+    # parameters that are passed at a different position are copied
+    # before they are overwritten.
+    for i, argument in enumerate(arguments):
+        if argument != parameters[i] and argument in parameters:
+            arguments[i] = code.createVar(parser.inputTypes[i], None, argument)
+
+    for parameter, argument in zip(parameters, arguments):
+        if parameter != argument:
+            code.assign(parameter, argument)
+
+    code.assign(tailCallVarName, code.trueLiteral)
+    code.continueLoop()
+
+# Returns the units of 'root' that contain one of 'units', including them.
+# Parsers are not entered.
+def containing(root, units):
+    result = set(units)
+    visited = set()
+    stack = [(root, False)]
+
+    while stack:
+        unit, isExpanded = stack.pop()
+
+        if isExpanded:
+            if any(child in result for child in unit.children()):
+                result.add(unit)
+        elif unit not in visited:
+            visited.add(unit)
+            stack.append((unit, True))
+            stack.extend((child, False) for child in unit.children())
+
+    return result
+
 ################################################################################
 ## Combinators #################################################################
 ################################################################################
 
 
+# Alternatives are tried in order until one succeeds. Nested Ors are
+# flattened, hence 'a | b | c' is one Or with three elements.
 class Or(Unit):
-    def __init__(self, first, second):
-        if first.inputTypes != second.inputTypes or first.returnTypes != second.returnTypes:
-            raise TypeError("types in 'or' must match")
-        if not first.isParserUnit:
-            raise TypeError("first element in 'or' must be a parser unit")
+    __slots__ = ("elements",)
+
+    # Nested Ors were checked before, hence only 'units' are checked. Thus,
+    # 'a | b | c | ...' does not take quadratic time.
+    def __init__(self, *units):
+        if self.isInterned:
+            return
+
+        elements = orElements(units)
 
-        Unit.__init__(self, first.inputTypes, first.returnTypes, second.isParserUnit)
+        if len(elements) < 2:
+            raise TypeError("'or' needs at least two elements")
 
-        self.first = first
-        self.second = second
+        first = units[0]
+
+        for unit in units[1:]:
+            if first.inputTypes != unit.inputTypes or first.returnTypes != unit.returnTypes:
+                raise TypeError("types in 'or' must match")
+
+        if not all(unit.isParserUnit for unit in units[:-1]):
+            raise TypeError("only the last element in 'or' may be no parser unit")
+
+        Unit.__init__(self, first.inputTypes, first.returnTypes, units[-1].isParserUnit)
+
+        self.elements = elements
+        self.intern(*units)
+
+    @classmethod
+    def internKey(cls, *elements):
+        return (cls,) + orElements(elements)
+
+    def children(self):
+        return list(self.elements)
+
+    # Returns the alternatives in order.
+    def alternatives(self):
+        return list(self.elements)
 
     def assignReturnVars(self, code, inputVars, streamVar, returnVars):
-        code.addLine("/* " + str(self) + " */")
-        self.first.assignReturnVars(code, inputVars, streamVar, returnVars)
+        if code.options["dispatch"]:
+            alternatives = self.alternatives()
+            dispatch = code.analysis().dispatchTable(alternatives)
+
+            if dispatch is not None:
+                self.assignDispatched(code, inputVars, streamVar, returnVars, alternatives, dispatch)
+                return
+
+        code.beginUnit(self)
+        self.generateAlternative(code, self.elements[0], inputVars, streamVar, returnVars)
+
+        # the blocks are not nested, so that many alternatives do not
+        # create deeply nested code.
+        for alternative in self.elements[1:]:
+            code.ifBlock(code.notExpr(statusVarName))
+            self.generateAlternative(code, alternative, inputVars, streamVar, returnVars)
+            code.endBlock()
 
-        code.beginBlock("if(!" + statusVarName + ")")
-        self.second.assignReturnVars(code, inputVars, streamVar, returnVars)
+        code.endUnit(self)
 
-        if not self.second.isParserUnit:
-            code.addLine(statusVarName + " = true;")
+    # Alternatives that are no parser units always succeed. With the option
+    # 'profile', calls and results of alternatives are counted.
+    def generateAlternative(self, code, alternative, inputVars, streamVar, returnVars):
+        # the last alternative is a call of the declared parser, see
+        # Analysis.tailCalls.
+        if code.tailCallContext is not None and self in code.tailCallContext[1] and \
+                alternative is self.elements[-1]:
+            jumpToStart(code, alternative, inputVars)
+            return
 
-        code.endBlock()
-        code.addLine("/* end " + str(self) + " */")
+        counter = code.profileCounter(code.methodName + " | " + shortLabel(alternative))
 
-    def __str__(self):
-        return str(self.first) + " | " + str(self.second)
+        if counter is not None:
+            code.countCall(counter)
+
+        alternative.generate(code, inputVars, streamVar, returnVars)
+
+        if not alternative.isParserUnit:
+            code.assign(statusVarName, code.trueLiteral)
+
+        if counter is not None:
+            code.countOutcome(counter, statusVarName)
+
+    # The first 'count' alternatives start with different characters, so the
+    # next character selects the only one that can succeed. The remaining
+    # alternatives are tried one by one if it fails.
+    # @dispatch see Analysis.dispatchTable
+    def assignDispatched(self, code, inputVars, streamVar, returnVars, alternatives, dispatch):
+        lexer, count, table = dispatch
+
+        code.beginUnit(self)
+        peek = code.fieldRef(lexer.name) + ".peekChar(" + streamVar + ")"
+        index = code.createVar("int", None,
+                               code.fieldRef(code.dispatchTable(table)) + ".lookup(" + peek + ")")
+
+        code.switchBlock(index)
+
+        for i in range(count):
+            code.caseBlock(i)
+            self.generateAlternative(code, alternatives[i], inputVars, streamVar, returnVars)
+            code.endCase()
+
+        code.defaultBlock()
+        code.assign(statusVarName, code.falseLiteral)
+        code.endCase()
+        code.endSwitch()
+
+        for alternative in alternatives[count:]:
+            code.ifBlock(code.notExpr(statusVarName))
+            self.generateAlternative(code, alternative, inputVars, streamVar, returnVars)
+            code.endBlock()
+
+        code.endUnit(self)
 
+    def label(self):
+        return " | ".join(str(element) for element in self.elements)
+
+# Elements of an Or of 'elements': nested Ors are replaced by their elements.
+def orElements(elements):
+    result = []
+
+    for element in elements:
+        if isinstance(element, Or):
+            result.extend(element.elements)
+        else:
+            result.append(element)
+
+    return tuple(result)
+
+# Short label of a unit for profile counters and messages.
+def shortLabel(unit, maxLength = 40):
+    label = str(unit)
+    return label if len(label) <= maxLength else label[:maxLength - 3] + "..."
+
+# A sequence of units. The return values of an element are the arguments of
+# the next one as far as they overlap. If the first element fails, the Then
+# fails, if a later one fails, there is a parsing error.
 class Then(Unit):
-    def __init__(self, left, right):
-        overlapLen = min(len(left.returnTypes), len(right.inputTypes))
+    __slots__ = ("elements",)
 
-        overlap = left.returnTypes[-overlapLen:] if overlapLen != 0 else []
+    # A Then at the start already has the types of its elements, hence the
+    # types are computed from 'units'.
+    def __init__(self, *units):
+        if self.isInterned:
+            return
 
-        if overlapLen != 0 and right.inputTypes[-overlapLen:] != overlap:
-            raise TypeError("overlap in then does not match")
+        elements = thenElements(units)
 
-        Unit.__init__(self, left.inputTypes + right.inputTypes[:len(right.inputTypes) - overlapLen],
-                      left.returnTypes[:len(left.returnTypes) - overlapLen] + right.returnTypes,
-                      left.isParserUnit or right.isParserUnit)
+        if len(elements) < 2:
+            raise TypeError("'then' needs at least two elements")
 
-        self.left = left
-        self.right = right
+        inputTypes, returnTypes = sequenceTypes(units)
+        Unit.__init__(self, inputTypes, returnTypes, any(unit.isParserUnit for unit in units))
 
-    def assignReturnVars(self, code, inputVars, streamVar, returnVars):
-        code.addLine("/* " + str(self) + " */")
-        nextInputVars = self.left.createCall(code, inputVars, streamVar)
+        self.elements = elements
+        self.intern(*units)
 
-        if self.left.isParserUnit:
-            code.beginBlock("if(" + statusVarName + ")")
+    @classmethod
+    def internKey(cls, *elements):
+        return (cls,) + thenElements(elements)
 
-        localReturnVars = self.right.createCall(code, nextInputVars, streamVar)
+    def children(self):
+        return list(self.elements)
 
-        if self.right.isParserUnit:
-            code.beginBlock("if(!" + statusVarName + ")")
-            code.addLine("parsingError(" + streamVar + ", \"" + str(self.right) + "\");")
+    def assignReturnVars(self, code, inputVars, streamVar, returnVars):
+        if code.tailCallContext is not None and self in code.tailCallContext[1]:
+            self.assignTailCall(code, inputVars, streamVar)
+            return
 
-        if returnVars:
-            if self.right.isParserUnit:
-                code.elseBlock()
+        code.beginUnit(self)
+        localReturnVars = self.callElements(code, self.elements, inputVars, streamVar)
 
-            # all successful, assign return variables
-            # this is empty if there are no return values.
-            for lv, rv in zip(returnVars, localReturnVars):
-                if lv != rv:
-                    code.addLine(lv + " = " + rv + ";")
+        # all successful, assign return variables
+        # this is empty if there are no return values.
+        for lv, rv in zip(returnVars, localReturnVars):
+            if lv != rv:
+                code.assign(lv, rv)
 
-        if self.right.isParserUnit:
+        if self.elements[0].isParserUnit:
             code.endBlock()
 
-        if self.left.isParserUnit:
+        code.endUnit(self)
+
+    # Calls 'elements' one after the other and returns the variables of the
+    # values that they leave. If the first element is a parser unit, the
+    # rest is in a block that only runs if it succeeded. The caller closes
+    # it.
+    def callElements(self, code, elements, inputVars, streamVar):
+        nextInputVars = elements[0].createCall(code, inputVars, streamVar)
+
+        if elements[0].isParserUnit:
+            code.ifBlock(statusVarName)
+
+        for element in elements[1:]:
+            nextInputVars = element.createCall(code, nextInputVars, streamVar)
+
+            if element.isParserUnit:
+                code.ifBlock(code.notExpr(statusVarName))
+                code.parsingError(streamVar, element)
+                code.endBlock()
+
+        return nextInputVars
+
+    # The last element is the parser that is declared (see
+    # Analysis.tailCalls), hence its arguments become the new values of the
+    # parameters and the parser starts again.
+    def assignTailCall(self, code, inputVars, streamVar):
+        code.beginUnit(self)
+        nextInputVars = self.callElements(code, self.elements[:-1], inputVars, streamVar)
+        jumpToStart(code, self.elements[-1], nextInputVars)
+
+        if self.elements[0].isParserUnit:
             code.endBlock()
 
-        code.addLine("/* end " + str(self) + " */")
+        code.endUnit(self)
 
-    def __str__(self):
-        leftString = str(self.left)
+    def label(self):
+        return " ".join("(" + str(element) + ")" if isinstance(element, Or) else str(element)
+                        for element in self.elements)
+
+# Elements of a Then of 'elements'. A Then at the start is replaced by its
+# elements because 'a + b + c' creates '(a + b) + c'. Thens at other
+# positions are kept, regrouping them may change which values the elements
+# receive (see transform.isStackSequence).
+def thenElements(elements):
+    if elements and isinstance(elements[0], Then):
+        return elements[0].elements + tuple(elements[1:])
+
+    return tuple(elements)
+
+# Returns the input and return types of the sequence 'elements'.
+def sequenceTypes(elements):
+    inputTypes = elements[0].inputTypes
+    returnTypes = elements[0].returnTypes
+
+    for element in elements[1:]:
+        inputTypes, returnTypes = appendTypes(inputTypes, returnTypes, element)
 
-        if isinstance(self.left, Or):
-            leftString = "(" + leftString + ")"
+    return inputTypes, returnTypes
 
-        rightString = str(self.right)
+# Types of a sequence with the given types that is followed by 'element'.
+def appendTypes(inputTypes, returnTypes, element):
+    overlapLen = min(len(returnTypes), len(element.inputTypes))
 
-        if isinstance(self.right, Or):
-            rightString = "(" + rightString + ")"
+    overlap = returnTypes[-overlapLen:] if overlapLen != 0 else []
 
-        return leftString + " " + rightString
+    if overlapLen != 0 and element.inputTypes[-overlapLen:] != overlap:
+        raise TypeError("overlap in then does not match")
+
+    return inputTypes + element.inputTypes[:len(element.inputTypes) - overlapLen], \
+        returnTypes[:len(returnTypes) - overlapLen] + element.returnTypes
 
 
 class Closure(Unit):
+    __slots__ = ("child",)
+
     def __init__(self, child):
+        if self.isInterned:
+            return
+
         if not child.isParserUnit:
             raise TypeError("child of rep must have an optional return value")
         if child.returnTypes != child.inputTypes:
@@ -387,35 +947,45 @@ class Closure(Unit):
 
         Unit.__init__(self, child.inputTypes, child.returnTypes, True)
         self.child = child
+        self.intern(child)
+
+    @classmethod
+    def internKey(cls, child):
+        return cls, child
+
+    def children(self):
+        return [self.child]
 
 class Rep(Closure):
+    __slots__ = ()
+
     def __init__(self, child):
         Closure.__init__(self, child)
 
     def assignReturnVars(self, code, inputVars, streamVar, returnVars):
         assert len(inputVars) == len(returnVars)
 
-        code.addLine("/* " + str(self) + " */")
+        code.beginUnit(self)
         for lv, rv in zip(returnVars, inputVars):
-            code.addLine(lv + " = " + rv + ";")
+            code.assign(lv, rv)
 
-        code.beginBlock("for(;;)")
+        code.loopBlock()
         localReturnVars = self.child.createCall(code, returnVars, streamVar)
-        code.beginBlock("if(!" + statusVarName + ")")
-        code.addLine(statusVarName + " = true;")
-        code.addLine("break;")
+        code.ifBlock(code.notExpr(statusVarName))
+        code.assign(statusVarName, code.trueLiteral)
+        code.breakLoop()
 
         if localReturnVars:
             code.elseBlock()
             for lv, rv in zip(returnVars, localReturnVars):
-                code.addLine(lv + " = " + rv + ";")
+                code.assign(lv, rv)
 
         code.endBlock()
         code.endBlock()
 
-        code.addLine("/* end " + str(self) + " */")
+        code.endUnit(self)
 
-    def __str__(self):
+    def label(self):
         childString = str(self.child)
 
         if isinstance(self.child, Or) or isinstance(self.child, Then):
@@ -425,30 +995,72 @@ class Rep(Closure):
 
 
 class Opt(Closure):
+    __slots__ = ()
+
     def __init__(self, child):
         Closure.__init__(self, child)
 
     def assignReturnVars(self, code, inputVars, streamVar, returnVars):
-        code.addLine("/* " + str(self) + " */")
+        code.beginUnit(self)
         for lv, rv in zip(returnVars, inputVars):
-            code.addLine(lv + " = " + rv + ";")
+            code.assign(lv, rv)
 
-        localReturnVars = self.child.createCall(self, code, inputVars, streamVar)
+        localReturnVars = self.child.createCall(code, inputVars, streamVar)
 
         if returnVars:
-            code.beginBlock("if(" + statusVarName + ")")
+            code.ifBlock(statusVarName)
             for lv, rv in zip(returnVars, localReturnVars):
-                code.addLine(lv + " = " + rv + ";")
+                code.assign(lv, rv)
             code.endBlock()
 
-        code.addLine(statusVarName + " = true;")
+        code.assign(statusVarName, code.trueLiteral)
 
-        code.addLine("/* end " + str(self) + " */")
+        code.endUnit(self)
 
-    def __str__(self):
+    def label(self):
         childString = str(self.child)
 
         if isinstance(self.child, Or) or isinstance(self.child, Then):
             childString = "(" + childString + ")"
 
         return childString + "?"
+
+
+# Error recovery: if the child causes a parsing error, the error is
+# collected in the ParseError of the class, the input is skipped up to and
+# including 'sync' and the input values are returned. Otherwise it behaves
+# like the child, hence 'Recover(statement, semicolon).rep()' parses
+# statements until one fails. Requires the option errorSites.
+class Recover(Closure):
+    __slots__ = ("sync",)
+
+    def __init__(self, child, sync):
+        if self.isInterned:
+            return
+
+        if not isinstance(sync, Token):
+            raise TypeError("recovery points skip to a Token")
+        if len(child.returnTypes) > 1:
+            raise TypeError("recovery points return at most one value")
+
+        self.sync = sync
+        Closure.__init__(self, child)
+
+    @classmethod
+    def internKey(cls, child, sync):
+        return cls, child, sync
+
+    # Closure.__init__ interns the unit by its child.
+    def intern(self, child):
+        Unit.intern(self, child, self.sync)
+
+    def children(self):
+        return [self.child, self.sync]
+
+    def assignReturnVars(self, code, inputVars, streamVar, returnVars):
+        code.beginUnit(self)
+        code.recoveryPoint(self).assignReturnVars(code, inputVars, streamVar, returnVars)
+        code.endUnit(self)
+
+    def label(self):
+        return "recover(" + str(self.child) + ", " + self.sync.name + ")"
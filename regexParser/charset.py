@@ -1,29 +1,22 @@
 from parserGenerator.generator import CodeGenerator
+from parserGenerator.grammar import Grammar
 from parserGenerator.units import *
 
 
 packageName = "pythonGenerator"
 className = "CharSetGrammar"
 
-# Do it.
-code = CodeGenerator()
-
-# Header
-
-code.addLine("package " + packageName + ";\n")
-code.addLine("import at.searles.parsing.lexer.Lexer;")
-code.addLine("import at.searles.parsing.lexer.TokStream;")
-code.addLine("import at.searles.parsing.lexer.Token;")
-code.addLine("import at.searles.parsing.regex.CharSet;")
-code.addLine("import at.searles.parsing.regex.Regex;")
-
-# Start class
-
-code.beginBlock("public class " + className)
+imports = [
+    "at.searles.parsing.lexer.Lexer",
+    "at.searles.parsing.lexer.TokStream",
+    "at.searles.parsing.lexer.Token",
+    "at.searles.parsing.regex.CharSet",
+    "at.searles.parsing.regex.Regex",
+]
 
 # Lexer for charsets
 
-lexer = Lexer("lexer").declare(code)
+lexer = Lexer("lexer")
 
 # not allowed characters inside '[..]' are ]
 
@@ -33,23 +26,23 @@ lexer = Lexer("lexer").declare(code)
 # chr = '\' esc | .
 # esc = 'xNN' | 'uXXXX' | .   escaped
 
-hat = Token("hat", lexer, '"^"').declare(code)
-closebar = Token("closeBar", lexer, '"]"').declare(code)
-to = Token("to", lexer, '"-"').declare(code)
-backslash = Token("backslash", lexer, '"\\\\"').declare(code)
-allChars = Token("allChars", lexer, 'CharSet.all()').declare(code)
+hat = Token("hat", lexer, '"^"')
+closebar = Token("closeBar", lexer, '"]"')
+to = Token("to", lexer, '"-"')
+backslash = Token("backslash", lexer, '"\\\\"')
+allChars = Token("allChars", lexer, 'CharSet.all()')
 escapedChars = Token("escapedChars", lexer,
                 'CharSet.chars(\'x\').then(CharSet.interval(\'0\', \'9\').count(2))'
                 '.or(CharSet.chars(\'u\').then(CharSet.interval(\'0\', \'9\').count(4)))'
-                '.or(CharSet.all())').declare(code)
+                '.or(CharSet.all())')
 
 invert = FuncUnit("invert", ["CharSet"], ["CharSet"])
 invert.setBody("return set.invert();")
-invert.declare(code, ["set"])
+invert.setBody("return set.invert()", "python")
 
 add = FuncUnit("add", ["CharSet", "CharSet"], ["CharSet"])
 add.setBody("return set0.union(set1);")
-add.declare(code, ["set0", "set1"])
+add.setBody("return set0.union(set1)", "python")
 
 escaped = FuncUnit("escaped", ["CharSequence"], ["Character"])
 escaped.setBody("switch(seq.charAt(0)) {\n"
@@ -60,22 +53,21 @@ escaped.setBody("switch(seq.charAt(0)) {\n"
                 "case 't': return '\\t';\n"
                 "default: return seq.charAt(0);\n"
                 "}")
-
-escaped.declare(code, ["seq"])
+escaped.setBody("if seq[0] in 'xu':\n"
+                "    return chr(int(seq[1:], 16))\n"
+                "return {'n': '\\n', 'r': '\\r', 't': '\\t'}.get(seq[0], seq[0])", "python")
 
 normal = FuncUnit("normal", ["CharSequence"], ["Character"])
 normal.setBody("return seq.charAt(0);")
-normal.declare(code, ["seq"])
+normal.setBody("return seq[0]", "python")
 
 intervalSet = FuncUnit("intervalSet", ["Character", "Character"], ["CharSet"])
 intervalSet.setBody("return CharSet.interval(ch0, ch1);")
-intervalSet.declare(code, ["ch0", "ch1"])
+intervalSet.setBody("return CharSet.interval(ch0, ch1)", "python")
 
 singleSet = FuncUnit("singleSet", ["Character"], ["CharSet"])
 singleSet.setBody("return CharSet.chars(ch);")
-singleSet.declare(code, ["ch"])
-
-# These will be declared as members
+singleSet.setBody("return CharSet.chars(ch)", "python")
 
 # Part 3: Define Parsers
 # set = '^' decl | decl       invert
@@ -84,27 +76,37 @@ singleSet.declare(code, ["ch"])
 # chr = '\' esc | .
 # esc = 'xNN' | 'uXXXX' | .   escaped
 
-set = Parser("charSet", ["CharSet"], ["Regex"])
+set = Parser("charSet", ["CharSet"], ["CharSet"])
 decl = Parser("appendSet", ["CharSet"], ["CharSet"])
 interval = Parser("interval", [], ["CharSet"])
 chars = Parser("chr", [], ["Character"])
 
-chr = TokenParser("chars", allChars, normal).declare(code, [], "stream")
-esc = TokenParser("escapedChars", escapedChars, escaped).declare(code, [], "stream")
+chr = TokenParser("chars", allChars, normal)
+esc = TokenParser("escapedChars", escapedChars, escaped)
 
 # Grammar rules
 
-set.setDefinition(hat + decl + invert | decl).declare(code, ["set"], "stream")
-decl.setDefinition(interval + add + (closebar + Pass(["CharSet"]) | decl)).declare(code, ["set"], "stream")
-interval.setDefinition(chr + (to + chr + intervalSet | singleSet)).declare(code, [], "stream")
-chars.setDefinition(backslash + esc | chr).declare(code, [], "stream")
-
-
-# Error handling
-
-code.beginBlock("private void parsingError(TokStream stream, String expected)")
-code.addLine("throw new IllegalArgumentException(\"Expected \" + expected + \" at \" + stream);")
-code.endBlock()
-
-code.endBlock()
-
+set.setDefinition(hat + decl + invert | decl)
+decl.setDefinition(interval + add + (closebar + Pass(["CharSet"]) | decl))
+interval.setDefinition(chr + (to + chr + intervalSet | singleSet))
+chars.setDefinition(backslash + esc | chr)
+
+# The class, units that these use are declared as well.
+
+grammar = Grammar(packageName, className, imports)
+grammar.add(set, ["set"])
+grammar.add(decl, ["set"])
+grammar.add(chars)
+grammar.add(invert, ["set"])
+grammar.add(add, ["set0", "set1"])
+grammar.add(escaped, ["seq"])
+grammar.add(normal, ["seq"])
+grammar.add(intervalSet, ["ch0", "ch1"])
+grammar.add(singleSet, ["ch"])
+
+# Writes the grammar class to 'code'.
+def generate(code):
+    grammar.generate(code)
+
+if __name__ == "__main__":
+    generate(CodeGenerator())
@@ -1,39 +1,33 @@
 from parserGenerator.generator import CodeGenerator
+from parserGenerator.grammar import Grammar
 from parserGenerator.units import *
 
 
 packageName = "pythonGenerator"
 className = "QuotedGrammar"
 
-# Do it.
-code = CodeGenerator()
+imports = [
+    "at.searles.parsing.lexer.Lexer",
+    "at.searles.parsing.lexer.TokStream",
+    "at.searles.parsing.lexer.Token",
+    "at.searles.parsing.regex.CharSet",
+    "at.searles.parsing.regex.Regex",
+]
 
-# Header
+lexer = Lexer("lexer")
 
-code.addLine("package " + packageName + ";\n")
-code.addLine("import at.searles.parsing.lexer.Lexer;")
-code.addLine("import at.searles.parsing.lexer.TokStream;")
-code.addLine("import at.searles.parsing.lexer.Token;")
-code.addLine("import at.searles.parsing.regex.CharSet;")
-code.addLine("import at.searles.parsing.regex.Regex;")
-
-# Start class
-
-code.beginBlock("public class " + className)
-
-lexer = Lexer("lexer").declare(code)
-
-closequote = Token("closeQuote", lexer, '"\\""').declare(code)
-backslash = Token("backslash", lexer, '"\\\\"').declare(code)
-allChars = Token("allChars", lexer, 'CharSet.all()').declare(code)
+closequote = Token("closeQuote", lexer, '"\\""')
+backslash = Token("backslash", lexer, '"\\\\"')
+allChars = Token("allChars", lexer, 'CharSet.all()')
 escapedChars = Token("escapedChars", lexer,
                      'CharSet.chars(\'x\').then(CharSet.interval(\'0\', \'9\').count(2))'
                      '.or(CharSet.chars(\'u\').then(CharSet.interval(\'0\', \'9\').count(4)))'
-                     '.or(CharSet.all())').declare(code)
+                     '.or(CharSet.all())')
 
 append = FuncUnit("append", ["StringBuilder", "Character"], ["StringBuilder"])
 append.setBody("return sb.append(ch);")
-append.declare(code, ["sb", "ch"])
+append.setBody("sb.append(ch)\n"
+               "return sb", "python")
 
 escaped = FuncUnit("escaped", ["CharSequence"], ["Character"])
 escaped.setBody("switch(seq.charAt(0)) {\n"
@@ -44,30 +38,36 @@ escaped.setBody("switch(seq.charAt(0)) {\n"
                 "case 't': return '\\t';\n"
                 "default: return seq.charAt(0);\n"
                 "}")
-
-escaped.declare(code, ["seq"])
+escaped.setBody("if seq[0] in 'xu':\n"
+                "    return chr(int(seq[1:], 16))\n"
+                "return {'n': '\\n', 'r': '\\r', 't': '\\t'}.get(seq[0], seq[0])", "python")
 
 normal = FuncUnit("normal", ["CharSequence"], ["Character"])
 normal.setBody("return seq.charAt(0);")
-normal.declare(code, ["seq"])
+normal.setBody("return seq[0]", "python")
 
 string = Parser("string", ["StringBuilder"], ["StringBuilder"])
 chars = Parser("chr", [], ["Character"])
 
-chr = TokenParser("chars", allChars, normal).declare(code, [], "stream")
-esc = TokenParser("escapedChars", escapedChars, escaped).declare(code, [], "stream")
+chr = TokenParser("chars", allChars, normal)
+esc = TokenParser("escapedChars", escapedChars, escaped)
 
 # Grammar rules
 
-string.setDefinition(closequote + Pass(["StringBuilder"]) | chars + append + string).declare(code, ["sb"], "stream")
-chars.setDefinition(backslash + esc | chr).declare(code, [], "stream")
-
+string.setDefinition(closequote + Pass(["StringBuilder"]) | chars + append + string)
+chars.setDefinition(backslash + esc | chr)
 
-# Error handling
+# The class, units that these use are declared as well.
 
-code.beginBlock("private void parsingError(TokStream stream, String expected)")
-code.addLine("throw new IllegalArgumentException(\"Expected \" + expected + \" at \" + stream);")
-code.endBlock()
+grammar = Grammar(packageName, className, imports)
+grammar.add(string, ["sb"])
+grammar.add(append, ["sb", "ch"])
+grammar.add(escaped, ["seq"])
+grammar.add(normal, ["seq"])
 
-code.endBlock()
+# Writes the grammar class to 'code'.
+def generate(code):
+    grammar.generate(code)
 
+if __name__ == "__main__":
+    generate(CodeGenerator())
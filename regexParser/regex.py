@@ -1,55 +1,48 @@
 from parserGenerator.generator import CodeGenerator
+from parserGenerator.grammar import Grammar
 from parserGenerator.units import *
 
 
 packageName = "pythonGenerator"
 className = "RegexGrammar"
 
-# Do it.
-code = CodeGenerator()
+imports = [
+    "at.searles.parsing.lexer.Lexer",
+    "at.searles.parsing.lexer.TokStream",
+    "at.searles.parsing.lexer.Token",
+    "at.searles.parsing.regex.CharSet",
+    "at.searles.parsing.regex.Regex",
+]
 
-# Header
-
-code.addLine("package " + packageName + ";\n")
-code.addLine("import at.searles.parsing.lexer.Lexer;")
-code.addLine("import at.searles.parsing.lexer.TokStream;")
-code.addLine("import at.searles.parsing.lexer.Token;")
-code.addLine("import at.searles.parsing.regex.CharSet;")
-code.addLine("import at.searles.parsing.regex.Regex;")
-
-# Start class
-
-code.beginBlock("public class " + className)
-
-singleQuotedGrammar = Object("singleQuotedGrammar", "SingleQuotedGrammar").declare(code)
-quotedGrammar = Object("quotedGrammar", "QuotedGrammar").declare(code)
-charSetGrammar = Object("charSetGrammar", "CharSetGrammar").declare(code)
+singleQuotedGrammar = Object("singleQuotedGrammar", "SingleQuotedGrammar")
+quotedGrammar = Object("quotedGrammar", "QuotedGrammar")
+charSetGrammar = Object("charSetGrammar", "CharSetGrammar")
 
 singleQuote = singleQuotedGrammar.externCall("string", ["StringBuilder"], "StringBuilder", True)
 quote = quotedGrammar.externCall("string", ["StringBuilder"], "StringBuilder", True)
-charSet = charSetGrammar.externCall("set", ["CharSet"], "Regex", True)
+charSet = charSetGrammar.externCall("charSet", ["CharSet"], "Regex", True)
 
-lexer = Lexer("lexer").declare(code)
+lexer = Lexer("lexer")
 
-ws = HiddenToken("ws", lexer, "CharSet.chars('\\n', ' ')").declare(code)
+ws = HiddenToken("ws", lexer, "CharSet.chars('\\n', ' ')")
 
 numTok = Token("num", lexer,
-               "CharSet.chars('0').or(CharSet.interval('1', '9').then(CharSet.interval('0', '9').range(0, 5)))").declare(code)
-orTok = Token("orTok", lexer, '"|"').declare(code)
-open = Token("open", lexer, '"("').declare(code)
-close = Token("close", lexer, '")"').declare(code)
-openCur = Token("openCur", lexer, '"{"').declare(code)
-comma = Token("comma", lexer, '","').declare(code)
-closeCur = Token("closeCur", lexer, '"}"').declare(code)
-plusTok = Token("plus", lexer, '"+"').declare(code)
-repTok = Token("rep", lexer, '"*"').declare(code)
-optTok = Token("opt", lexer, '"?"').declare(code)
-eagerTok = Token("eager", lexer, '"!"').declare(code)
-dotTok = Token("dot", lexer, '"."').declare(code)
-
-openBra = Token("openBra", lexer, '"["').declare(code)
-openSingleQuote = Token("openSingleQute", lexer, '"\'"').declare(code)
-openQuote = Token("openQuote", lexer, '"\\""').declare(code)
+               "CharSet.chars('0').or(CharSet.interval('1', '9').then(CharSet.interval('0', '9').range(0, 5)))")
+orTok = Token("orTok", lexer, '"|"')
+open = Token("open", lexer, '"("')
+close = Token("close", lexer, '")"')
+openCur = Token("openCur", lexer, '"{"')
+comma = Token("comma", lexer, '","')
+closeCur = Token("closeCur", lexer, '"}"')
+plusTok = Token("plus", lexer, '"+"')
+repTok = Token("rep", lexer, '"*"')
+optTok = Token("opt", lexer, '"?"')
+eagerTok = Token("eager", lexer, '"!"')
+dotTok = Token("dot", lexer, '"."')
+
+openBra = Token("openBra", lexer, '"["')
+openSingleQuote = Token("openSingleQute", lexer, '"\'"')
+openQuote = Token("openQuote", lexer, '"\\""')
 
 toNum = FuncUnit("toNum", ["CharSequence"], ["Integer"])
 toNum.setBody("int n = 0;\n"
@@ -58,49 +51,49 @@ toNum.setBody("int n = 0;\n"
               "}\n"
               "\n"
               "return n;")
-toNum.declare(code, ["seq"])
+toNum.setBody("return int(seq)", "python")
 
-num = TokenParser("num", numTok, toNum).declare(code, [], "streamVar")
+num = TokenParser("num", numTok, toNum)
 
 orFn = FuncUnit("or", ["Regex", "Regex"], ["Regex"])
 orFn.setBody("return regex0.or(regex1);")
-orFn.declare(code, ["regex0", "regex1"])
+orFn.setBody("return regex0.or_(regex1)", "python")
 
 concatFn = FuncUnit("concat", ["Regex", "Regex"], ["Regex"])
 concatFn.setBody("return regex0.then(regex1);")
-concatFn.declare(code, ["regex0", "regex1"])
+concatFn.setBody("return regex0.then(regex1)", "python")
 
 repFn = FuncUnit("rep", ["Regex"], ["Regex"])
 repFn.setBody("return regex.rep();")
-repFn.declare(code, ["regex"])
+repFn.setBody("return regex.rep()", "python")
 
 optFn = FuncUnit("opt", ["Regex"], ["Regex"])
 optFn.setBody("return regex.opt();")
-optFn.declare(code, ["regex"])
+optFn.setBody("return regex.opt()", "python")
 
 plusFn = FuncUnit("plus", ["Regex"], ["Regex"])
 plusFn.setBody("return regex.plus();")
-plusFn.declare(code, ["regex"])
+plusFn.setBody("return regex.plus()", "python")
 
 nonGreedyFn = FuncUnit("nonGreedy", ["Regex"], ["Regex"])
 nonGreedyFn.setBody("return regex.nonGreedy();")
-nonGreedyFn.declare(code, ["regex"])
+nonGreedyFn.setBody("return regex.nonGreedy()", "python")
 
 rangeFn = FuncUnit("range", ["Regex", "Integer", "Integer"], ["Regex"])
 rangeFn.setBody("return regex.range(from, to);")
-rangeFn.declare(code, ["regex", "from", "to"])
+rangeFn.setBody("return regex.range(from_, to)", "python")
 
 minFn = FuncUnit("min", ["Regex", "Integer"], ["Regex"])
 minFn.setBody("return regex.min(min);")
-minFn.declare(code, ["regex", "min"])
+minFn.setBody("return regex.min(min)", "python")
 
 countFn = FuncUnit("count", ["Regex", "Integer"], ["Regex"])
 countFn.setBody("return regex.count(count);")
-countFn.declare(code, ["regex", "count"])
+countFn.setBody("return regex.count(count)", "python")
 
 textToRegexFn = FuncUnit("textToRegex", ["StringBuilder"], ["Regex"])
 textToRegexFn.setBody("return Regex.text(sb.toString());")
-textToRegexFn.declare(code, ["sb"])
+textToRegexFn.setBody("return Regex.text(\"\".join(sb))", "python")
 
 # Part 3: Define Parsers
 
@@ -113,11 +106,11 @@ term = Parser("term", [], ["Regex"])
 
 regex.setDefinition(
     concat + (orTok + concat + orFn).rep()
-).declare(code, [], "stream")
+)
 
 concat.setDefinition(
     qualified + (qualified + concatFn).rep()
-).declare(code, [], "stream")
+)
 
 qualified.setDefinition(
     term + (
@@ -130,21 +123,35 @@ qualified.setDefinition(
                 | countFn
             ) + closeCur
     ).rep()
-).declare(code, [], "stream")
+)
 
 term.setDefinition(
     openBra + Expr("CharSet.empty", [], ["CharSet"], False) + charSet |
-    openQuote + Expr("new StringBuilder", [], ["StringBuilder"], False) + quote + textToRegexFn |
-    openSingleQuote + Expr("new StringBuilder", [], ["StringBuilder"], False) + singleQuote + textToRegexFn |
+    openQuote + Expr("new StringBuilder", [], ["StringBuilder"], False).setCallCode("list", "python") + quote + textToRegexFn |
+    openSingleQuote + Expr("new StringBuilder", [], ["StringBuilder"], False).setCallCode("list", "python") + singleQuote + textToRegexFn |
     dotTok + Expr("CharSet.all", [], ["Regex"], False) |
     open + regex + close
-).declare(code, [], "stream")
-
-# Error handling
-
-code.beginBlock("private void parsingError(TokStream stream, String expected)")
-code.addLine("throw new IllegalArgumentException(\"Expected \" + expected + \" at \" + stream);")
-code.endBlock()
-
-code.endBlock()
-
+)
+
+# The class, units that these use are declared as well.
+
+grammar = Grammar(packageName, className, imports)
+grammar.add(regex)
+grammar.add(toNum, ["seq"])
+grammar.add(orFn, ["regex0", "regex1"])
+grammar.add(concatFn, ["regex0", "regex1"])
+grammar.add(repFn, ["regex"])
+grammar.add(optFn, ["regex"])
+grammar.add(plusFn, ["regex"])
+grammar.add(nonGreedyFn, ["regex"])
+grammar.add(rangeFn, ["regex", "from", "to"])
+grammar.add(minFn, ["regex", "min"])
+grammar.add(countFn, ["regex", "count"])
+grammar.add(textToRegexFn, ["sb"])
+
+# Writes the grammar class to 'code'.
+def generate(code):
+    grammar.generate(code)
+
+if __name__ == "__main__":
+    generate(CodeGenerator())
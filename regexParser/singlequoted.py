@@ -1,53 +1,55 @@
 from parserGenerator.generator import CodeGenerator
+from parserGenerator.grammar import Grammar
 from parserGenerator.units import *
 
 packageName = "pythonGenerator"
 className = "SingleQuotedGrammar"
 
-# Do it.
-code = CodeGenerator()
+imports = [
+    "at.searles.parsing.lexer.Lexer",
+    "at.searles.parsing.lexer.TokStream",
+    "at.searles.parsing.lexer.Token",
+    "at.searles.parsing.regex.CharSet",
+    "at.searles.parsing.regex.Regex",
+]
 
-# Header
+lexer = Lexer("lexer")
 
-code.addLine("package " + packageName + ";\n")
-code.addLine("import at.searles.parsing.lexer.Lexer;")
-code.addLine("import at.searles.parsing.lexer.TokStream;")
-code.addLine("import at.searles.parsing.lexer.Token;")
-code.addLine("import at.searles.parsing.regex.CharSet;")
-code.addLine("import at.searles.parsing.regex.Regex;")
-
-# Start class
-
-code.beginBlock("public class " + className)
-
-lexer = Lexer("lexer").declare(code)
-
-closequote = Token("closeQuote", lexer, '"\'"').declare(code)
-escapedChars = Token("escaped", lexer, 'Regex.text("\\\\\\\\").or(Regex.text("\\\\\\\'"))').declare(code)
-allChars = Token("allChars", lexer, 'CharSet.all()').declare(code)
+closequote = Token("closeQuote", lexer, '"\'"')
+escapedChars = Token("escaped", lexer, 'Regex.text("\\\\\\\\").or(Regex.text("\\\\\\\'"))')
+allChars = Token("allChars", lexer, 'CharSet.all()')
 
 appendEscaped = FuncUnit("appendEscaped", ["StringBuilder", "CharSequence"], ["StringBuilder"])
 appendEscaped.setBody("return sb.append(seq.charAt(1));")
-appendEscaped.declare(code, ["sb", "seq"])
+appendEscaped.setBody("sb.append(seq[1])\n"
+                      "return sb", "python")
 
 appendNormal = FuncUnit("appendNormal", ["StringBuilder", "CharSequence"], ["StringBuilder"])
 appendNormal.setBody("return sb.append(seq.charAt(0));")
-appendNormal.declare(code, ["sb", "seq"])
+appendNormal.setBody("sb.append(seq[0])\n"
+                     "return sb", "python")
 
 string = Parser("string", ["StringBuilder"], ["StringBuilder"])
 
-chr = TokenParser("normalChars", allChars, appendNormal).declare(code, ["sb"], "stream")
-esc = TokenParser("escapedChars", escapedChars, appendEscaped).declare(code, ["sb"], "stream")
+chr = TokenParser("normalChars", allChars, appendNormal)
+esc = TokenParser("escapedChars", escapedChars, appendEscaped)
 
 # Grammar rules
 
-string.setDefinition(closequote + Pass(["StringBuilder"]) | (esc | chr) + string).declare(code, ["sb"], "stream")
+string.setDefinition(closequote + Pass(["StringBuilder"]) | (esc | chr) + string)
 
-# Error handling
+# The class, units that these use are declared as well.
 
-code.beginBlock("private void parsingError(TokStream stream, String expected)")
-code.addLine("throw new IllegalArgumentException(\"Expected \" + expected + \" at \" + stream);")
-code.endBlock()
+grammar = Grammar(packageName, className, imports)
+grammar.add(string, ["sb"])
+grammar.add(chr, ["sb"])
+grammar.add(esc, ["sb"])
+grammar.add(appendEscaped, ["sb", "seq"])
+grammar.add(appendNormal, ["sb", "seq"])
 
-code.endBlock()
+# Writes the grammar class to 'code'.
+def generate(code):
+    grammar.generate(code)
 
+if __name__ == "__main__":
+    generate(CodeGenerator())
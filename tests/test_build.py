@@ -0,0 +1,120 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from parserGenerator.build import build, discover, findGrammarName
+
+# ItemGrammar parses an 'x', StatementGrammar uses it for 'x;'.
+itemScript = """from parserGenerator.grammar import Grammar
+from parserGenerator.units import *
+
+lexer = Lexer("lexer")
+x = Token("x", lexer, "\\"x\\"")
+toText = FuncUnit("toText", ["CharSequence"], ["String"]).setBody("return str(seq)", "python")
+item = Parser("item", [], ["String"])
+item.setDefinition(TokenParser("xText", x, toText))
+
+grammar = Grammar("buildTest", "ItemGrammar", [])
+grammar.add(item)
+grammar.add(toText, ["seq"])
+"""
+
+statementScript = """from parserGenerator.grammar import Grammar
+from parserGenerator.units import *
+
+items = Object("items", "ItemGrammar")
+item = items.externCall("item", [], "String", True)
+drop = FuncUnit("drop", ["String"], []).setBody("pass", "python")
+
+lexer = Lexer("lexer")
+semicolon = Token("semicolon", lexer, "\\";\\"")
+statement = Parser("statement", [], [])
+statement.setDefinition(item + semicolon + drop)
+
+statements = Grammar("buildTest", "StatementGrammar", [])
+statements.add(statement)
+statements.add(drop, ["a"])
+"""
+
+moduleNames = ["itemScript", "statementScript"]
+
+class BuildTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.out = os.path.join(self.root, "out")
+        self.write("itemScript", itemScript)
+        self.write("statementScript", statementScript)
+
+    def tearDown(self):
+        self.forget()
+
+        if self.root in sys.path:
+            sys.path.remove(self.root)
+
+        shutil.rmtree(self.root)
+
+    def write(self, moduleName, source):
+        with open(os.path.join(self.root, moduleName + ".py"), "w") as file:
+            file.write(source)
+
+    # Scripts are imported once per process, a build from the command line
+    # would import the changed ones again. Their bytecode is removed as
+    # well, an edit in the same second may keep the size of the file.
+    def forget(self):
+        for moduleName in moduleNames:
+            sys.modules.pop(moduleName, None)
+
+        shutil.rmtree(os.path.join(self.root, "__pycache__"), ignore_errors = True)
+
+    # moduleName -> status of the build.
+    def build(self, **arguments):
+        self.forget()
+        results = build(self.root, self.out, "python", {}, **arguments)
+        return dict((result.module.moduleName, result.status) for result in results)
+
+    def output(self, className):
+        with open(os.path.join(self.out, "buildTest", className + ".py")) as file:
+            return file.read()
+
+    def testDiscover(self):
+        os.makedirs(os.path.join(self.out, "buildTest"))
+        self.write(os.path.join("out", "buildTest", "Generated"), "grammar = Grammar('a', 'B')\n")
+        self.write("helper", "import os\n")
+
+        self.assertEqual(["itemScript", "statementScript"],
+                         [module.moduleName for module in discover(self.root, [self.out])])
+        self.assertEqual("statements", findGrammarName(statementScript.encode("utf-8")))
+        self.assertIsNone(findGrammarName(b"x = Grammar\n"))
+
+    def testUpToDate(self):
+        self.assertEqual({"itemScript": "built", "statementScript": "built"}, self.build(jobs = 1))
+        self.assertIn("class StatementGrammar", self.output("StatementGrammar"))
+        self.assertEqual({"itemScript": "upToDate", "statementScript": "upToDate"}, self.build(jobs = 1))
+
+        # the key of StatementGrammar contains the key of ItemGrammar.
+        self.write("itemScript", itemScript.replace("\\\"x\\\"", "\\\"y\\\""))
+        self.assertEqual({"itemScript": "built", "statementScript": "built"}, self.build(jobs = 1))
+        self.assertIn("token(\"y\")", self.output("ItemGrammar"))
+
+        self.write("statementScript", statementScript + "\n")
+        self.assertEqual({"itemScript": "upToDate", "statementScript": "built"}, self.build(jobs = 1))
+
+    def testFailedDependency(self):
+        # a loop that never ends is an error of the hazards pass.
+        self.write("itemScript", itemScript.replace("item.setDefinition(", "item.setDefinition(x.opt().rep() + "))
+        self.assertEqual({"itemScript": "failed", "statementScript": "skipped"}, self.build(jobs = 1))
+
+        self.write("itemScript", itemScript + "raise ValueError('broken')\n")
+        self.assertEqual({"itemScript": "failed", "statementScript": "skipped"}, self.build(jobs = 1))
+
+        self.write("itemScript", itemScript)
+        self.assertEqual({"itemScript": "built", "statementScript": "built"}, self.build(jobs = 1))
+
+    def testParallel(self):
+        self.assertEqual({"itemScript": "built", "statementScript": "built"}, self.build(jobs = 1))
+        outputs = [self.output("ItemGrammar"), self.output("StatementGrammar")]
+
+        self.assertEqual({"itemScript": "built", "statementScript": "built"}, self.build(jobs = 2, force = True))
+        self.assertEqual(outputs, [self.output("ItemGrammar"), self.output("StatementGrammar")])
@@ -0,0 +1,31 @@
+import unittest
+
+from parserGenerator.runtime import CharSet
+
+class CharSetTest(unittest.TestCase):
+    def testEquality(self):
+        digits = CharSet.interval('0', '9')
+        sets = [
+            digits,
+            CharSet.chars(*"0123456789"),
+            CharSet.interval('0', '4').union(CharSet.interval('5', '9')),
+            CharSet.interval('0', 'z').minus(CharSet.interval(':', 'z')),
+            digits.invert().invert(),
+        ]
+
+        for charSet in sets:
+            self.assertEqual(digits, charSet)
+            self.assertEqual(hash(digits), hash(charSet))
+
+        self.assertNotEqual(digits, CharSet.interval('0', '8'))
+        self.assertEqual(2, len({digits, CharSet.interval('0', '8'), CharSet.chars(*"0123456789")}))
+
+    def testContains(self):
+        charSet = CharSet.chars('a', 'c').union(CharSet.interval(0x1000, 0x2000))
+
+        self.assertEqual([True, False, True], [charSet.contains(ch) for ch in "abc"])
+        self.assertTrue(charSet.contains(0x1800))
+        self.assertFalse(charSet.contains(0x2001))
+
+if __name__ == "__main__":
+    unittest.main()
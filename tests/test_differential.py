@@ -0,0 +1,112 @@
+import random
+import unittest
+
+import benchmarks.throughput as throughput
+import parserGenerator.runtime as runtime
+
+from parserGenerator.generator import ListSink
+from parserGenerator.pythonBackend import PythonCodeGenerator, pythonName
+from parserGenerator.sentences import SentenceGenerator
+
+# Parses sentences of the demo grammars with the python backend in each
+# configuration of options and with the interpreter. Results and error
+# messages must be those of the python backend with the default options.
+# The sentences are created from the grammars, some of them lose a
+# character so that errors are compared too.
+
+configs = throughput.defaultConfigs + [
+    {"primitives": True},
+    {"leftRecursion": False, "tailCalls": False},
+    {"profile": True, "profileTime": True},
+    {"tables": True},
+    {"tables": True, "release": True, "dfa": True},
+]
+
+# Returns (result, position) or (error type, message) of 'parse'.
+def outcome(parse, arguments, text):
+    stream = runtime.TokStream(text)
+
+    try:
+        result = parse(*(arguments() + [stream]))
+    except Exception as e:
+        return type(e).__name__, str(e)
+
+
+    return str(result), stream.pos
+
+def pythonParsers(options):
+    classes = {}
+
+    for module in throughput.grammarModules:
+        code = PythonCodeGenerator(ListSink(), **options)
+        module.generate(code)
+        classes[module] = code.load()
+
+    parsers = {}
+
+    for name, (module, parser, arguments) in throughput.workloads.items():
+        method = getattr(classes[module](), pythonName(parser.name))
+
+        if options.get("primitives") and parser.returnTypes[0] in PythonCodeGenerator.primitiveTypes:
+            method = checkedParser(method)
+
+        parsers[name] = method
+
+    return parsers
+
+# Parsers that return primitive values report failures in a field.
+def checkedParser(method):
+    def parse(*arguments):
+        result = method(*arguments)
+        return result if method.__self__._succeeded else None
+
+    return parse
+
+def interpreterParsers(options):
+    interpreter = throughput.Interpreter(throughput.pythonFunctions(), options.get("dfa", False))
+
+    for name, parser in throughput.externParsers.items():
+        interpreter.functions[name] = interpreter.parser(parser)
+
+    return dict((name, interpreter.parser(parser)) for name, (module, parser, arguments)
+                in throughput.workloads.items())
+
+class DifferentialTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.texts = {}
+        generator = SentenceGenerator(throughput.externParsers, maxDepth = 6, seed = 3)
+        random.seed(3)
+
+        for name, (module, parser, arguments) in throughput.workloads.items():
+            texts = [generator.sentence(parser)[0] for i in range(150)]
+            texts += [text[:i] + text[i + 1:] for text in texts[:100] if text
+                      for i in [random.randrange(len(text))]]
+            cls.texts[name] = texts
+
+        cls.reference = cls.outcomes(pythonParsers({}))
+
+    @classmethod
+    def outcomes(cls, parsers):
+        return dict((name, [outcome(parsers[name], throughput.workloads[name][2], text)
+                            for text in cls.texts[name]]) for name in parsers)
+
+    def assertSameOutcomes(self, outcomes, label):
+        for name, results in outcomes.items():
+            for text, expected, actual in zip(self.texts[name], self.reference[name], results):
+                self.assertEqual(expected, actual, label + ", " + name + ": " + repr(text))
+
+    def testOptions(self):
+        for options in configs:
+            self.assertSameOutcomes(self.outcomes(pythonParsers(options)), str(options))
+
+    def testInterpreter(self):
+        for options in ({}, {"dfa": True}):
+            self.assertSameOutcomes(self.outcomes(interpreterParsers(options)), "interpreter " + str(options))
+
+    def testErrorsAreCompared(self):
+        for name, results in self.reference.items():
+            self.assertTrue(any(isinstance(result[1], str) for result in results), name)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import benchmarks.throughput as throughput
+
+from parserGenerator.fragments import FragmentCache, fragmentVersion
+from parserGenerator.generator import CodeGenerator, ListSink
+from parserGenerator.pythonBackend import PythonCodeGenerator
+
+configs = [
+    {},
+    {"dispatch": True, "dfa": True, "release": True},
+    {"errorSites": True, "profile": True},
+]
+
+# Generates the demo grammars into one text, the grammars share 'cache'.
+def generateAll(generator, options, cache):
+    code = generator(ListSink(), **options)
+
+    for module in throughput.grammarModules:
+        module.grammar.fragmentCache = cache
+
+        try:
+            module.generate(code)
+        finally:
+            module.grammar.fragmentCache = None
+
+    return code.getvalue()
+
+class FragmentCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def sizeOnDisk(self):
+        return sum(os.path.getsize(os.path.join(directory, fileName))
+                   for directory, directoryNames, fileNames in os.walk(self.directory) for fileName in fileNames)
+
+    def testSameOutput(self):
+        for generator in (PythonCodeGenerator, CodeGenerator):
+            for options in configs:
+                name = generator.__name__ + " " + str(options)
+                expected = generateAll(generator, options, None)
+
+                first = FragmentCache(self.directory)
+                self.assertEqual(expected, generateAll(generator, options, first), name)
+
+                second = FragmentCache(self.directory)
+                self.assertEqual(expected, generateAll(generator, options, second), name)
+                self.assertGreater(second.hits, 0, name)
+                self.assertEqual(0, second.misses, name)
+
+    def testEviction(self):
+        expected = generateAll(PythonCodeGenerator, {}, None)
+
+        cache = FragmentCache(self.directory, 4096)
+        self.assertEqual(expected, generateAll(PythonCodeGenerator, {}, cache))
+        self.assertGreater(cache.evictions, 0)
+        self.assertLessEqual(self.sizeOnDisk(), 4096)
+
+        # the evicted fragments are generated again.
+        cache = FragmentCache(self.directory, 4096)
+        self.assertEqual(expected, generateAll(PythonCodeGenerator, {}, cache))
+        self.assertGreater(cache.misses, 0)
+
+    def testLeastRecentlyUsed(self):
+        cache = FragmentCache(self.directory)
+
+        for time, key in enumerate(["aa", "bb", "cc"]):
+            cache.store(key, {"text": key})
+            os.utime(cache.path(key), (time, time))
+
+        size = len(json.dumps({"text": "aa", "version": fragmentVersion}, sort_keys = True))
+
+        # 'aa' is the most recently used fragment after the hit.
+        cache = FragmentCache(self.directory, 2 * size)
+        self.assertEqual("aa", cache.load("aa")["text"])
+        cache.store("dd", {"text": "dd"})
+
+        self.assertEqual(2, cache.evictions)
+        self.assertEqual(["aa", "dd"], [key for key in ["aa", "bb", "cc", "dd"] if cache.load(key) is not None])
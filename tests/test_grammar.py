@@ -0,0 +1,37 @@
+import unittest
+
+import integerDemo as demo
+
+from parserGenerator.generator import ListSink
+from parserGenerator.grammar import Grammar
+from parserGenerator.pythonBackend import PythonCodeGenerator
+from parserGenerator.runtime import TokStream
+from parserGenerator.units import *
+
+# s = s plus num add | num. Rewriting changes the parser, hence each call
+# creates a new one.
+def leftRecursiveGrammar():
+    s = Parser("s", [], ["Integer"])
+    s.setDefinition(s + demo.plus + demo.num + demo.add | demo.num)
+
+    grammar = Grammar("grammarTest", "LeftRecursive", [])
+    grammar.add(s)
+    grammar.add(demo.toNum, ["seq"])
+    grammar.add(demo.add, ["a", "b"])
+    return grammar, s
+
+class GrammarTest(unittest.TestCase):
+    def generate(self, options):
+        grammar, s = leftRecursiveGrammar()
+        code = PythonCodeGenerator(ListSink(), **options)
+        grammar.generate(code)
+        return code, s
+
+    def testLeftRecursionOption(self):
+        rewritten, s = self.generate({})
+        kept, t = self.generate({"leftRecursion": False})
+
+        self.assertEqual("num (plus num add)*", str(s.definition))
+        self.assertEqual("s plus num add | num", str(t.definition))
+        self.assertNotEqual(rewritten.getvalue(), kept.getvalue())
+        self.assertEqual(6, rewritten.load()().s(TokStream("1+2+3")))
@@ -0,0 +1,71 @@
+import unittest
+
+from parserGenerator.generator import ListSink
+from parserGenerator.grammar import Grammar
+from parserGenerator.hazards import findHazards
+from parserGenerator.pythonBackend import PythonCodeGenerator
+from parserGenerator.units import *
+
+lexer = Lexer("lexer")
+a, b, c, d = [Token(name, lexer, "\"" + name + "\"") for name in "abcd"]
+ab = Parser("ab", [], [])
+ab.setDefinition(a | b)
+
+# Returns a new parser whose definition is 'define(parser)'.
+def parser(name, define):
+    unit = Parser(name, [], [])
+    unit.setDefinition(define(unit))
+    return unit
+
+class HazardsTest(unittest.TestCase):
+    # (definition, hazard)
+    cases = [
+        (lambda p: a.opt().rep() + b,
+         "error nullableRep: p: 'a?*' loops forever, 'a?' can succeed without consuming input"),
+        (lambda p: p + a | b,
+         "warning leftRecursion: p: left recursive (p), the leftRecursion pass turns it into a loop"),
+        (lambda p: a.opt() + p + b | c,
+         "error leftRecursion: p: left recursive (p) through units that can be empty, it never returns"),
+        (lambda p: a + p | b + p,
+         "error unproductive: p: never succeeds, each alternative calls it again"),
+        (lambda p: a.opt() | b,
+         "warning unreachableAlternative: p: 1 alternative(s) after 'a?' in 'a? | b' are never tried, it cannot fail"),
+        (lambda p: a + b | a + c,
+         "warning shadowedAlternative: p: 'a c' is never chosen, it starts like alternative 1 of 'a b | a c'"),
+        (lambda p: ab + c | b + d,
+         "warning shadowedAlternative: p: 'b d' is never chosen, earlier alternatives of 'ab c | b d' "
+         "start with the same tokens"),
+        (lambda p: a + c | ab + d,
+         "warning firstOverlap: p: 'ab d' is not chosen on a, earlier alternatives of 'a c | ab d' start with them"),
+    ]
+
+    def testKinds(self):
+        for define, hazard in self.cases:
+            self.assertEqual([hazard], [str(found) for found in findHazards([parser("p", define)])])
+
+    def testNoHazards(self):
+        self.assertEqual([], findHazards([parser("p", lambda p: a + p.opt() + b | c)]))
+
+    def testPath(self):
+        inner = parser("inner", lambda p: a.opt() | b)
+        outer = parser("outer", lambda p: c + inner)
+
+        self.assertEqual(["outer", "inner"], findHazards([outer])[0].path)
+
+    def testErrorStopsGeneration(self):
+        grammar = Grammar("hazardsTest", "Loops", []).add(parser("p", lambda p: a.opt().rep() + b))
+
+        with self.assertRaises(TypeError) as context:
+            grammar.generate(PythonCodeGenerator(ListSink()))
+
+        self.assertIn("hazards in Loops:\nerror nullableRep: p:", str(context.exception))
+
+    def testWarningsAreKept(self):
+        grammar = Grammar("hazardsTest", "Shadowed", []).add(parser("p", lambda p: a + b | a + c))
+        code = PythonCodeGenerator(ListSink())
+        grammar.generate(code)
+
+        self.assertEqual(["shadowedAlternative"], [hazard.kind for hazard in grammar.hazards])
+        self.assertFalse(grammar.hazards[0].isError())
+        self.assertEqual(grammar.hazards, grammar.passes.results["hazards"])
+        self.assertIn("def p(self, stream)", code.getvalue())
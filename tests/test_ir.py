@@ -0,0 +1,72 @@
+import re
+import unittest
+
+from parserGenerator.generator import CodeGenerator, ListSink
+from parserGenerator.grammar import Grammar
+from parserGenerator.pythonBackend import PythonCodeGenerator
+from parserGenerator.runtime import ParseError, TokStream
+from parserGenerator.units import *
+
+# s = num plus num add, the first number is live while the second one is
+# parsed.
+lexer = Lexer("lexer")
+plus = Token("plus", lexer, "\"+\"")
+digit = Token("digit", lexer, "CharSet.interval('0', '9')")
+toNum = FuncUnit("toNum", ["CharSequence"], ["Integer"])
+toNum.setBody("return seq.charAt(0) - '0';").setBody("return ord(seq[0]) - ord('0')", "python")
+add = FuncUnit("add", ["Integer", "Integer"], ["Integer"])
+add.setBody("return a + b;").setBody("return a + b", "python")
+num = TokenParser("num", digit, toNum)
+s = Parser("s", [], ["Integer"])
+s.setDefinition(num + plus + num + add)
+
+def generate(generator, optimizeLocals):
+    code = generator(ListSink(), optimizeLocals = optimizeLocals)
+    Grammar("irTest", "Sum", []).add(s).add(toNum, ["seq"]).add(add, ["a", "b"]).generate(code)
+    return code
+
+# Returns the text of the method s.
+def methodText(text, header):
+    start = text.index(header)
+    return text[start:text.index("return var0", start)]
+
+# (result, position) or the error message of s.
+def parse(parser, text):
+    stream = TokStream(text)
+
+    try:
+        return parser.s(stream), stream.pos
+    except ParseError as e:
+        return str(e)
+
+class OptimizeLocalsTest(unittest.TestCase):
+    def testJavaDeclarations(self):
+        declaration = re.compile(r"^\s*Integer (var\d+)( = [^;]*)?;$", re.MULTILINE)
+
+        before = methodText(generate(CodeGenerator, False).getvalue(), "public Integer s(")
+        self.assertEqual(["var0", "var1", "var2", "var3"], [match.group(1) for match in declaration.finditer(before)])
+        self.assertIn("Integer var2 = null;", before)
+
+        # the second number and the sum reuse var0, var1 holds the first
+        # number while the second one is parsed.
+        after = methodText(generate(CodeGenerator, True).getvalue(), "public Integer s(")
+        self.assertEqual([("var0", " = null"), ("var1", " = num(stream)")],
+                         [match.groups() for match in declaration.finditer(after)])
+        self.assertIn("var0 = add(var1, var0);", after)
+
+    def testPythonAssignments(self):
+        before = methodText(generate(PythonCodeGenerator, False).getvalue(), "def s(")
+        after = methodText(generate(PythonCodeGenerator, True).getvalue(), "def s(")
+
+        self.assertIn("var2 = None", before)
+        self.assertEqual(["var0 = None"], re.findall(r"var\d+ = None", after))
+        self.assertIn("var0 = self.add_(var1, var0)", after)
+
+    def testSameLanguage(self):
+        before = generate(PythonCodeGenerator, False).load()()
+        after = generate(PythonCodeGenerator, True).load()()
+
+        for text in ["1+2", "1+", "1", "+2", "12"]:
+            self.assertEqual(parse(before, text), parse(after, text), text)
+
+        self.assertEqual((3, 3), parse(after, "1+2"))
@@ -0,0 +1,82 @@
+import unittest
+
+from parserGenerator.generator import CodeGenerator, ListSink
+from parserGenerator.grammar import Grammar
+from parserGenerator.interpreter import Interpreter
+from parserGenerator.pythonBackend import PythonCodeGenerator
+from parserGenerator.runtime import ParseError, TokStream
+from parserGenerator.transform import leftFactor
+from parserGenerator.units import *
+
+# (text, accepted before factoring) where 'a c y' failed after 'a'.
+cases = [("abx", True), ("d", True), ("x", True), ("acy", False), ("ab", False), ("ax", False)]
+
+# s = a b x | a c y | d. Factoring changes the parser, hence each call
+# creates a new one.
+def choices():
+    lexer = Lexer("lexer")
+    a, b, c, d, x, y = [Token(name, lexer, "\"" + name + "\"") for name in "abcdxy"]
+    s = Parser("s", [], [])
+    s.setDefinition(a + b + x | a + c + y | d)
+    return s
+
+# (result, position) or the error message.
+def outcome(parse, text):
+    stream = TokStream(text)
+
+    try:
+        return parse(stream), stream.pos
+    except ParseError as e:
+        return str(e)
+
+def pythonParser(options):
+    code = PythonCodeGenerator(ListSink(), **options)
+    Grammar("factoringTest", "Choices", []).add(choices()).generate(code)
+    return code.load()()
+
+class LeftFactoringTest(unittest.TestCase):
+    def testRewrite(self):
+        s = choices()
+        rewrites = leftFactor([s])
+
+        self.assertEqual("a (b x | c y) | d", str(s.definition))
+        self.assertEqual([s], [rewrite.parser for rewrite in rewrites])
+        self.assertEqual("a b x | a c y | d", rewrites[0].before)
+
+    def testPrepare(self):
+        s = choices()
+        PythonCodeGenerator(ListSink()).prepare(s)
+        self.assertEqual("a b x | a c y | d", str(s.definition))
+
+        PythonCodeGenerator(ListSink(), leftFactoring = True).prepare(s)
+        self.assertEqual("a (b x | c y) | d", str(s.definition))
+
+    def check(self, before, after):
+        for text, accepted in cases:
+            if accepted:
+                self.assertEqual(outcome(before, text), outcome(after, text), text)
+            else:
+                self.assertIsInstance(outcome(before, text), str, text)
+
+        self.assertEqual((True, 3), outcome(after, "acy"))
+        self.assertEqual("Expected b x | c y at 1:2 ('x')", outcome(after, "ax"))
+
+    def testPython(self):
+        self.check(pythonParser({}).s, pythonParser({"leftFactoring": True}).s)
+
+    def testTables(self):
+        self.check(pythonParser({}).s, pythonParser({"leftFactoring": True, "tables": True}).s)
+
+    def testInterpreter(self):
+        interpreter = Interpreter()
+        before = choices()
+        after = choices()
+        leftFactor([after])
+
+        self.check(interpreter.parser(before), interpreter.parser(after))
+
+    def testJava(self):
+        code = CodeGenerator(ListSink(), leftFactoring = True)
+        Grammar("factoringTest", "Choices", []).add(choices()).generate(code)
+
+        self.assertIn("/* a (b x | c y) | d */", code.getvalue())
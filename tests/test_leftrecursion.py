@@ -0,0 +1,95 @@
+import unittest
+
+import integerDemo as demo
+
+from parserGenerator.generator import ListSink
+from parserGenerator.grammar import Grammar
+from parserGenerator.interpreter import Interpreter
+from parserGenerator.pythonBackend import PythonCodeGenerator
+from parserGenerator.runtime import ParseError, TokStream
+from parserGenerator.transform import eliminateLeftRecursion
+from parserGenerator.units import *
+
+functions = {
+    demo.toNum: lambda seq: int(seq),
+    demo.add: lambda a, b: a + b,
+    demo.sub: lambda a, b: a - b
+}
+
+# a = b plus num add | num, b = a minus num sub | num. Parsers are changed
+# by the rewriting, hence each test creates its own.
+def indirectParsers():
+    a = Parser("a", [], ["Integer"])
+    b = Parser("b", [], ["Integer"])
+    a.setDefinition(b + demo.plus + demo.num + demo.add | demo.num)
+    b.setDefinition(a + demo.minus + demo.num + demo.sub | demo.num)
+    return a, b
+
+def pythonGrammar(a, b):
+    grammar = Grammar("leftRecursion", "Indirect", [])
+    grammar.add(a)
+    grammar.add(b)
+    grammar.add(demo.toNum, ["seq"])
+    grammar.add(demo.add, ["a", "b"])
+    grammar.add(demo.sub, ["a", "b"])
+    code = PythonCodeGenerator(ListSink())
+    grammar.generate(code)
+    return code.load()()
+
+class LeftRecursionTest(unittest.TestCase):
+    # (text, result of a, result of b), None if the text is not accepted.
+    cases = [
+        ("5", 5, 5),
+        ("5+1", 6, None),
+        ("5-1", None, 4),
+        ("5-1+2", 6, None),
+        ("5+1-2", None, 4),
+        ("5-1+2-3+4", 7, None),
+        ("5+1-2+3-4", None, 3)
+    ]
+
+    def testIndirect(self):
+        a, b = indirectParsers()
+        grammar = pythonGrammar(a, b)
+
+        for text, resultA, resultB in self.cases:
+            for parse, expected in ((grammar.a, resultA), (grammar.b, resultB)):
+                if expected is None:
+                    self.assertRaises(ParseError, parse, TokStream(text))
+                else:
+                    self.assertEqual(expected, parse(TokStream(text)), text)
+
+    def testInterpreter(self):
+        a, b = indirectParsers()
+        interpreter = Interpreter(functions)
+
+        for text, resultA, resultB in self.cases:
+            for parser, expected in ((a, resultA), (b, resultB)):
+                if expected is None:
+                    self.assertRaises(ParseError, interpreter.parse, parser, text)
+                else:
+                    self.assertEqual(expected, interpreter.parse(parser, text), text)
+
+    def testRewrites(self):
+        a, b = indirectParsers()
+        eliminateLeftRecursion([a])
+
+        self.assertEqual("num (plus num add)? (minus num sub plus num add)*", str(a.definition))
+        self.assertEqual("num (minus num sub)? (plus num add minus num sub)*", str(b.definition))
+
+    def testConflict(self):
+        # both alternatives of a start with the token num after b is
+        # inlined, the second one would never be tried.
+        a, b = indirectParsers()
+        digit = TokenParser("digit", demo.numTok, demo.toNum)
+        a.setDefinition(b + demo.plus + demo.num + demo.add | digit)
+
+        self.assertRaises(TypeError, eliminateLeftRecursion, [a])
+
+    def testNestedCycles(self):
+        a, b = indirectParsers()
+        c = Parser("c", [], ["Integer"])
+        b.setDefinition(a + demo.minus + demo.num + demo.sub | c + demo.plus + demo.num + demo.add | demo.num)
+        c.setDefinition(b + demo.minus + demo.num + demo.sub | demo.num)
+
+        self.assertRaises(TypeError, eliminateLeftRecursion, [a])
@@ -0,0 +1,54 @@
+import unittest
+
+from parserGenerator.dfa import compileDfa
+from parserGenerator.generator import ListSink
+from parserGenerator.grammar import Grammar
+from parserGenerator.interpreter import Interpreter
+from parserGenerator.pythonBackend import PythonCodeGenerator
+from parserGenerator.runtime import TokStream, evalRegex
+from parserGenerator.units import Lexer, Parser, Token
+
+# Token definitions, a text and the end of the longest match of the token
+# in it. The first alternative that matches is shorter for most of them.
+cases = [
+    ('Regex.text("a").or(Regex.text("ab"))', "ab", 2),
+    ('Regex.text("a").or(Regex.text("ab")).then(Regex.text("c").opt())', "abc", 3),
+    ("CharSet.chars('a').opt().then(Regex.text(\"ab\").opt())", "ab", 2),
+    ("CharSet.chars('a').rep().then(Regex.text(\"ab\").opt())", "aab", 3),
+    ('Regex.text("/*").then(CharSet.all().rep().nonGreedy()).then(Regex.text("*/"))', "/* a */ b */", 7),
+    ("CharSet.interval('0', '9').plus()", "123x", 3),
+]
+
+# The parser 'start' that recognizes the token of 'definition'.
+def tokenParser(definition):
+    lexer = Lexer("lexer")
+    token = Token("token", lexer, definition)
+    start = Parser("start", [], [])
+    start.setDefinition(token)
+    return start
+
+def generatedParser(start, options):
+    grammar = Grammar("lexerTest", "Grammar" + str(len(options)), [])
+    grammar.add(start)
+    code = PythonCodeGenerator(ListSink(), **options)
+    grammar.generate(code)
+    return code.load()().start
+
+class LongestMatchTest(unittest.TestCase):
+    def testDfaOption(self):
+        for definition, text, end in cases:
+            start = tokenParser(definition)
+            parsers = [generatedParser(start, {}), generatedParser(start, {"dfa": True}),
+                       Interpreter({}).parser(start), Interpreter({}, True).parser(start)]
+
+            for i, parser in enumerate(parsers):
+                stream = TokStream(text)
+                self.assertTrue(parser(stream), definition)
+                self.assertEqual(end, stream.pos, definition + ", parser " + str(i))
+
+    def testDfa(self):
+        for definition, text, end in cases:
+            self.assertEqual({0: end}, compileDfa([evalRegex(definition)]).match(text, 0), definition)
+
+if __name__ == "__main__":
+    unittest.main()
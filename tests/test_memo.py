@@ -0,0 +1,65 @@
+import unittest
+
+import integerDemo
+
+from parserGenerator.generator import CodeGenerator, ListSink
+from parserGenerator.pythonBackend import PythonCodeGenerator
+from parserGenerator.runtime import ParseError, TokStream
+
+texts = ["1+2*(3-4)/1", "7*7", "-(2+3)*4", "1+", "(1"]
+
+def memoize(memoize):
+    for parser in (integerDemo.product, integerDemo.term):
+        parser.setMemoize(memoize)
+
+# Results or error messages of sum.
+def parse(grammar, text):
+    try:
+        return grammar.sum(TokStream(text))
+    except ParseError as e:
+        return str(e)
+
+class MemoTest(unittest.TestCase):
+    def setUp(self):
+        memoize(True)
+
+    def tearDown(self):
+        memoize(False)
+
+    def generate(self, generator, options):
+        code = generator(ListSink(), **options)
+        integerDemo.generate(code)
+        return code
+
+    def testResults(self):
+        for options in ({}, {"primitives": True}, {"dispatch": True, "release": True}):
+            memoized = self.generate(PythonCodeGenerator, options).load()()
+            memoize(False)
+            plain = self.generate(PythonCodeGenerator, options).load()()
+            memoize(True)
+
+            for text in texts:
+                self.assertEqual(parse(plain, text), parse(memoized, text), text)
+
+    def testInstances(self):
+        options = {"profile": True, "errorSites": True}
+        grammarClass = self.generate(PythonCodeGenerator, options).load()
+        first = grammarClass()
+        second = grammarClass()
+
+        self.assertEqual(-1, first.sum(TokStream("1+2*(3-4)/1")))
+        self.assertEqual(49, second.sum(TokStream("7*7")))
+        self.assertIsNot(first._productMemo, second._productMemo)
+        self.assertIsNot(first.parseError(), second.parseError())
+        self.assertEqual(2, first.profileSnapshot()["sum"][0])
+        self.assertEqual(1, second.profileSnapshot()["sum"][0])
+
+        first.resetProfile()
+        self.assertEqual(1, second.profileSnapshot()["sum"][0])
+
+    def testJava(self):
+        code = self.generate(CodeGenerator, {}).getvalue()
+
+        self.assertIn("private Integer productUnmemoized(TokStream stream)", code)
+        self.assertIn("int entry = productMemo.find(stream, start);", code)
+        self.assertNotIn("HashMap", code)
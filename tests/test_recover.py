@@ -0,0 +1,67 @@
+import unittest
+
+import integerDemo as demo
+
+from parserGenerator.generator import ListSink
+from parserGenerator.grammar import Grammar
+from parserGenerator.interpreter import Interpreter
+from parserGenerator.pythonBackend import PythonCodeGenerator
+from parserGenerator.runtime import ParseError, TokStream
+from parserGenerator.units import *
+
+# statements = Recover(statement, semicolon)* with statement = sum
+# semicolon, where sum is parsed by the class of integerDemo (another
+# grammar). Its errors must not be recovered from.
+sums = Object("sums", demo.className)
+sumCall = sums.externCall("sum", [], "Integer", True)
+drop = FuncUnit("drop", ["Integer"], []).setBody("pass", "python")
+
+lexer = Lexer("lexer")
+semicolon = Token("semicolon", lexer, "\";\"")
+statement = Parser("statement", [], [])
+statement.setDefinition(sumCall + semicolon + drop)
+statements = Parser("statements", [], [])
+statements.setDefinition(Recover(statement, semicolon).rep())
+
+def sumGrammar():
+    code = PythonCodeGenerator(ListSink())
+    demo.generate(code)
+    return code.load()
+
+class RecoverTest(unittest.TestCase):
+    # (text, collected errors) or (text, None) if the text is rejected.
+    cases = [
+        ("1;2;", []),
+        ("1 2;3;", ["Expected semicolon at 1:2 (' 2;3;')"]),
+        ("1;2+;3;", None)
+    ]
+
+    def testGenerated(self):
+        sumGrammar()
+        code = PythonCodeGenerator(ListSink(), errorSites = True)
+        Grammar(demo.packageName, "Statements", []).add(statements).add(drop, ["a"]).generate(code)
+        grammarClass = code.load()
+
+        for text, errors in self.cases:
+            grammar = grammarClass()
+
+            if errors is None:
+                self.assertRaises(ParseError, grammar.statements, TokStream(text))
+            else:
+                self.assertTrue(grammar.statements(TokStream(text)))
+                self.assertEqual(len(errors), grammar.parseError().errorCount())
+
+    def testInterpreter(self):
+        nested = sumGrammar()()
+
+        for text, errors in self.cases:
+            interpreter = Interpreter({sumCall: nested.sum, drop: lambda a: None})
+
+            if errors is None:
+                with self.assertRaises(ParseError) as context:
+                    interpreter.parse(statements, text)
+
+                self.assertEqual("Expected product at 1:5 (';3;')", str(context.exception))
+            else:
+                self.assertTrue(interpreter.parse(statements, text))
+                self.assertEqual(errors, interpreter.errors)
@@ -0,0 +1,59 @@
+import unittest
+
+from parserGenerator.generator import CodeGenerator, ListSink
+from parserGenerator.grammar import Grammar
+from parserGenerator.pythonBackend import PythonCodeGenerator
+from parserGenerator.runtime import ParseError, TokStream
+from parserGenerator.units import *
+
+texts = ["abx", "acy", "d", "ab", "ax", "x", ""]
+
+# s = a b x | a c y | d or, if not 'overlapping', s = a (b x | c y) | d.
+def grammar(overlapping):
+    lexer = Lexer("lexer")
+    a, b, c, d, x, y = [Token(name, lexer, "\"" + name + "\"") for name in "abcdxy"]
+    s = Parser("s", [], [])
+
+    if overlapping:
+        s.setDefinition(a + b + x | a + c + y | d)
+    else:
+        s.setDefinition(a + (b + x | c + y) | d)
+
+    return Grammar("tablesTest", "Choices", []).add(s)
+
+# (result, position) or the error message of s.
+def parse(parser, text):
+    stream = TokStream(text)
+
+    try:
+        return parser.s(stream), stream.pos
+    except ParseError as e:
+        return str(e)
+
+def pythonParser(overlapping, options):
+    code = PythonCodeGenerator(ListSink(), **options)
+    grammar(overlapping).generate(code)
+    return code.load()()
+
+class TablesTest(unittest.TestCase):
+    def testSameLanguage(self):
+        methods = pythonParser(False, {})
+
+        for options in ({"tables": True}, {"tables": True, "release": True}):
+            tables = pythonParser(False, options)
+
+            for text in texts:
+                self.assertEqual(parse(methods, text), parse(tables, text), text + " " + str(options))
+
+    def testOverlappingFirst(self):
+        # the methods commit to 'a b x' after 'a', tables are only built
+        # for LL(1) choices.
+        methods = pythonParser(True, {})
+        self.assertEqual((True, 3), parse(methods, "abx"))
+        self.assertIsInstance(parse(methods, "acy"), str)
+
+        for generator in (PythonCodeGenerator, CodeGenerator):
+            with self.assertRaises(TypeError) as context:
+                grammar(True).generate(generator(ListSink(), tables = True))
+
+            self.assertIn("starts with a like an earlier alternative", str(context.exception))
@@ -0,0 +1,44 @@
+import unittest
+
+from parserGenerator.analysis import tailCalls
+from parserGenerator.generator import ListSink
+from parserGenerator.pythonBackend import PythonCodeGenerator
+from parserGenerator.runtime import CharSet, ParseError, TokStream
+from regexParser import charset
+
+def charSetGrammar(options):
+    code = PythonCodeGenerator(ListSink(), **options)
+    charset.generate(code)
+    return code.load()()
+
+# Results or error messages of charSet.
+def parse(grammar, text):
+    try:
+        return grammar.charSet(CharSet.empty(), TokStream(text))
+    except ParseError as e:
+        return str(e)
+
+class TailCallTest(unittest.TestCase):
+    def testLastAlternative(self):
+        # appendSet = interval add (closeBar Pass | appendSet)
+        tails, reported = tailCalls(charset.decl)
+
+        self.assertEqual({charset.decl.definition.elements[-1]}, tails)
+        self.assertIs(charset.decl.definition.elements[-1], reported)
+
+    def testDeepInput(self):
+        text = "abcdefgh" * 12500 + "]"
+
+        for options in ({}, {"dispatch": True}, {"release": True}):
+            result = charSetGrammar(options).charSet(CharSet.empty(), TokStream(text))
+            self.assertEqual(CharSet.interval('a', 'h'), result, str(options))
+
+    def testErrors(self):
+        grammar = charSetGrammar({})
+        recursive = charSetGrammar({"tailCalls": False})
+
+        for text in ("ab", "a-", "^ab", "a\\", "ab]"):
+            self.assertEqual(parse(recursive, text), parse(grammar, text), text)
+
+if __name__ == "__main__":
+    unittest.main()